@@ -0,0 +1,745 @@
+"""
+asmr-process 基准测试
+
+用法:
+    python asmr-bench.py names [--repeat N] [--json 输出文件]
+    python asmr-bench.py phases [--sizes 4,16,64] [--encoder fake] [--json 输出文件]
+    python asmr-bench.py compare 旧结果.json 新结果.json
+    python asmr-bench.py shard [--albums 16] [--workers 4] [--crash-after 5]
+
+names: 用真实DLsite/ASMR文件名风格的语料测试编号前缀识别，
+       输出不带缓存和带缓存时的吞吐量，以及与旧版实现结果不同的文件名。
+phases: 生成不同规模的模拟专辑目录树，使用离线翻译桩和模拟（或真实）编码器，
+        分别计时扫描、预处理、翻译、标签和增量重跑各阶段。
+compare: 对比两次结果中各阶段的耗时。
+shard: 在模拟目录树上启动多个本地分片工作进程（可让其中一个中途崩溃），
+       检查每个专辑恰好由一个工作进程处理完成，并且没有残留的租约和计划日志。
+"""
+import os
+import sys
+import re
+import json
+import math
+import time
+import wave
+import array
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_asmr_process():
+    """加载同目录下的asmr-process.py（文件名含连字符，不能直接import）"""
+    spec = importlib.util.spec_from_file_location('asmr_process', os.path.join(BENCH_DIR, 'asmr-process.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['asmr_process'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# ======================== 文件名语料 ========================
+# 旧版remove_patterns使用的正则（re.sub整体替换），用来核对现在的结果
+LEGACY_PATTERNS = re.compile(r'''
+^
+(?:【|「|)? #主体部分
+(?:track|tr|ＴＲ|RJ\d{1,8})?
+(?:EX|SP)?
+[ ]?
+[-]?
+[ ]?
+(\d{1,2})?
+[_# ]?
+(?:トラック)?
+(?:\d{1,2}|EX|SP)
+(?:-A|-B)?
+[_. ]?
+(?:】|]|」|)?
+(?:」)?
+(?:tr|track)? #补充1
+(?:sp|ex|\d{1,2})?
+[_ ]?
+(?:n|hi|el|h|mr)? #补充2
+(?:\d{1,2}| \d{1,2} )?
+(?:r)?
+[_-]?
+(?:tr\d{1,2}|\d{1,2})?
+[_]?
+(?:【Trck\d{1,2}】)? #补充3
+''', re.IGNORECASE | re.VERBOSE)
+
+CORPUS_STEMS = [
+    # track / tr 前缀
+    'track01_はじめに', 'track1_耳かき', 'Track02 添い寝', 'TRACK 03 おやすみ', 'track-04_囁き',
+    'tr01_オープニング', 'Tr5 マッサージ', 'tr12_エンディング', 'ＴＲ01 耳ふー', 'ｔｒ02_吐息',
+    'track01_tr01_本編', 'track02tr02 本編', 'track10r_リメイク',
+    # 数字前缀
+    '01_はじめに', '1_プロローグ', '01 耳かき', '01.耳かき', '02-耳舐め', '03_01_シャンプー',
+    '1-A_左耳', '1-B_右耳', '#01 ささやき', '01_h01_本編', '02_n_ナレーション', '03_mr02_ミックス',
+    '01 02 両耳', '05_el_エピローグ',
+    # 括号前缀
+    '【01】はじめに', '【Trck03】お風呂', '「01」オープニング', '【track01】添い寝', '[01]添い寝',
+    '【1】耳かき', '【EX】おまけ', '【SP】特典', '「02」」耳元で', '【01】【Trck01】本編',
+    # RJ号
+    'RJ123456 本編', 'RJ01234567_01_はじめに', 'RJ123456_track01 耳かき', 'rj298765 SP 特典',
+    # トラック
+    'トラック5 添い寝', 'トラック01_おやすみ', '01_トラック2_マッサージ',
+    # EX / SP
+    'SP-A おまけ', 'SP_特典ボイス', 'EX01_おまけトーク', 'ex_フリートーク', 'SP 02 特典', 'EX-B 裏話',
+    # 没有编号前缀
+    'はじめに', 'おまけ', 'Opening', 'SE無し版', 'フリートーク', 'cover', 'readme',
+    # 以数字开头但不是编号的标题
+    '2人の添い寝', '100年の眠り', '3D立体音響', '24時間耳かき', '1000回のキス',
+    # 其他变体
+    'track01_「はじめに」', '01_【耳かき】', 'Track 01 - Introduction', '01 - 耳かき (SE無し)',
+    '01_はじめに_SEなし', 'sp01_特典', 'spex_特典', 'trex01 おまけ',
+]
+
+
+def build_corpus(title_lengths=(8, 64, 512)):
+    """
+    由基本语料生成测试用文件名
+
+    每个基本文件名再分别拼接不同长度的日文标题，覆盖长标题的情况。
+
+    参数:
+        title_lengths: 附加标题的长度列表
+
+    返回:
+        文件名（不含扩展名）列表
+    """
+    filler = '耳元で囁く甘いおやすみボイス、ゆっくり眠れるように添い寝します。'
+    corpus = list(CORPUS_STEMS)
+    for length in title_lengths:
+        title = (filler * (length // len(filler) + 1))[:length]
+        corpus.extend(stem + title for stem in CORPUS_STEMS)
+    return corpus
+
+
+def legacy_remove_patterns(filename):
+    """旧版实现（re.sub）"""
+    return re.sub(LEGACY_PATTERNS, '', filename).strip()
+
+
+def time_function(func, corpus, repeat):
+    """返回每秒处理的文件名数"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for stem in corpus:
+            func(stem)
+    elapsed = time.perf_counter() - start
+    return len(corpus) * repeat / elapsed if elapsed else float('inf')
+
+
+def bench_names(asmr, repeat=20):
+    """
+    测试编号前缀识别不带缓存和带缓存时的吞吐量，并与旧版实现逐条对比结果
+
+    返回:
+        结果字典
+    """
+    corpus = build_corpus()
+    remove_patterns = asmr.remove_patterns
+
+    # 逐条对比结果
+    differences = []
+    for stem in corpus:
+        old = legacy_remove_patterns(stem)
+        new = remove_patterns(stem)
+        if old != new:
+            differences.append({'stem': stem, 'legacy': old, 'new': new})
+
+    results = {
+        'corpus_size': len(corpus),
+        'uncached_per_sec': time_function(remove_patterns.__wrapped__, corpus, repeat),
+        'memoized_per_sec': time_function(remove_patterns, corpus, repeat),
+        'differences': differences,
+    }
+    return results
+
+
+def print_names_results(results):
+    print(f"语料: {results['corpus_size']} 个文件名")
+    print(f"不带缓存: {results['uncached_per_sec']:>12,.0f} 个/秒")
+    print(f"带缓存:   {results['memoized_per_sec']:>12,.0f} 个/秒")
+    if results['differences']:
+        print(f"结果不同: {len(results['differences'])} 个")
+        for diff in results['differences']:
+            print(f"  {diff['stem']!r}: 旧 {diff['legacy']!r} / 新 {diff['new']!r}")
+    else:
+        print("结果与旧版正则完全一致")
+
+
+# ======================== 目录树生成 ========================
+JP_WORDS = [
+    '耳かき', '添い寝', '囁き', 'おやすみ', 'マッサージ', 'シャンプー', '吐息', '耳ふー', '癒し', '子守唄',
+    '膝枕', 'オイル', 'お姉さん', '幼なじみ', 'メイド', '巫女', '雨音', '焚き火', '夏祭り', '図書館',
+]
+TRACK_STYLES = [  # 音轨文件名风格，n为编号，title为标题
+    'track{n:02d}_{title}', '{n:02d}_{title}', '【Trck{n:02d}】{title}', 'トラック{n}_{title}',
+    'tr{n:02d} {title}', '{n:02d}.{title}', 'SP-{n} {title}',
+]
+AUDIO_FORMATS = ['wav', 'mp3', 'flac', 'm4a']
+
+
+def make_title(rng, words=3):
+    """由常见词汇组合日文标题"""
+    return ''.join(rng.sample(JP_WORDS, words))
+
+
+def write_sine_wav(path, seconds, sample_rate=44100, channels=2):
+    """写入16位正弦波WAV（不依赖numpy）"""
+    frames = int(sample_rate * seconds)
+    samples = array.array('h', (
+        int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate))
+        for i in range(frames)
+        for _ in range(channels)
+    ))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(samples.tobytes())
+
+
+def write_vtt(path, rng, cues=40):
+    """写入带有日文台词的VTT字幕"""
+    lines = ['WEBVTT', '']
+    for i in range(cues):
+        start = i * 3000
+        lines.append(str(i + 1))
+        lines.append(f"{vtt_time(start)} --> {vtt_time(start + 2500)}")
+        lines.append(make_title(rng, 2) + 'ですね')
+        lines.append('')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+def vtt_time(milliseconds):
+    hours, rest = divmod(milliseconds, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+class AudioTemplates:
+    """
+    各格式的模板音频文件
+
+    目录树中的音频都从模板复制，生成速度与文件数成正比。
+    FLAC模板由asmr-process的编码后端生成，MP3/M4A模板需要ffmpeg，不可用的格式会被跳过。
+    """
+
+    def __init__(self, asmr, work_dir, seconds):
+        self.paths = {}
+        self.work_dir = work_dir
+        wav_path = os.path.join(work_dir, 'template.wav')
+        write_sine_wav(wav_path, seconds)
+        self.paths['wav'] = wav_path
+
+        encoders = asmr.available_flac_encoders()
+        if encoders:
+            flac_path = os.path.join(work_dir, 'template.flac')
+            encoders[0].encode(wav_path, flac_path)
+            self.paths['flac'] = flac_path
+
+        if asmr.check_ffmpeg_available():
+            for ext in ('mp3', 'm4a'):
+                path = os.path.join(work_dir, f'template.{ext}')
+                process = subprocess.run(
+                    ['ffmpeg', '-i', wav_path, '-y', path],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                if process.returncode == 0:
+                    self.paths[ext] = path
+
+        self.cover = None
+        try:
+            from PIL import Image
+        except ImportError:
+            pass
+        else:
+            # 超过COVER_MAX_SIZE的封面，覆盖缩放路径
+            self.cover = os.path.join(work_dir, 'cover.jpg')
+            Image.new('RGB', (1600, 1600), (200, 120, 160)).save(self.cover, quality=95)
+
+    @property
+    def formats(self):
+        return [fmt for fmt in AUDIO_FORMATS if fmt in self.paths]
+
+
+def generate_tree(root_dir, albums, templates, tracks=8, seed=0):
+    """
+    生成模拟的专辑目录树
+
+    偶数序号的专辑放在JP目录下（参与翻译），其余放在根目录。每个专辑包含一个格式文件夹，
+    每三个专辑中有一个带嵌套的“SE無し”子文件夹；WAV专辑的大部分音轨带有.wav.vtt字幕。
+
+    参数:
+        root_dir: 根目录（会被创建）
+        albums: 专辑数
+        templates: AudioTemplates实例
+        tracks: 每个文件夹的音轨数
+        seed: 随机种子，相同参数生成相同的目录树
+
+    返回:
+        统计信息字典
+    """
+    rng = random.Random(seed)
+    jp_dir = os.path.join(root_dir, 'JP')
+    os.makedirs(jp_dir, exist_ok=True)
+    stats = {'albums': albums, 'folders': 0, 'audio': 0, 'subtitles': 0, 'images': 0, 'bytes': 0}
+    formats = templates.formats
+
+    for i in range(albums):
+        parent = jp_dir if i % 2 == 0 else root_dir
+        album = os.path.join(parent, f"RJ{rng.randint(100000, 999999)} {make_title(rng)}")
+        fmt = formats[i % len(formats)]
+        folders = [os.path.join(album, f"{fmt.upper()}版")]
+        if i % 3 == 0:
+            folders.append(os.path.join(folders[0], 'SE無し'))
+
+        style = TRACK_STYLES[i % len(TRACK_STYLES)]
+        titles = [make_title(rng) for _ in range(tracks)]
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+            stats['folders'] += 1
+            for n, title in enumerate(titles, 1):
+                stem = style.format(n=n, title=title)
+                audio_path = os.path.join(folder, f"{stem}.{fmt}")
+                shutil.copyfile(templates.paths[fmt], audio_path)
+                stats['audio'] += 1
+                stats['bytes'] += os.path.getsize(audio_path)
+                if fmt == 'wav' and rng.random() < 0.8:
+                    write_vtt(os.path.join(folder, f"{stem}.wav.vtt"), rng)
+                    stats['subtitles'] += 1
+            if templates.cover:
+                shutil.copyfile(templates.cover, os.path.join(folder, 'cover.jpg'))
+                stats['images'] += 1
+
+    return stats
+
+
+# ======================== 各阶段计时 ========================
+class TemplateEncoder:
+    """模拟编码器：直接复制模板FLAC，用来排除编码耗时，只测量流程本身"""
+
+    name = 'fake'
+    MAX_LEVEL = 12
+
+    def __init__(self, template_flac):
+        self.template_flac = template_flac
+
+    def available(self):
+        return True
+
+    def supports(self, info):
+        return True
+
+    def encode(self, wav_path, flac_path, compression_level=None):
+        shutil.copyfile(self.template_flac, flac_path)
+        # 不提供PCM摘要，校验时由asmr-process读取源WAV
+        return None
+
+
+def configure(asmr, encoder='fake', templates=None, latency=0.0, qps=0):
+    """
+    把asmr-process设置为离线基准模式（每个进程只调用一次）
+
+    参数:
+        asmr: asmr-process模块
+        encoder: 'fake'（复制模板）/ 'auto' / 'ffmpeg' / 'libflac'
+        templates: AudioTemplates实例，fake编码器需要其中的FLAC模板
+        latency: 每次翻译请求模拟的网络延迟（秒）
+        qps: 翻译限速，0表示不限速
+    """
+    asmr.TRANSLATE_OFFLINE = True
+    asmr.TRANSLATE_QPS = qps
+
+    stub_class = asmr.StubTmtClient
+
+    class LatencyStub(stub_class):
+        """带固定延迟的离线翻译桩"""
+
+        def TextTranslate(self, req):
+            time.sleep(latency)
+            return stub_class.TextTranslate(self, req)
+
+        def TextTranslateBatch(self, req):
+            time.sleep(latency)
+            return stub_class.TextTranslateBatch(self, req)
+
+    if latency:
+        asmr.StubTmtClient = LatencyStub
+
+    if encoder == 'fake':
+        if templates is None or 'flac' not in templates.paths:
+            raise RuntimeError('模拟编码器需要FLAC模板，请安装ffmpeg或pyflac')
+        asmr.FLAC_ENCODER = 'auto'
+        asmr.FLAC_ENCODERS = [TemplateEncoder(templates.paths['flac'])]
+    else:
+        asmr.FLAC_ENCODER = encoder
+
+
+def run_phases(asmr, root_dir):
+    """
+    依次运行并计时各阶段，最后使用运行记录再运行一次以测量增量重跑
+
+    返回:
+        ({阶段名: 秒数}, 首次运行的指标汇总)
+    """
+    jp_dir = os.path.join(root_dir, 'JP')
+    timings = {}
+
+    def timed(name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    manifest = asmr.RunManifest.open(root_dir)
+    journal = asmr.PlanJournal.open(root_dir)
+    asmr.METRICS.reset()
+    try:
+        index = timed('scan', asmr.LibraryIndex.from_root, root_dir, manifest)
+        timed('preprocess', asmr.preprocess_directory, root_dir, index=index, journal=journal)
+        timed('translate', asmr.translate_jp_directory, jp_dir, '', '', index=index, journal=journal)
+        timed('tags', asmr.update_all_tags, root_dir, index=index, journal=journal)
+        journal.clear()
+    finally:
+        journal.close()
+        manifest.close()
+    metrics = asmr.METRICS.summary()
+
+    def rerun():
+        manifest = asmr.RunManifest.open(root_dir)
+        try:
+            index = asmr.LibraryIndex.from_root(root_dir, manifest)
+            asmr.preprocess_directory(root_dir, index=index)
+            asmr.translate_jp_directory(jp_dir, '', '', index=index)
+            asmr.update_all_tags(root_dir, index=index)
+        finally:
+            manifest.close()
+
+    timed('rerun', rerun)
+    timings['total'] = sum(timings[name] for name in ('scan', 'preprocess', 'translate', 'tags'))
+    return timings, metrics
+
+
+def bench_phases(asmr, sizes, encoder='fake', tracks=8, seconds=1.0, latency=0.0, qps=0, seed=0, keep=False):
+    """
+    在不同规模的目录树上运行各阶段
+
+    返回:
+        结果字典（runs中每个规模一项）
+    """
+    work_dir = tempfile.mkdtemp(prefix='asmr-bench-')
+    try:
+        templates = AudioTemplates(asmr, work_dir, seconds)
+        configure(asmr, encoder, templates, latency, qps)
+        runs = []
+        for albums in sizes:
+            root_dir = os.path.join(work_dir, f'tree-{albums}')
+            # 每个规模使用空的翻译缓存
+            asmr.TRANSLATION_CACHE_PATH = os.path.join(work_dir, f'translate-cache-{albums}.db')
+
+            stats = generate_tree(root_dir, albums, templates, tracks, seed)
+            timings, metrics = run_phases(asmr, root_dir)
+            runs.append({'size': albums, 'tree': stats, 'seconds': timings, 'metrics': metrics})
+            print(f"{albums:>5} 个专辑 ({stats['audio']} 个音频): "
+                  + ', '.join(f"{name} {value:.3f}s" for name, value in timings.items()))
+            if not keep:
+                shutil.rmtree(root_dir, ignore_errors=True)
+
+        return {
+            'encoder': encoder,
+            'formats': templates.formats,
+            'tracks_per_folder': tracks,
+            'seconds_per_track': seconds,
+            'translate_latency': latency,
+            'translate_qps': qps,
+            'seed': seed,
+            'runs': runs,
+        }
+    finally:
+        if keep:
+            print(f"目录树保留在: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ======================== 分片工作进程 ========================
+def shard_worker(asmr, root_dir, template_flac, worker_id, log_path, cache_path='',
+                 lease_timeout=3.0, heartbeat=0.5, crash_after=0):
+    """
+    在子进程中运行一个分片工作进程，每处理完一个专辑就把专辑键追加到log_path
+
+    crash_after大于0时，在第crash_after次执行计划操作前直接退出进程，
+    模拟工作进程中途崩溃（留下租约和未完成的计划日志）。
+    """
+    asmr.TRANSLATE_OFFLINE = True
+    asmr.TRANSLATION_CACHE_PATH = cache_path
+    asmr.FLAC_ENCODER = 'auto'
+    asmr.FLAC_ENCODERS = [TemplateEncoder(template_flac)]
+    asmr.LEASE_TIMEOUT = lease_timeout
+    asmr.LEASE_HEARTBEAT = heartbeat
+
+    process_leased_album = asmr.process_leased_album
+
+    def logged(album, *args):
+        key = asmr.album_key(album.path, root_dir)
+        status = process_leased_album(album, *args)
+        if status == 'processed':
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(key + '\n')
+        return status
+
+    asmr.process_leased_album = logged
+
+    if crash_after:
+        apply_action = asmr.apply_action
+        calls = [0]
+
+        def crashing(action, covers=None):
+            calls[0] += 1
+            if calls[0] >= crash_after:
+                os._exit(3)
+            return apply_action(action, covers)
+
+        asmr.apply_action = crashing
+
+    return asmr.run_shard_worker(root_dir, os.path.join(root_dir, 'JP'), '', '', worker_id)
+
+
+def bench_shard(asmr, albums=16, workers=4, tracks=4, seconds=1.0, lease_timeout=3.0, heartbeat=0.5,
+                crash_after=0, seed=0, keep=False, verbose=False):
+    """
+    启动多个本地分片工作进程处理同一个目录树
+
+    返回:
+        结果字典（各工作进程处理的专辑数、耗时，以及未处理、重复处理、残留文件的检查结果）
+    """
+    work_dir = tempfile.mkdtemp(prefix='asmr-bench-')
+    try:
+        templates = AudioTemplates(asmr, work_dir, seconds)
+        if 'flac' not in templates.paths:
+            raise RuntimeError('模拟编码器需要FLAC模板，请安装ffmpeg或pyflac')
+        root_dir = os.path.join(work_dir, 'tree')
+        stats = generate_tree(root_dir, albums, templates, tracks, seed)
+        index = asmr.LibraryIndex.from_root(root_dir)
+        keys = [
+            asmr.album_key(album.path, root_dir)
+            for album in asmr.group_albums(index, root_dir, os.path.join(root_dir, 'JP'))
+        ]
+
+        processes = []
+        start = time.perf_counter()
+        for i in range(workers):
+            log_path = os.path.join(work_dir, f'worker-{i}.log')
+            command = [
+                sys.executable, os.path.abspath(__file__), 'shard-worker', root_dir,
+                '--template', templates.paths['flac'], '--id', f'worker-{i}', '--log', log_path,
+                '--cache', os.path.join(work_dir, 'translate-cache.db'),
+                '--lease-timeout', str(lease_timeout), '--heartbeat', str(heartbeat),
+            ]
+            if i == 0 and crash_after:
+                command += ['--crash-after', str(crash_after)]
+            if verbose:
+                command.append('--verbose')
+            processes.append((log_path, subprocess.Popen(command)))
+
+        counts = {}
+        per_worker = []
+        for log_path, process in processes:
+            returncode = process.wait()
+            processed = []
+            if os.path.exists(log_path):
+                with open(log_path, encoding='utf-8') as f:
+                    processed = f.read().splitlines()
+            for key in processed:
+                counts[key] = counts.get(key, 0) + 1
+            per_worker.append({'returncode': returncode, 'albums': len(processed)})
+        elapsed = time.perf_counter() - start
+
+        lease_dir = os.path.join(root_dir, asmr.LEASE_DIR_NAME)
+        leftover = [
+            name for name in os.listdir(lease_dir)
+            if name.endswith('.lease') or name.endswith('.journal.jsonl')
+        ]
+        wav_left = sum(
+            name.endswith('.wav') for _, _, files in os.walk(root_dir) for name in files
+        )
+        result = {
+            'albums': len(keys),
+            'tree': stats,
+            'seconds': elapsed,
+            'workers': per_worker,
+            'missing': [key for key in keys if key not in counts],
+            'duplicates': [key for key, count in counts.items() if count > 1],
+            'leftover': leftover,
+            'wav_left': wav_left,
+        }
+        print(f"{len(keys)} 个专辑, {workers} 个工作进程, 耗时 {elapsed:.3f}s")
+        for i, worker in enumerate(per_worker):
+            print(f"  worker-{i}: 处理 {worker['albums']} 个专辑, 退出码 {worker['returncode']}")
+        print(f"  未处理 {len(result['missing'])}, 重复处理 {len(result['duplicates'])}, "
+              f"残留租约/日志 {len(leftover)}, 残留WAV {wav_left}")
+        return result
+    finally:
+        if keep:
+            print(f"目录树保留在: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ======================== 结果对比 ========================
+def environment_info():
+    """记录运行环境，便于判断两次结果是否可比"""
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        info['commit'] = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True
+        ).stdout.strip() or None
+    except OSError:
+        info['commit'] = None
+    return info
+
+
+def compare_results(old, new):
+    """
+    按规模和阶段对比两次phases结果的耗时
+
+    返回:
+        [(规模, 阶段, 旧秒数, 新秒数), ...]
+    """
+    old_runs = {run['size']: run['seconds'] for run in old['results']['runs']}
+    rows = []
+    for run in new['results']['runs']:
+        before = old_runs.get(run['size'])
+        if before is None:
+            continue
+        for phase, seconds in run['seconds'].items():
+            if phase in before:
+                rows.append((run['size'], phase, before[phase], seconds))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'规模':>6} {'阶段':<12} {'旧':>10} {'新':>10} {'变化':>8}")
+    for size, phase, before, after in rows:
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{size:>6} {phase:<12} {before:>9.3f}s {after:>9.3f}s {change:>+7.1f}%")
+
+
+# ======================== 命令行入口 ========================
+def main():
+    parser = argparse.ArgumentParser(description='asmr-process 基准测试')
+    subparsers = parser.add_subparsers(dest='command')
+
+    names_parser = subparsers.add_parser('names', help='编号前缀识别的吞吐量与结果对比')
+    names_parser.add_argument('--repeat', type=int, default=20, help='每个实现重复处理语料的次数')
+    names_parser.add_argument('--json', help='把结果写入JSON文件')
+
+    phases_parser = subparsers.add_parser('phases', help='在模拟目录树上计时各处理阶段')
+    phases_parser.add_argument('--sizes', default='4,16,64', help='专辑数，逗号分隔')
+    phases_parser.add_argument('--tracks', type=int, default=8, help='每个文件夹的音轨数')
+    phases_parser.add_argument('--seconds', type=float, default=1.0, help='每条音轨的时长（秒）')
+    phases_parser.add_argument('--encoder', default='fake', choices=['fake', 'auto', 'ffmpeg', 'libflac'],
+                               help='FLAC编码器，fake为复制模板文件')
+    phases_parser.add_argument('--latency', type=float, default=0.0, help='每次翻译请求的模拟延迟（秒）')
+    phases_parser.add_argument('--qps', type=float, default=0, help='翻译限速，0表示不限速')
+    phases_parser.add_argument('--seed', type=int, default=0, help='目录树生成的随机种子')
+    phases_parser.add_argument('--keep', action='store_true', help='保留生成的目录树')
+    phases_parser.add_argument('--verbose', action='store_true', help='输出asmr-process的处理日志')
+    phases_parser.add_argument('--json', help='把结果写入JSON文件')
+
+    compare_parser = subparsers.add_parser('compare', help='对比两次phases结果')
+    compare_parser.add_argument('old', help='旧结果JSON')
+    compare_parser.add_argument('new', help='新结果JSON')
+
+    shard_parser = subparsers.add_parser('shard', help='多个本地分片工作进程处理同一目录树')
+    shard_parser.add_argument('--albums', type=int, default=16, help='专辑数')
+    shard_parser.add_argument('--workers', type=int, default=4, help='工作进程数')
+    shard_parser.add_argument('--tracks', type=int, default=4, help='每个文件夹的音轨数')
+    shard_parser.add_argument('--seconds', type=float, default=1.0, help='每条音轨的时长（秒）')
+    shard_parser.add_argument('--lease-timeout', type=float, default=3.0, help='租约过期时间（秒）')
+    shard_parser.add_argument('--heartbeat', type=float, default=0.5, help='心跳间隔（秒）')
+    shard_parser.add_argument('--crash-after', type=int, default=0,
+                              help='第一个工作进程在第N次执行计划操作前崩溃，0表示不崩溃')
+    shard_parser.add_argument('--seed', type=int, default=0, help='目录树生成的随机种子')
+    shard_parser.add_argument('--keep', action='store_true', help='保留生成的目录树')
+    shard_parser.add_argument('--verbose', action='store_true', help='输出asmr-process的处理日志')
+    shard_parser.add_argument('--json', help='把结果写入JSON文件')
+
+    worker_parser = subparsers.add_parser('shard-worker', help='分片工作进程（由shard子命令启动）')
+    worker_parser.add_argument('root', help='根目录')
+    worker_parser.add_argument('--template', required=True, help='模拟编码器复制的FLAC模板')
+    worker_parser.add_argument('--id', required=True, help='工作进程标识')
+    worker_parser.add_argument('--log', required=True, help='记录已处理专辑的文件')
+    worker_parser.add_argument('--cache', default='', help='翻译缓存文件')
+    worker_parser.add_argument('--lease-timeout', type=float, default=3.0, help='租约过期时间（秒）')
+    worker_parser.add_argument('--heartbeat', type=float, default=0.5, help='心跳间隔（秒）')
+    worker_parser.add_argument('--crash-after', type=int, default=0, help='第N次执行计划操作前崩溃')
+    worker_parser.add_argument('--verbose', action='store_true', help='输出asmr-process的处理日志')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return 1
+
+    if args.command == 'compare':
+        with open(args.old, encoding='utf-8') as f:
+            old = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        print_comparison(compare_results(old, new))
+        return 0
+
+    asmr = load_asmr_process()
+    if args.command == 'shard-worker':
+        if not args.verbose:
+            asmr.logger.setLevel('WARNING')
+        shard_worker(asmr, args.root, args.template, args.id, args.log, args.cache,
+                     args.lease_timeout, args.heartbeat, args.crash_after)
+        return 0
+
+    if args.command == 'names':
+        results = bench_names(asmr, args.repeat)
+        print_names_results(results)
+    elif args.command == 'shard':
+        results = bench_shard(
+            asmr, args.albums, args.workers, args.tracks, args.seconds, args.lease_timeout,
+            args.heartbeat, args.crash_after, args.seed, args.keep, args.verbose
+        )
+    else:
+        if not args.verbose:
+            asmr.logger.setLevel('WARNING')
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        results = bench_phases(
+            asmr, sizes, args.encoder, args.tracks, args.seconds, args.latency, args.qps, args.seed, args.keep
+        )
+
+    if args.json:
+        output = {'command': args.command, 'environment': environment_info(), 'results': results}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    if args.command == 'shard':
+        return 1 if results['missing'] or results['duplicates'] or results['leftover'] else 0
+    return 1 if args.command == 'names' and results['differences'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,10 @@
 '''
 用来处理asmr的python，环境conda-py3.8
 功能1（ROOT_DIR）：wav转flac，vtt文件转lrc，正则表达式捕获命名
-功能2（JP_DIR）：翻译文件及其文件夹
+功能2（JP_DIR）：翻译文件及其文件夹，以及LRC字幕的内容
 功能3（ROOT_DIR）：获取文件夹内图片用于专辑封面，获取文件名用于标题，获取父文件夹名用于专辑
-根目录、翻译目录、腾讯云api自己在变量定义中设置
+根目录、翻译目录、腾讯云api自己在变量定义中设置，也可以写在配置文件、环境变量或命令行参数中（见 python asmr-process.py -h）
+用法: python asmr-process.py [all|preprocess|translate|lyrics|tag|watch|shard] [根目录] [--jp 日语目录] [--dry-run]
 没有ffmpeg自己找教程安装，或者自己把第一部分的wav转flac注释掉，这会导致不处理wav文件，解决方法就是自己在第三部分的处理中写一个处理wav文件的if语句
 '''
 
@@ -11,21 +12,36 @@
 import os
 import sys
 import subprocess
-import mutagen
+import argparse
 import re
+import functools
 import shutil
 import logging
 import time
+import contextlib
+import hashlib
+import heapq
+import sqlite3
+import tempfile
+import codecs
+import html
+import io
+import json
+import math
+import mmap
+import multiprocessing
+import random
+import struct
+import threading
+import queue
+import types
+import unicodedata
+import socket
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from mutagen.flac import FLAC
-from mutagen.id3 import ID3, APIC, TIT2, TALB
-from mutagen.mp3 import MP3
-from mutagen.mp4 import MP4, MP4Cover
-from tencentcloud.common import credential
-from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
-from tencentcloud.tmt.v20180321 import tmt_client, models
-from tencentcloud.common.profile.http_profile import HttpProfile
-from tencentcloud.common.profile.client_profile import ClientProfile
+# mutagen和腾讯云SDK导入较慢，在用到它们的函数中按需导入
 
 # 配置日志
 logging.basicConfig(
@@ -41,10 +57,76 @@ ROOT_DIR = r"" #根目录
 JP_DIR = r'' #根目录下自己弄一个专门用来翻译的文件夹
 SECRET_ID = '' #腾讯云api
 SECRET_KEY = ''
+CONFIG_PATH = os.path.join(os.path.expanduser('~'), '.asmr-process.json') #配置文件（JSON，键为本文件中的常量名），不存在时忽略；环境变量ASMR_CONFIG可指定其他路径
+ENV_PREFIX = 'ASMR_' #环境变量前缀，如ASMR_ROOT_DIR、ASMR_SECRET_ID、ASMR_TRANSLATE_QPS覆盖同名常量
 ILLEGAL_CHARS = r'[\\/:*?"<>|]'
 AUDIO_EXTS = {'.wav', '.mp3', '.flac', '.m4a'}
 SUBTITLE_EXTS = {'.wav.vtt', '.mp3.vtt', '.flac.vtt', '.m4a.vtt', '.vtt', '.lrc'}
 IMAGE_EXTS = {'.jpg', '.jpeg', '.png'}
+CONVERT_WORKERS = os.cpu_count() or 1 #同时运行的ffmpeg转换进程数
+FLAC_ENCODER = 'auto' #FLAC编码后端: 'auto'（优先进程内libFLAC，不支持的格式用ffmpeg）/ 'ffmpeg' / 'libflac'
+FLAC_PROFILE = 'archive' #编码配置: 'archive'（压缩等级12，体积最小）/ 'balanced'（等级5）/ 'fast'（等级1）/ 'auto'（按ENCODE_BUDGET为每个文件选择等级）
+ENCODE_BUDGET = '' #auto配置下整个转换队列的时间预算，如'8h'、'90m'、'3600'（秒）；留空则不限时，全部使用最高等级
+CALIBRATION_PATH = os.path.join(os.path.expanduser('~'), '.asmr-encode-calibration.json') #各主机编码速度和压缩率的校准表（auto配置使用），留空则不保存
+CALIBRATION_SAMPLE_SECONDS = 10 #校准时从待转换的WAV中截取的音频长度（秒）
+CALIBRATION_MAX_AGE = 30 * 86400 #校准记录超过这么多秒后重新测量
+VERIFY_FLAC = True #删除WAV前核对FLAC的STREAMINFO（采样数、PCM数据MD5）与源文件一致，不一致时保留WAV
+SUBPROCESS_FLAGS = {'creationflags': subprocess.CREATE_NO_WINDOW} if os.name == 'nt' else {} #Windows下不弹出控制台窗口
+SUBTITLE_WORKERS = 8 #并行转换字幕的线程数
+SUBTITLE_ENCODINGS = ['utf-8', 'gbk', 'latin-1'] #字幕编码检测顺序（latin-1总能解码，放在最后）
+SUBTITLE_SNIFF_BYTES = 64 * 1024 #检测字幕编码时读取的文件开头字节数
+INGEST_DIR = r'' #存放下载的ZIP的目录，运行时先把其中的压缩包导入为专辑文件夹，留空则不导入
+INGEST_DEST = r'' #ZIP导入到的目录，留空则使用JP_DIR
+INGEST_DELETE = False #导入成功后删除ZIP（False时移动到INGEST_DIR下的imported文件夹）
+ZIP_NAME_ENCODINGS = ['utf-8', 'cp932', 'gbk'] #未标记UTF-8的ZIP成员名的编码检测顺序
+DEDUP = True #按内容识别相同的音频：内容相同的WAV只编码一次，运行结束时报告重复文件
+DEDUP_ACTION = 'report' #重复文件的处理方式：'report'只报告 / 'hardlink'替换为硬链接（之后写入标签时会自动拆开）
+HASH_CHUNK_SIZE = 8 * 1024 * 1024 #计算内容摘要时每次读取的字节数
+INCREMENTAL = True #增量运行：跳过上次已处理且未变化的文件夹
+MANIFEST_NAME = '.asmr-process.db' #增量运行记录文件名（保存在根目录）
+JOURNAL_NAME = '.asmr-journal.jsonl' #预写式计划日志文件名（保存在根目录，中断后下次运行从这里继续）
+DRY_RUN = False #只输出处理计划，不修改任何文件
+PIPELINE = True #按专辑流水线处理：不同专辑的转换、翻译、标签同时进行（False时整个目录树逐阶段处理）
+PIPELINE_QUEUE_SIZE = 2 #流水线各阶段之间最多排队的专辑数，队列满时上一阶段等待
+PIPELINE_PREPROCESS_WORKERS = 1 #同时预处理的专辑数（专辑内部仍按CONVERT_WORKERS并行转换）
+PIPELINE_TRANSLATE_WORKERS = 2 #同时翻译的专辑数
+PIPELINE_TAG_WORKERS = 2 #同时写入标签的专辑数
+SHARD = False #分片模式：多个进程（或挂载同一NFS目录的多台主机）同时运行，各自认领ROOT_DIR下的专辑处理
+WORKER_ID = '' #分片模式下的工作进程标识，留空则使用“主机名-进程号”
+LEASE_DIR_NAME = '.asmr-leases' #租约目录名（保存在根目录）
+LEASE_TIMEOUT = 600 #租约超过这么多秒没有心跳即视为过期，可被其他工作进程接管
+LEASE_HEARTBEAT = 60 #持有租约时更新心跳的间隔（秒），也是等待其他工作进程的重试间隔
+PHASES = ('preprocess', 'translate', 'lyrics', 'tags') #默认执行的阶段（命令行子命令可以只执行其中一部分）
+WATCH = False #监视模式：常驻运行，只处理ROOT_DIR中新增或变化的文件夹
+WATCH_STABLE_SECONDS = 30 #文件夹内文件大小和修改时间持续这么多秒不变后才开始处理
+WATCH_POLL_INTERVAL = 5 #检查间隔（秒），没有inotify时按此间隔轮询扫描
+METRICS_JSON_PATH = '' #运行结束后写入JSON格式的指标汇总，留空则不写
+METRICS_PROM_PATH = '' #运行结束后写入Prometheus textfile（放在node_exporter的textfile目录下，以.prom结尾），留空则不写
+TRANSLATION_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.asmr-translate-cache.db') #翻译缓存文件，留空则不缓存
+TRANSLATION_CACHE_SIZE = 200000 #翻译缓存最多保存的条目数
+TRANSLATE_BATCH_CHARS = 2000 #批量翻译单次请求的文本总长度上限（腾讯云要求低于2000字符）
+TRANSLATE_BATCH_ITEMS = 100 #批量翻译单次请求最多包含的文本条数
+TRANSLATE_QPS = 5 #翻译接口每秒请求数上限（令牌桶速率），0表示不限速
+TRANSLATE_WORKERS = 4 #同时进行中的翻译请求数
+TRANSLATE_MAX_RETRIES = 5 #限流或网络错误时的最大重试次数（指数退避）
+TRANSLATE_RETRY_CODES = ('RequestLimitExceeded', 'LimitExceeded', 'ClientNetworkError', 'InternalError') #需要重试的错误码前缀
+TRANSLATE_LYRICS = True #翻译日语目录中LRC字幕的内容（保留时间标签）
+LYRICS_MODE = 'bilingual' #字幕译文的写法：'bilingual'在原文行后加一行同时间的译文 / 'translated'只保留译文
+LYRICS_WINDOW_CHARS = 20000 #翻译字幕时每次读入的文本量（字符），读满后去重、批量翻译并写出，大文件不会整个读入内存
+LYRICS_TRANSLATED_TAG = '[re:asmr-process translated]' #写在已翻译字幕第一行的标记，再次运行时跳过
+TRANSLATE_OFFLINE = False #使用本地桩服务代替腾讯云（离线测试用，翻译结果为“译”+原文）
+REPLAYGAIN = True #写入标签时按EBU R128响度计算ReplayGain 2.0的音轨和专辑（文件夹）增益，写入REPLAYGAIN_*标签（需要numpy）
+REPLAYGAIN_REFERENCE = -18.0 #ReplayGain 2.0的参考响度（LUFS）
+LOUDNESS_WORKERS = os.cpu_count() or 1 #解码分析响度的进程数，0表示在当前进程中分析
+COVER_MAX_SIZE = 1000 #嵌入封面的最大边长（像素），超过时缩放并转为JPEG，0表示原样嵌入（缩放需要Pillow）
+COVER_JPEG_QUALITY = 90 #缩放后封面的JPEG质量
+NUMBER_PREFIX = re.compile(r'^(?:「(\d{2,})」|【(\d{2,})】)') #本脚本生成的编号前缀
+
+# 可以通过配置文件和环境变量修改的常量：以上定义的、值为字符串、数字、布尔值或列表的常量
+SETTING_NAMES = frozenset(
+    name for name, value in list(globals().items())
+    if name.isupper() and isinstance(value, (str, int, float, bool, list, tuple, set))
+)
 
 # 特定字符正则表达式
 
@@ -75,507 +157,3561 @@ PATTERNS = re.compile(r'''
 [_]?
 (?:【Trck\d{1,2}】)? #补充3
 ''',re.IGNORECASE|re.VERBOSE)
+TRACK_PREFIX_CACHE_SIZE = 65536 #编号前缀识别结果的缓存条目数（按文件名记忆）
+
+# ======================== 运行指标模块 ========================
+METRIC_HELP = {  # Prometheus导出时的指标说明
+    'stage_seconds': '各处理阶段的耗时',
+    'pipeline_stage_seconds': '流水线中单个专辑在各阶段的耗时',
+    'scan_seconds': '目录扫描耗时',
+    'scan_folders': '扫描的文件夹数',
+    'scan_files': '扫描到的音频、字幕、图片文件数',
+    'convert_seconds': 'WAV转FLAC的总耗时（含删除原文件）',
+    'encode_seconds': 'FLAC编码后端的耗时',
+    'encode_levels': '按压缩等级统计的转换文件数',
+    'encode_plan_seconds': 'auto编码配置下各批转换的预计与实际耗时（kind=predicted/actual）',
+    'encode_plan_bytes': 'auto编码配置下各批转换的预计与实际FLAC字节数（kind=predicted/actual）',
+    'verify_seconds': '删除WAV前校验FLAC的耗时',
+    'verify_failures': 'FLAC校验不一致而保留WAV的次数',
+    'ingest_archives': '导入的ZIP数',
+    'ingest_files': '从ZIP导入的文件数（flac为直接编码的WAV）',
+    'subtitle_seconds': 'VTT转LRC的耗时',
+    'tag_seconds': '写入标签的耗时',
+    'loudness_seconds': '响度分析耗时（source=convert为转换时顺带分析，decode为单独解码分析）',
+    'loudness_tracks': '计算ReplayGain的音轨数（source=cache为复用转换时或上次的结果）',
+    'tag_writes': '标签写入结果（written为实际写入，unchanged为无需修改）',
+    'files': '处理的文件数',
+    'bytes_in': '读取的文件字节数',
+    'bytes_out': '写出的文件字节数',
+    'translate_api_seconds': '翻译接口请求耗时（不含限速等待）',
+    'translate_wait_seconds': '翻译请求等待限速令牌的耗时',
+    'translate_api_calls': '翻译接口请求次数',
+    'translate_retries': '翻译接口重试次数',
+    'translate_chars': '提交翻译的字符数',
+    'translate_cache': '翻译缓存查询次数',
+    'lyrics_files': '翻译内容的LRC字幕数（failed为有行翻译失败而保留原文件）',
+    'lyrics_lines': '翻译的字幕行数',
+    'lease_claims': '分片模式下认领专辑的结果',
+    'hash_seconds': '计算文件内容摘要的耗时',
+    'hash_bytes': '计算内容摘要读取的字节数',
+    'dedup_reused': '复用已有FLAC而跳过编码的WAV数',
+    'duplicate_files': '与其他文件内容完全相同的文件数（每组第一个除外）',
+    'duplicate_bytes': '重复文件占用的字节数（每组第一个除外）',
+    'run_seconds': '本次运行的总耗时',
+    'last_run_timestamp_seconds': '本次运行结束的时间戳',
+}
+
+
+class RunMetrics:
+    """
+    单次运行的计数器和耗时统计（线程安全）
 
-# ======================== 预处理模块 ========================
-def classify_files(folder_path):
+    计数器和耗时都可以带标签，例如 count('files', stage='convert', status='ok')。
+    运行结束后导出为JSON汇总或Prometheus textfile。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """开始新的一次运行"""
+        with self.lock:
+            self.started = time.time()
+            self.counters = {}  # {(名称, 标签): 数值}
+            self.timings = {}  # {(名称, 标签): [次数, 总秒数, 最大秒数]}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def count(self, name, value=1, **labels):
+        """计数器增加value"""
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """记录一次耗时"""
+        key = self._key(name, labels)
+        with self.lock:
+            timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """计时上下文，退出时记录耗时（发生异常也会记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self):
+        """返回可序列化为JSON的汇总"""
+        with self.lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            timings = [
+                {'name': name, 'labels': dict(labels), 'count': count, 'seconds': total, 'max_seconds': longest}
+                for (name, labels), (count, total, longest) in sorted(self.timings.items())
+            ]
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'duration_seconds': time.time() - self.started,
+            'counters': counters,
+            'timings': timings,
+        }
+
+    def to_prometheus(self, prefix='asmr_'):
+        """
+        转换为Prometheus文本格式
+
+        耗时导出为summary（_sum/_count），计数器导出为gauge（数值为本次运行的结果）。
+        """
+        def format_labels(labels):
+            if not labels:
+                return ''
+            escaped = (
+                '{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                for key, value in labels
+            )
+            return '{' + ','.join(escaped) + '}'
+
+        def header(name, kind):
+            help_text = METRIC_HELP.get(name, name)
+            return [f"# HELP {prefix}{name} {help_text}", f"# TYPE {prefix}{name} {kind}"]
+
+        lines = []
+        with self.lock:
+            timings = sorted(self.timings.items())
+            counters = sorted(self.counters.items())
+
+        seen = set()
+        for (name, labels), (count, total, _) in timings:
+            if name not in seen:
+                lines.extend(header(name, 'summary'))
+                seen.add(name)
+            lines.append(f"{prefix}{name}_sum{format_labels(labels)} {total:.6f}")
+            lines.append(f"{prefix}{name}_count{format_labels(labels)} {count}")
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.extend(header(name, 'gauge'))
+                seen.add(name)
+            lines.append(f"{prefix}{name}{format_labels(labels)} {value}")
+
+        finished = time.time()
+        lines.extend(header('run_seconds', 'gauge'))
+        lines.append(f"{prefix}run_seconds {finished - self.started:.3f}")
+        lines.extend(header('last_run_timestamp_seconds', 'gauge'))
+        lines.append(f"{prefix}last_run_timestamp_seconds {finished:.0f}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _write_atomic(path, text):
+        # node_exporter可能随时读取，先写临时文件再替换
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def write_json(self, path):
+        self._write_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path):
+        self._write_atomic(path, self.to_prometheus())
+
+    def log_summary(self):
+        """在日志中输出各项耗时"""
+        for timing in self.summary()['timings']:
+            labels = ', '.join(f"{key}={value}" for key, value in timing['labels'].items())
+            name = f"{timing['name']}({labels})" if labels else timing['name']
+            logger.info(f"  {name}: {timing['count']} 次, 共 {timing['seconds']:.2f} 秒, 最长 {timing['max_seconds']:.2f} 秒")
+
+
+METRICS = RunMetrics()
+
+
+def timed(stage):
+    """
+    记录函数耗时和处理结果的装饰器
+
+    耗时记为 <stage>_seconds，返回None或False时文件数计为失败，否则计为成功。
     """
-    分类文件夹中的文件（音频、字幕、图片）
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            result = None
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                METRICS.observe(f'{stage}_seconds', time.perf_counter() - start)
+                status = 'failed' if result is None or result is False else 'ok'
+                METRICS.count('files', stage=stage, status=status)
+        return wrapper
+    return decorator
+
+
+def write_metrics(log=True):
+    """按METRICS_JSON_PATH/METRICS_PROM_PATH写出本次运行的指标，log为True时同时输出到日志"""
+    if log:
+        logger.info("运行指标:")
+        METRICS.log_summary()
+    for path, write in ((METRICS_JSON_PATH, METRICS.write_json), (METRICS_PROM_PATH, METRICS.write_prometheus)):
+        if not path:
+            continue
+        try:
+            write(path)
+        except OSError as e:
+            logger.error(f"无法写入运行指标: {path} - {e}")
+
+
+# ======================== 目录索引模块 ========================
+def classify_filename(filename):
+    """
+    按文件名判断文件类型
 
     参数:
-        folder_path: 文件夹路径
+        filename: 文件名
 
     返回:
-        (audio_files, subtitle_files, image_files)
+        'audio' / 'subtitle' / 'image'，不属于这三类返回None
     """
-    audio_files = []
-    subtitle_files = []
-    image_files = []
+    filename_lower = filename.lower()
 
-    for filename in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, filename)
-        if not os.path.isfile(file_path):
-            continue
+    if any(filename_lower.endswith(ext) for ext in AUDIO_EXTS):
+        return 'audio'
+    if any(ext in filename_lower for ext in SUBTITLE_EXTS):
+        return 'subtitle'
+    if any(filename_lower.endswith(ext) for ext in IMAGE_EXTS):
+        return 'image'
+    return None
 
-        filename_lower = filename.lower()
 
-        if any(filename_lower.endswith(ext) for ext in AUDIO_EXTS):
-            audio_files.append(file_path)
-        elif any(ext in filename_lower for ext in SUBTITLE_EXTS):
-            subtitle_files.append(file_path)
-        elif any(filename_lower.endswith(ext) for ext in IMAGE_EXTS):
-            image_files.append(file_path)
+class IndexedFile:
+    """索引中的单个文件（路径、类型和stat信息）"""
 
-    return audio_files, subtitle_files, image_files
+    def __init__(self, path, kind, size, mtime):
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.mtime = mtime
 
+    @property
+    def name(self):
+        return os.path.basename(self.path)
 
-def convert_wav_to_flac(wav_path):
-    """
-    使用ffmpeg将WAV转换为FLAC
 
-    参数:
-        wav_path: WAV文件路径
+def synchronized(method):
+    """在实例的self.lock下执行方法"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
-    返回:
-        成功: 新FLAC文件路径
-        失败: None
+
+def run_once(func):
+    """无参数函数只执行一次，之后直接返回第一次的结果（多个线程同时调用时其余线程等待结果）"""
+    lock = threading.Lock()
+    result = []
+
+    @functools.wraps(func)
+    def wrapper():
+        with lock:
+            if not result:
+                result.append(func())
+            return result[0]
+    return wrapper
+
+
+class LibraryIndex:
     """
-    wav_path_obj = Path(wav_path)
-    flac_path = wav_path_obj.with_suffix('.flac')
+    一次扫描得到的目录索引，供预处理、翻译、标签三个阶段共用
 
-    try:
-        cmd = ['ffmpeg', '-i', str(wav_path_obj), '-compression_level', '12', '-y', str(flac_path)]
-        process = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
+    文件夹按os.walk的自顶向下顺序保存，每个文件夹只记录音频、字幕、图片文件。
+    各阶段重命名或转换文件后调用对应的更新方法，不再重新遍历磁盘。
+    绑定RunManifest时，文件和文件夹的重命名会同步到运行记录中。
+    所有方法都在同一把锁下执行，流水线中的多个阶段可以同时使用。
+    """
 
-        if process.returncode != 0:
-            logger.error(f"转换失败: {wav_path_obj.name} - 错误代码 {process.returncode}")
-            return None
+    def __init__(self, manifest=None):
+        self.folders = {}  # {文件夹路径: {文件名: IndexedFile}}
+        self.manifest = manifest
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_root(cls, root_dir, manifest=None):
+        """扫描根目录并返回索引"""
+        index = cls(manifest)
+        index.scan(root_dir)
+        return index
+
+    @synchronized
+    def scan(self, root_dir, recursive=True):
+        """使用os.scandir扫描目录树（已扫描过的子树会被覆盖），recursive为False时只扫描root_dir本身"""
+        root_dir = os.path.normpath(root_dir)
+        if recursive:
+            # 先移除旧记录，已被删除或改名的子文件夹不会残留
+            for folder in self.folders_under(root_dir):
+                del self.folders[folder]
+        start = time.perf_counter()
+        folder_count = file_count = 0
+        stack = [root_dir]
+        while stack:
+            folder = stack.pop()
+            files = {}
+            subfolders = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subfolders.append(entry.path)
+                                continue
+                            if not entry.is_file():
+                                continue
+                            kind = classify_filename(entry.name)
+                            if kind is None:
+                                continue
+                            stat = entry.stat()
+                        except OSError as e:
+                            logger.warning(f"无法读取: {entry.path} - {e}")
+                            continue
+                        files[entry.name] = IndexedFile(entry.path, kind, stat.st_size, stat.st_mtime)
+            except OSError as e:
+                logger.error(f"无法扫描目录: {folder} - {e}")
+                continue
 
-        if not flac_path.exists():
-            logger.error(f"转换失败: {wav_path_obj.name} - 未生成输出文件")
+            self.folders[folder] = files
+            folder_count += 1
+            file_count += len(files)
+            if not recursive:
+                break
+            # 逆序入栈，保证出栈顺序与os.walk一致
+            stack.extend(sorted(subfolders, reverse=True))
+
+        METRICS.observe('scan_seconds', time.perf_counter() - start)
+        METRICS.count('scan_folders', folder_count)
+        METRICS.count('scan_files', file_count)
+
+    @synchronized
+    def ensure(self, root_dir):
+        """确保目录已在索引中，不在时补充扫描"""
+        if os.path.normpath(root_dir) not in self.folders:
+            self.scan(root_dir)
+
+    @synchronized
+    def folders_under(self, root_dir):
+        """返回root_dir及其所有子文件夹（自顶向下）"""
+        root_dir = os.path.normpath(root_dir)
+        prefix = os.path.join(root_dir, '')
+        return [f for f in self.folders if f == root_dir or f.startswith(prefix)]
+
+    @synchronized
+    def deepest_directories(self, root_dir):
+        """返回root_dir下的文件夹，按深度从深到浅排序"""
+        folders = self.folders_under(root_dir)
+        return sorted(folders, key=lambda f: f.count(os.sep), reverse=True)
+
+    @synchronized
+    def files(self, folder_path, kind=None):
+        """返回文件夹中的文件记录，可按类型过滤"""
+        entries = self.folders.get(os.path.normpath(folder_path), {}).values()
+        return [e for e in entries if kind is None or e.kind == kind]
+
+    @synchronized
+    def classify(self, folder_path):
+        """按类型分组文件夹中的文件路径: (audio_files, subtitle_files, image_files)"""
+        audio_files, subtitle_files, image_files = [], [], []
+        groups = {'audio': audio_files, 'subtitle': subtitle_files, 'image': image_files}
+        for entry in self.files(folder_path):
+            groups[entry.kind].append(entry.path)
+        return audio_files, subtitle_files, image_files
+
+    @synchronized
+    def signature(self, folder_path):
+        """根据文件夹内文件的名称、大小和修改时间计算指纹"""
+        digest = hashlib.sha1()
+        for entry in sorted(self.files(folder_path), key=lambda e: e.name):
+            digest.update(f"{entry.name}\0{entry.size}\0{entry.mtime:.6f}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    @synchronized
+    def get(self, file_path):
+        """按路径查找文件记录"""
+        folder, name = os.path.split(os.path.normpath(file_path))
+        return self.folders.get(folder, {}).get(name)
+
+    @synchronized
+    def add_file(self, file_path):
+        """新增或刷新一个文件的记录（重新读取stat）"""
+        file_path = os.path.normpath(file_path)
+        folder, name = os.path.split(file_path)
+        kind = classify_filename(name)
+        if kind is None or folder not in self.folders:
             return None
-
         try:
-            os.remove(wav_path)
-            logger.info(f"转换成功并删除原文件: {wav_path_obj.name} -> {flac_path.name}")
-            return str(flac_path)
-        except Exception as e:
-            logger.error(f"无法删除原文件 {wav_path_obj.name}: {str(e)}")
+            stat = os.stat(file_path)
+        except OSError:
+            self.remove_file(file_path)
             return None
+        entry = IndexedFile(file_path, kind, stat.st_size, stat.st_mtime)
+        self.folders[folder][name] = entry
+        return entry
+
+    @synchronized
+    def remove_file(self, file_path):
+        """删除一个文件的记录"""
+        folder, name = os.path.split(os.path.normpath(file_path))
+        self.folders.get(folder, {}).pop(name, None)
+
+    @synchronized
+    def rename_file(self, old_path, new_path):
+        """文件重命名后更新记录（内容不变，沿用原stat信息）"""
+        entry = self.get(old_path)
+        self.remove_file(old_path)
+        if self.manifest is not None:
+            self.manifest.rename_file(old_path, new_path)
+        new_path = os.path.normpath(new_path)
+        folder, name = os.path.split(new_path)
+        kind = classify_filename(name)
+        if entry is None or kind is None or folder not in self.folders:
+            return self.add_file(new_path)
+        entry = IndexedFile(new_path, kind, entry.size, entry.mtime)
+        self.folders[folder][name] = entry
+        return entry
+
+    @synchronized
+    def replace_file(self, old_path, new_path):
+        """文件被转换为新文件后更新记录（重新读取新文件的stat）"""
+        self.remove_file(old_path)
+        return self.add_file(new_path)
+
+    @synchronized
+    def rename_folder(self, old_path, new_path):
+        """文件夹重命名后更新其自身及所有子文件夹、文件的路径"""
+        old_path = os.path.normpath(old_path)
+        new_path = os.path.normpath(new_path)
+        old_prefix = os.path.join(old_path, '')
+        folders = {}
+        for folder, files in self.folders.items():
+            if folder == old_path or folder.startswith(old_prefix):
+                folder = new_path + folder[len(old_path):]
+                for name, entry in files.items():
+                    entry.path = os.path.join(folder, name)
+            folders[folder] = files
+        self.folders = folders
+        if self.manifest is not None:
+            self.manifest.rename_folder(old_path, new_path)
+
+
+# ======================== 增量运行记录模块 ========================
+class RunManifest:
+    """
+    保存在根目录的SQLite运行记录
+
+    文件夹记录两类阶段：
+        stages: 与文件夹指纹（文件名、大小、修改时间）绑定的阶段，指纹变化后全部失效
+        flags: 只与路径绑定的阶段（如目录名已翻译），内容变化后仍然有效
+    文件只记录flags（如文件名已翻译），防止重复翻译出现“译名[译名[原名]]”。
+    contents表缓存文件的内容摘要（大小、修改时间变化后失效），以及FLAC由哪个WAV（内容指纹）转换而来。
+    loudness表按PCM数据MD5缓存音轨的响度分析结果（与路径和标签无关）。
+    路径以相对根目录的形式保存，挂载点变化后记录仍然可用。
+    """
 
-    except Exception as e:
-        logger.error(f"转换失败: {wav_path_obj.name} - {str(e)}")
+    def __init__(self, db_path, root_dir, readonly=False):
+        self.db_path = db_path
+        self.root_dir = os.path.normpath(root_dir)
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        # 只读模式（预演）下不写入记录，文件不存在时也不创建
+        if readonly and not os.path.exists(db_path):
+            db_path = ':memory:'
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS folders (
+                path TEXT PRIMARY KEY,
+                signature TEXT NOT NULL,
+                stages TEXT NOT NULL DEFAULT '',
+                flags TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                flags TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS contents (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                digest TEXT,
+                origin TEXT
+            );
+            CREATE INDEX IF NOT EXISTS contents_origin ON contents (origin);
+            CREATE TABLE IF NOT EXISTS loudness (
+                pcm_md5 TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+        ''')
+        self.conn.commit()
+
+    @classmethod
+    def open(cls, root_dir, readonly=False):
+        """打开（或创建）根目录下的运行记录"""
+        return cls(os.path.join(root_dir, MANIFEST_NAME), root_dir, readonly)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _key(self, path):
+        return os.path.relpath(os.path.normpath(path), self.root_dir)
+
+    @staticmethod
+    def _split(value):
+        return set(filter(None, value.split(',')))
+
+    @staticmethod
+    def _join(values):
+        return ','.join(sorted(values))
+
+    def folder_done(self, folder_path, stage, signature):
+        """文件夹指纹未变化且已完成该阶段时返回True"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT signature, stages FROM folders WHERE path = ?', (self._key(folder_path),)
+            ).fetchone()
+        return bool(row) and row[0] == signature and stage in self._split(row[1])
+
+    def mark_folder(self, folder_path, stage, before, after):
+        """
+        记录文件夹完成一个阶段
+
+        参数:
+            folder_path: 文件夹路径
+            stage: 阶段名
+            before: 阶段开始前的指纹，与已记录的指纹一致时保留之前完成的阶段
+            after: 阶段完成后的指纹
+        """
+        if self.readonly:
+            return
+        key = self._key(folder_path)
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT signature, stages, flags FROM folders WHERE path = ?', (key,)
+            ).fetchone()
+            stages = self._split(row[1]) if row and row[0] == before else set()
+            stages.add(stage)
+            flags = row[2] if row else ''
+            self.conn.execute(
+                'INSERT OR REPLACE INTO folders (path, signature, stages, flags) VALUES (?, ?, ?, ?)',
+                (key, after, self._join(stages), flags)
+            )
+            self.conn.commit()
+
+    def folder_flag(self, folder_path, flag):
+        """文件夹是否带有路径绑定的完成标记"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT flags FROM folders WHERE path = ?', (self._key(folder_path),)
+            ).fetchone()
+        return bool(row) and flag in self._split(row[0])
+
+    def set_folder_flag(self, folder_path, flag):
+        """为文件夹添加路径绑定的完成标记"""
+        if self.readonly:
+            return
+        key = self._key(folder_path)
+        with self.lock:
+            row = self.conn.execute('SELECT flags FROM folders WHERE path = ?', (key,)).fetchone()
+            if row is None:
+                self.conn.execute(
+                    'INSERT INTO folders (path, signature, flags) VALUES (?, ?, ?)', (key, '', flag)
+                )
+            else:
+                flags = self._split(row[0]) | {flag}
+                self.conn.execute('UPDATE folders SET flags = ? WHERE path = ?', (self._join(flags), key))
+            self.conn.commit()
+
+    def file_flag(self, file_path, flag):
+        """文件是否带有路径绑定的完成标记"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT flags FROM files WHERE path = ?', (self._key(file_path),)
+            ).fetchone()
+        return bool(row) and flag in self._split(row[0])
+
+    def set_file_flag(self, file_path, flag):
+        """为文件添加路径绑定的完成标记"""
+        if self.readonly:
+            return
+        key = self._key(file_path)
+        with self.lock:
+            row = self.conn.execute('SELECT flags FROM files WHERE path = ?', (key,)).fetchone()
+            flags = (self._split(row[0]) if row else set()) | {flag}
+            self.conn.execute(
+                'INSERT OR REPLACE INTO files (path, flags) VALUES (?, ?)', (key, self._join(flags))
+            )
+            self.conn.commit()
+
+    def content_digest(self, file_path, size, mtime):
+        """返回缓存的内容指纹，文件大小或修改时间变化后返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT size, mtime, digest FROM contents WHERE path = ?', (self._key(file_path),)
+            ).fetchone()
+        if row and row[0] == size and row[1] == mtime:
+            return row[2]
         return None
 
-
-def normalize_subtitle_filename(subtitle_path):
+    def set_content_digest(self, file_path, size, mtime, digest):
+        """缓存文件的内容指纹"""
+        if self.readonly:
+            return
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO contents (path, size, mtime, digest) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, '
+                'digest = excluded.digest',
+                (self._key(file_path), size, mtime, digest)
+            )
+            self.conn.commit()
+
+    def set_content_origin(self, file_path, origin):
+        """记录FLAC文件由内容指纹为origin的WAV转换而来"""
+        if self.readonly:
+            return
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO contents (path, origin) VALUES (?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET origin = excluded.origin',
+                (self._key(file_path), origin)
+            )
+            self.conn.commit()
+
+    def find_origin(self, origin):
+        """返回由内容指纹为origin的WAV转换得到的文件路径"""
+        with self.lock:
+            rows = self.conn.execute('SELECT path FROM contents WHERE origin = ?', (origin,)).fetchall()
+        return [os.path.join(self.root_dir, row[0]) for row in rows]
+
+    def origin_sizes(self):
+        """返回已记录的WAV来源的文件大小集合（用来跳过不可能重复的WAV）"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT DISTINCT origin FROM contents WHERE origin IS NOT NULL'
+            ).fetchall()
+        return {int(row[0].split(':', 1)[0]) for row in rows}
+
+    def loudness(self, pcm_md5):
+        """返回缓存的响度分析结果（TrackLoudness），没有时返回None"""
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM loudness WHERE pcm_md5 = ?', (pcm_md5,)).fetchone()
+        return TrackLoudness.from_dict(json.loads(row[0])) if row else None
+
+    def set_loudness(self, pcm_md5, loudness):
+        """缓存音轨的响度分析结果"""
+        if self.readonly:
+            return
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO loudness (pcm_md5, data) VALUES (?, ?)',
+                (pcm_md5, json.dumps(loudness.to_dict()))
+            )
+            self.conn.commit()
+
+    def rename_file(self, old_path, new_path):
+        """文件重命名后迁移记录"""
+        if self.readonly:
+            return
+        with self.lock:
+            for table in ('files', 'contents'):
+                self.conn.execute(f'DELETE FROM {table} WHERE path = ?', (self._key(new_path),))
+                self.conn.execute(
+                    f'UPDATE {table} SET path = ? WHERE path = ?', (self._key(new_path), self._key(old_path))
+                )
+            self.conn.commit()
+
+    def rename_folder(self, old_path, new_path):
+        """文件夹重命名后迁移其自身及所有子项的记录"""
+        if self.readonly:
+            return
+        old_key = self._key(old_path)
+        new_key = self._key(new_path)
+        prefix = os.path.join(old_key, '')
+        with self.lock:
+            for table in ('folders', 'files', 'contents'):
+                self.conn.execute(
+                    f'UPDATE {table} SET path = ? || substr(path, ?) '
+                    f'WHERE path = ? OR substr(path, 1, ?) = ?',
+                    (new_key, len(old_key) + 1, old_key, len(prefix), prefix)
+                )
+            self.conn.commit()
+
+
+# ======================== 内容索引模块 ========================
+def hash_file(file_path, chunk_size=None):
     """
-    标准化字幕文件名（去除冗余扩展名）
+    通过mmap分块计算文件内容的BLAKE2b摘要
 
     参数:
-        subtitle_path: 字幕文件路径
+        file_path: 文件路径
+        chunk_size: 每次送入摘要的字节数，默认使用HASH_CHUNK_SIZE
 
     返回:
-        成功: 新路径
-        失败: None
+        内容指纹，格式为 '大小:摘要'
     """
-    path_obj = Path(subtitle_path)
-    filename_lower = path_obj.name.lower()
+    chunk_size = chunk_size or HASH_CHUNK_SIZE
+    digest = hashlib.blake2b(digest_size=20)
+    start = time.perf_counter()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, chunk_size):
+                        digest.update(view[offset:offset + chunk_size])
+                finally:
+                    view.release()
+    METRICS.observe('hash_seconds', time.perf_counter() - start)
+    METRICS.count('hash_bytes', size)
+    return f"{size}:{digest.hexdigest()}"
+
+
+class ContentIndex:
+    """
+    按内容查找完全相同的文件
 
-    if filename_lower.endswith('.wav.vtt'):
-        new_path = path_obj.with_name(path_obj.stem.replace('.wav', '') + '.vtt')
-    elif filename_lower.endswith('.mp3.vtt'):
-        new_path = path_obj.with_name(path_obj.stem.replace('.mp3', '') + '.vtt')
-    elif filename_lower.endswith('.flac.vtt'):
-        new_path = path_obj.with_name(path_obj.stem.replace('.flac', '') + '.vtt')
-    elif filename_lower.endswith('.m4a.vtt'):
-        new_path = path_obj.with_name(path_obj.stem.replace('.m4a', '') + '.vtt')
-    elif filename_lower.endswith('.vtt'):
-        new_path = path_obj
-    else:
-        return None
+    只有大小与其他文件相同的文件才计算摘要；摘要以路径、大小、修改时间为键缓存在运行记录中，
+    文件未变化时下次运行不再读取。
+    """
 
-    try:
-        if str(new_path) != subtitle_path:
-            shutil.move(subtitle_path, new_path)
-            logger.info(f"字幕重命名: {path_obj.name} -> {new_path.name}")
-        return new_path
-    except Exception as e:
-        logger.error(f"字幕重命名失败: {path_obj.name} - {str(e)}")
-        return None
+    def __init__(self, manifest=None):
+        self.manifest = manifest
+        self.cache = {}  # {路径: (大小, 修改时间, 内容指纹)}
+
+    def digest(self, entry):
+        """返回IndexedFile的内容指纹"""
+        cached = self.cache.get(entry.path)
+        if cached is not None and cached[:2] == (entry.size, entry.mtime):
+            return cached[2]
+        digest = None
+        if self.manifest is not None:
+            digest = self.manifest.content_digest(entry.path, entry.size, entry.mtime)
+        if digest is None:
+            digest = hash_file(entry.path)
+            if self.manifest is not None:
+                self.manifest.set_content_digest(entry.path, entry.size, entry.mtime, digest)
+        self.cache[entry.path] = (entry.size, entry.mtime, digest)
+        return digest
+
+    def duplicates(self, entries):
+        """
+        查找内容完全相同的文件
+
+        参数:
+            entries: IndexedFile列表
+
+        返回:
+            [[路径, ...], ...]，每组至少两个文件，组内按路径排序
+        """
+        by_size = {}
+        for entry in entries:
+            if entry.size > 0:
+                by_size.setdefault(entry.size, []).append(entry)
+
+        groups = {}
+        for same_size in by_size.values():
+            if len(same_size) < 2:
+                continue
+            for entry in same_size:
+                try:
+                    digest = self.digest(entry)
+                except OSError as e:
+                    logger.warning(f"无法读取: {entry.path} - {e}")
+                    continue
+                groups.setdefault(digest, []).append(entry.path)
+        return [sorted(paths) for paths in groups.values() if len(paths) > 1]
+
+
+def break_hardlink(file_path):
+    """文件有多个硬链接时先复制为独立文件，修改它不会影响其他链接"""
+    if os.stat(file_path).st_nlink < 2:
+        return
+    temp_path = f"{file_path}.asmr-unlink"
+    shutil.copy2(file_path, temp_path)
+    os.replace(temp_path, file_path)
+
+
+def link_duplicate(source_path, duplicate_path):
+    """把重复文件替换为指向source_path的硬链接"""
+    if os.path.samefile(source_path, duplicate_path):
+        return False
+    temp_path = f"{duplicate_path}.asmr-link"
+    os.link(source_path, temp_path)
+    os.replace(temp_path, duplicate_path)
+    return True
 
 
-def convert_vtt_to_lrc(vtt_path):
+def report_duplicates(entries, contents, link=False, index=None):
     """
-    将VTT字幕转换为LRC格式并删除原文件
+    报告内容完全相同的文件，link为True时把每组其余文件替换为指向第一个文件的硬链接
 
     参数:
-        vtt_path: VTT文件路径
-    """
-    path_obj = Path(vtt_path)
-    lrc_path = path_obj.with_suffix('.lrc')
+        entries: IndexedFile列表
+        contents: ContentIndex实例
+        link: 是否替换为硬链接
+        index: LibraryIndex实例，替换后刷新对应记录
 
-    try:
-        # 尝试不同编码打开文件
-        encodings = ['utf-8', 'gbk', 'latin-1', 'cp1252']
-        content = None
-        for encoding in encodings:
+    返回:
+        重复文件组列表
+    """
+    sizes = {entry.path: entry.size for entry in entries}
+    groups = contents.duplicates(entries)
+    wasted = 0
+    for paths in groups:
+        size = sizes[paths[0]]
+        wasted += size * (len(paths) - 1)
+        METRICS.count('duplicate_files', len(paths) - 1)
+        METRICS.count('duplicate_bytes', size * (len(paths) - 1))
+        logger.info(f"内容相同的文件（{len(paths)} 个，每个 {size / 1048576:.1f} MB）:")
+        for path in paths:
+            logger.info(f"  {path}")
+        if not link:
+            continue
+        for path in paths[1:]:
             try:
-                with open(vtt_path, 'r', encoding=encoding) as f:
-                    content = f.readlines()
-                break
-            except UnicodeDecodeError:
-                continue
+                if link_duplicate(paths[0], path):
+                    logger.info(f"  已替换为硬链接: {Path(path).name}")
+                    if index is not None:
+                        index.add_file(path)
+            except OSError as e:
+                logger.error(f"  无法创建硬链接: {Path(path).name} - {e}")
+
+    if groups:
+        action = '已替换为硬链接' if link else '可节省'
+        logger.info(f"共 {len(groups)} 组重复文件，{action} {wasted / 1048576:.1f} MB")
+    else:
+        logger.info("没有发现重复文件")
+    return groups
 
-        if content is None:
-            logger.error(f"字幕转换失败: 无法解码文件 - {path_obj.name}")
-            return
 
-        # 转换内容格式
-        lrc_content = []
-        for line in content:
-            line = line.strip()
-            if not line or 'WEBVTT' in line or 'NOTE' in line or line.isdigit():
-                continue
+# ======================== 计划执行模块 ========================
+PLAN_ORDER = ('convert', 'copy', 'subtitle', 'rename', 'rename_dir', 'tag')  # 同一批计划中各类操作的执行顺序
 
-            if '-->' in line:
-                parts = line.split('-->')
-                start_time = parts[0].strip()
-
-                # 处理时间格式
-                if start_time.count(':') == 2:
-                    h, m, sm = start_time.split(':')
-                    s, ms = sm.split('.') if '.' in sm else (sm, '000')
-                    seconds = f"{int(m) + int(h) * 60:02d}:{s}.{ms[:2]}"
-                else:
-                    seconds = start_time.replace('.', ',', 1)
 
-                lrc_content.append(f"[{seconds}]")
-            else:
-                lrc_content.append(line)
+class PlanAction:
+    """
+    处理计划中的单个操作
+
+    op:
+        convert: WAV转FLAC（src -> dst）
+        copy: 复制内容相同的WAV已转换好的FLAC（alt -> dst）并删除src；alt不存在时改为转换
+        subtitle: VTT转LRC（src -> dst）
+        rename: 文件重命名（src -> dst）；alt为转换失败时仍存在的原文件，此时改为重命名alt
+        rename_dir: 目录重命名（src -> dst）
+        tag: 写入标签（src为音频文件，cover为封面图片，gain为ReplayGain标签）
+    flag: 完成后在运行记录中为新路径添加的标记（如'translate'）
+    digest: convert/copy的源WAV的内容指纹，完成后记录为新FLAC的来源，供以后复用
+    level: convert的压缩等级（auto编码配置在开始转换前指定），None时按FLAC_PROFILE
+    """
 
-        # 写入新文件
-        with open(lrc_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(lrc_content))
+    def __init__(self, op, src, dst=None, cover=None, alt=None, flag=None, digest=None, gain=None, level=None):
+        self.op = op
+        self.src = src
+        self.dst = dst
+        self.cover = cover
+        self.alt = alt
+        self.flag = flag
+        self.digest = digest
+        self.gain = gain
+        self.level = level
+
+    def to_dict(self):
+        return {key: value for key, value in vars(self).items() if value is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def describe(self):
+        """返回便于阅读的一行说明"""
+        if self.op == 'tag':
+            cover = f" (封面: {Path(self.cover).name})" if self.cover else ''
+            gain = f" (增益: {self.gain['REPLAYGAIN_TRACK_GAIN']})" if self.gain else ''
+            return f"标签: {self.src}{cover}{gain}"
+        labels = {'convert': '转换', 'copy': '复用转换', 'subtitle': '字幕转换', 'rename': '重命名', 'rename_dir': '目录重命名'}
+        label = labels[self.op] if self.flag != 'translate' else '翻译' + labels[self.op]
+        return f"{label}: {self.src} -> {Path(self.dst).name}"
+
+
+def summarize_plan(actions):
+    """按操作类型统计数量，返回如 '转换 3, 重命名 10' 的字符串"""
+    labels = {
+        'convert': '转换', 'copy': '复用转换', 'subtitle': '字幕转换',
+        'rename': '重命名', 'rename_dir': '目录重命名', 'tag': '标签',
+    }
+    counts = {}
+    for action in actions:
+        counts[action.op] = counts.get(action.op, 0) + 1
+    return ', '.join(f"{labels[op]} {counts[op]}" for op in PLAN_ORDER if op in counts) or '无操作'
+
+
+class PlanJournal:
+    """
+    预写式计划日志（JSON Lines）
 
-        os.remove(vtt_path)
-        logger.info(f"字幕转换: {path_obj.name} -> {lrc_path.name}")
+    每批操作在执行前整体写入并fsync，每完成一个操作追加一条完成记录。
+    程序中断后，下次运行先执行日志中未完成的操作，全部阶段完成后删除日志。
+    所有操作都可以重复执行，已完成但未来得及记录的操作会被识别为已完成。
+    """
 
-    except Exception as e:
-        logger.error(f"字幕转换失败: {path_obj.name} - {str(e)}")
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.next_id = 0
+        self._pending = self._load()
+
+    @classmethod
+    def open(cls, root_dir):
+        """打开根目录下的计划日志"""
+        return cls(os.path.join(root_dir, JOURNAL_NAME))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+
+        actions = {}
+        done = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中断时最后一行可能不完整
+                    continue
+                if 'done' in record:
+                    done.add(record['done'])
+                else:
+                    actions[record['id']] = PlanAction.from_dict(record['action'])
 
+        self.next_id = max(actions, default=-1) + 1
+        return [(action_id, action) for action_id, action in sorted(actions.items()) if action_id not in done]
 
-def associate_audio_subtitles(audio_files, subtitle_files):
+    def _open_for_append(self):
+        # 上次中断时最后一行可能不完整，先补一个换行，新记录不会接在它后面而一起失效
+        if self.file is not None:
+            return
+        torn = False
+        try:
+            with open(self.path, 'rb') as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+        except OSError:
+            pass
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            self.file.write('\n')
+
+    def pending(self):
+        """返回上次运行未完成的 [(操作编号, PlanAction), ...]"""
+        return list(self._pending)
+
+    def record(self, actions):
+        """在执行前写入一批操作，返回对应的操作编号列表"""
+        with self.lock:
+            self._open_for_append()
+            ids = []
+            for action in actions:
+                ids.append(self.next_id)
+                record = {'id': self.next_id, 'action': action.to_dict()}
+                self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self.next_id += 1
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            return ids
+
+    def complete(self, action_id):
+        """记录一个操作已完成"""
+        with self.lock:
+            self._open_for_append()
+            self.file.write(json.dumps({'done': action_id}) + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def clear(self):
+        """所有阶段完成后删除日志"""
+        self.close()
+        self._pending = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def apply_action(action, covers=None):
     """
-    将字幕文件与同名音频文件相关联
+    执行单个操作（可重复执行，已完成的操作直接视为成功）
 
     参数:
-        audio_files: 音频文件列表
-        subtitle_files: 字幕文件列表
+        action: PlanAction
+        covers: CoverCache实例，tag操作用来读取处理后的封面
 
     返回:
-        字典: {音频路径: [关联字幕路径1, ...]}
+        成功: (实际的源路径, 结果路径)
+        失败: None
     """
-    associations = {}
-    base_name_map = {}
-
-    # 创建音频基础名映射
-    for audio_path in audio_files:
-        base_name = Path(audio_path).stem
-        base_name_map[base_name] = audio_path
+    src = Path(action.src)
+    dst = Path(action.dst) if action.dst else None
+
+    if action.op in ('convert', 'copy', 'subtitle'):
+        if not src.exists() and dst.exists():
+            return action.src, action.dst
+        if action.op == 'subtitle':
+            result = convert_vtt_to_lrc(action.src, action.dst)
+            return (action.src, result) if result else None
+        if action.op == 'copy' and action.alt and os.path.exists(action.alt):
+            if reuse_flac(action.src, action.alt, action.dst):
+                return action.src, action.dst
+        if DEDUP and action.digest is None:
+            # 在编码线程中读取一遍，编码器随后从页缓存读取
+            with contextlib.suppress(OSError):
+                action.digest = hash_file(action.src)
+        result = convert_wav_to_flac(action.src, compression_level=action.level)
+        return (action.src, result) if result else None
+
+    if action.op in ('rename', 'rename_dir'):
+        if not src.exists():
+            if action.alt and os.path.exists(action.alt):
+                # 转换失败时重命名原文件
+                src = Path(action.alt)
+                dst = dst.with_suffix(src.suffix)
+            elif dst.exists():
+                return action.src, action.dst
+            else:
+                logger.error(f"重命名失败: 找不到 {src.name}")
+                return None
 
-    # 关联字幕文件
-    for sub_path in subtitle_files:
-        sub_base = Path(sub_path).stem
-        if sub_base in base_name_map:
-            audio_path = base_name_map[sub_base]
-            if audio_path not in associations:
-                associations[audio_path] = []
-            associations[audio_path].append(sub_path)
+        if dst.exists() and not (src.exists() and os.path.samefile(src, dst)):
+            logger.error(f"重命名失败: 目标已存在 {dst.name}")
+            return None
+        try:
+            src.rename(dst)
+        except OSError as e:
+            logger.error(f"重命名失败: {src.name} -> {dst.name}, 错误: {e}")
+            return None
+        if action.flag == 'translate':
+            kind = '目录' if action.op == 'rename_dir' else '文件'
+            logger.info(f"{kind}翻译重命名: {src.name} -> {dst.name}")
+        else:
+            file_type = "音频" if src.suffix.lower() in AUDIO_EXTS else "字幕"
+            logger.info(f"编号重命名({file_type}): {src.name} -> {dst.name}")
+        return str(src), str(dst)
+
+    if action.op == 'tag':
+        cover = None
+        if action.cover:
+            logger.info(f"  使用封面: {Path(action.cover).name}")
+            cover = covers.get(action.cover) if covers is not None else None
+        success = tag_audio_file(action.src, action.cover, cover, action.gain)
+        status = "成功" if success else "失败"
+        logger.info(f"  标签更新: {src.name} - {status}")
+        return (action.src, action.src) if success else None
+
+    raise ValueError(f"未知的操作类型: {action.op}")
+
+
+def _update_index_after(action, result, index, manifest, simulated=False):
+    """操作完成后同步更新索引和运行记录"""
+    used_src, new_path = result
+    if index is not None:
+        if action.op == 'rename_dir':
+            index.rename_folder(used_src, new_path)
+        elif action.op == 'tag':
+            if not simulated:
+                index.add_file(new_path)
+        elif action.op == 'rename' or simulated:
+            index.rename_file(used_src, new_path)
+        else:
+            index.replace_file(used_src, new_path)
+    if manifest is not None and action.op in ('convert', 'copy') and action.digest:
+        manifest.set_content_origin(new_path, action.digest)
+    if manifest is not None and action.op == 'convert' and not simulated:
+        LOUDNESS_STORE.persist(new_path, manifest)
+    if manifest is not None and action.flag:
+        if action.op == 'rename_dir':
+            manifest.set_folder_flag(new_path, action.flag)
+        else:
+            manifest.set_file_flag(new_path, action.flag)
+
+
+def apply_plan(actions, index=None, journal=None, dry_run=False, manifest=None, action_ids=None, max_workers=None):
+    """
+    按顺序执行处理计划
 
-    return associations
+    连续的convert、copy操作在转换线程池中并行执行（大文件优先），连续的subtitle操作并行转换，
+    其余操作依次执行。执行前先把整批操作写入计划日志。
 
+    参数:
+        actions: PlanAction列表
+        index: LibraryIndex实例，提供时同步更新
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划并在索引中模拟结果，不修改文件
+        manifest: RunManifest实例，默认使用index绑定的记录
+        action_ids: 已写入日志的操作编号（恢复上次计划时使用）
+        max_workers: 转换线程数，默认使用CONVERT_WORKERS
 
-def remove_patterns(filename):
+    返回:
+        成功的操作数
     """
-    移除文件名中的特定模式字符
+    if manifest is None and index is not None:
+        manifest = index.manifest
+    if not actions:
+        return 0
+    logger.info(f"{'预演' if dry_run else '执行'}计划: {summarize_plan(actions)}")
+
+    if dry_run:
+        for action in actions:
+            logger.info(f"  [预演] {action.describe()}")
+            result = (action.src, action.dst or action.src)
+            _update_index_after(action, result, index, None, simulated=True)
+        return len(actions)
+
+    if action_ids is None:
+        action_ids = journal.record(actions) if journal is not None else [None] * len(actions)
+
+    succeeded = 0
+    covers = None
+    cover_folder = None
+    i = 0
+    while i < len(actions):
+        op = actions[i].op
+        j = i + 1
+        if op in ('convert', 'copy', 'subtitle'):
+            while j < len(actions) and actions[j].op == op:
+                j += 1
+        batch = list(zip(action_ids[i:j], actions[i:j]))
+        i = j
+
+        if op in ('convert', 'copy', 'subtitle'):
+            results = _apply_parallel(batch, SUBTITLE_WORKERS if op == 'subtitle' else max_workers)
+        else:
+            results = []
+            for action_id, action in batch:
+                if action.op == 'tag':
+                    # 封面在同一文件夹内只读取和处理一次
+                    folder = os.path.dirname(action.src)
+                    if folder != cover_folder:
+                        covers = CoverCache([])
+                        cover_folder = folder
+                results.append((action_id, action, apply_action(action, covers)))
+
+        for action_id, action, result in results:
+            if result is None:
+                continue
+            succeeded += 1
+            _update_index_after(action, result, index, manifest)
+            if journal is not None and action_id is not None:
+                journal.complete(action_id)
 
-    参数:
-        filename: 原始文件名（不含扩展名）
+    return succeeded
+
+
+def _apply_parallel(batch, max_workers=None):
+    """并行执行一批转换操作（按源文件大小从大到小开始），返回 [(编号, 操作, 结果), ...]"""
+    def file_size(item):
+        try:
+            return os.path.getsize(item[1].src)
+        except OSError:
+            return 0
+
+    jobs = sorted(batch, key=file_size, reverse=True)
+    workers = max(1, min(max_workers or CONVERT_WORKERS, len(jobs)))
+    estimate = None
+    if batch[0][1].op == 'convert':
+        logger.info(f"开始并行转换: {len(jobs)} 个WAV文件, {workers} 个线程")
+        estimate = ENCODE_SCHEDULER.assign([action for _, action in jobs], workers)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(apply_action, action): (action_id, action) for action_id, action in jobs}
+        for future in as_completed(futures):
+            action_id, action = futures[future]
+            results.append((action_id, action, future.result()))
+    if estimate is not None:
+        ENCODE_SCHEDULER.finish(estimate, results)
+    return results
+
+
+def resume_journal(journal, index=None, manifest=None):
+    """
+    执行上次运行中断时计划日志里未完成的操作
 
     返回:
-        清理后的文件名
+        恢复执行的操作数
     """
-    cleaned = filename
-    cleaned = re.sub(PATTERNS, '', cleaned)
-    return cleaned.strip()
+    pending = journal.pending()
+    if not pending:
+        return 0
+    logger.info(f"发现未完成的计划，继续执行 {len(pending)} 个操作")
+    action_ids = [action_id for action_id, _ in pending]
+    actions = [action for _, action in pending]
+    return apply_plan(actions, index, journal, manifest=manifest, action_ids=action_ids)
+
+
+# ======================== FLAC编码模块 ========================
+class WavInfo:
+    """WAV文件的格式信息"""
+
+    def __init__(self, format_tag, channels, sample_rate, bits_per_sample, block_align, data_size):
+        self.format_tag = format_tag  # 1: 整数PCM, 3: 浮点
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.block_align = block_align
+        self.data_size = data_size  # 数据块字节数，未知（流式写入）时为None
 
+    @property
+    def is_integer_pcm(self):
+        return self.format_tag == 1
 
-def rename_file_with_counter(file_path, counter):
+
+def read_wav_header(f):
     """
-    使用编号重命名文件
+    顺序读取WAV文件头，读取完成后f位于PCM数据开头（支持管道等不可seek的流）
 
     参数:
-        file_path: 文件路径
-        counter: 当前计数器值
+        f: 以二进制模式打开的文件对象
 
     返回:
-        新文件路径
+        WavInfo，格式不正确时抛出ValueError
     """
-    path_obj = Path(file_path)
-    cleaned_name = remove_patterns(path_obj.stem)
-    new_name = f"「{counter:02d}」{cleaned_name}{path_obj.suffix}"
-    new_path = path_obj.with_name(new_name)
-
-    try:
-        path_obj.rename(new_path)
-        file_type = "音频" if path_obj.suffix.lower() in AUDIO_EXTS else "字幕"
-        logger.info(f"编号重命名({file_type}): {path_obj.name} -> {new_name}")
-        return str(new_path)
-    except Exception as e:
-        logger.error(f"编号重命名失败: {path_obj.name} - {str(e)}")
-        return None
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise ValueError('不是有效的WAV文件')
+
+    info = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError('WAV文件缺少data块')
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+        if chunk_id == b'fmt ':
+            fmt = f.read(chunk_size + (chunk_size & 1))
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+            # WAVE_FORMAT_EXTENSIBLE: 实际格式在子格式GUID的前两个字节
+            if format_tag == 0xFFFE and len(fmt) >= 26:
+                format_tag = struct.unpack('<H', fmt[24:26])[0]
+            info = WavInfo(format_tag, channels, sample_rate, bits, block_align, None)
+        elif chunk_id == b'data':
+            if info is None:
+                raise ValueError('WAV文件的data块位于fmt块之前')
+            # 流式写入的WAV可能把长度记为0或0xFFFFFFFF
+            info.data_size = chunk_size if chunk_size not in (0, 0xFFFFFFFF) else None
+            return info
+        else:
+            remaining = chunk_size + (chunk_size & 1)
+            while remaining:
+                skipped = f.read(min(remaining, 1 << 16))
+                if not skipped:
+                    raise ValueError('WAV文件不完整')
+                remaining -= len(skipped)
+
+
+def iter_wav_chunks(f, info, chunk_frames=1 << 16):
+    """
+    从data块开头按整帧读取PCM数据
 
+    参数:
+        f: 已通过read_wav_header定位到数据开头的文件对象
+        info: WavInfo
+        chunk_frames: 每次读取的帧数
 
-def process_folder(folder_path):
+    返回:
+        生成器，每次产出一段完整帧的字节数据
     """
-    处理单个文件夹（预处理流程）
+    chunk_bytes = chunk_frames * info.block_align
+    remaining = info.data_size
+    pending = b''
+    while remaining is None or remaining > 0:
+        size = chunk_bytes if remaining is None else min(chunk_bytes, remaining)
+        data = f.read(size)
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        data = pending + data
+        usable = len(data) - len(data) % info.block_align
+        pending = data[usable:]
+        if usable:
+            yield data[:usable]
+
+
+class RecordingReader:
+    """包装只读流并保存读取过的字节（解析WAV文件头后把文件头原样转发给ffmpeg）"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.recorded = bytearray()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.recorded += data
+        return data
+
+
+class PrefixedReader:
+    """先读出已经读取过的prefix，再继续读取原始流"""
+
+    def __init__(self, prefix, stream):
+        self.prefix = bytes(prefix)
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), b''
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+class PcmDigest:
+    """
+    读取WAV数据时顺带计算的PCM数据MD5和帧数，用于与FLAC的STREAMINFO比较
 
-    参数:
-        folder_path: 文件夹路径
+    启用REPLAYGAIN时同时把PCM数据送入响度分析，写入标签时不需要再解码一遍FLAC。
     """
-    logger.info(f"处理文件夹: {folder_path}")
-    audio_files, subtitle_files, _ = classify_files(folder_path)
-
-    # 1. 处理字幕文件
-    for sub_path in subtitle_files[:]:
-        normalized = normalize_subtitle_filename(sub_path)
-        if normalized:
-            # 更新路径（如果重命名）
-            subtitle_files.remove(sub_path)
-            subtitle_files.append(str(normalized))
-
-            # 转换VTT为LRC
-            if str(normalized).endswith('.vtt'):
-                convert_vtt_to_lrc(str(normalized))
-                new_path = normalized.with_suffix('.lrc')
-                subtitle_files.remove(str(normalized))
-                subtitle_files.append(str(new_path))
-
-    # 2. 处理音频文件
-    counter = 1
-    audio_files.sort(key=lambda x: Path(x).name.lower())
 
-    for audio_path in audio_files[:]:
-        # 转换WAV为FLAC
-        if Path(audio_path).suffix.lower() == '.wav':
-            new_path = convert_wav_to_flac(audio_path)
-            if new_path:
-                audio_files.remove(audio_path)
-                audio_files.append(new_path)
-                audio_path = new_path
+    def __init__(self, info):
+        self.info = info
+        self.md5 = hashlib.md5()
+        self.frames = 0
+        self.meter = LoudnessMeter.for_wav(info) if REPLAYGAIN else None
+
+    def update(self, chunk):
+        self.md5.update(chunk)
+        self.frames += len(chunk) // self.info.block_align
+        if self.meter is not None:
+            self.meter.feed_pcm(chunk, self.info)
+
+    def remember_loudness(self, flac_path):
+        """
+        FLAC校验通过后保存响度分析结果，按PCM数据MD5（与FLAC的STREAMINFO相同）索引
+
+        只有整数PCM的MD5与FLAC一致；其他格式写入标签时再解码分析。
+        """
+        if self.meter is None or not (self.info.is_integer_pcm and self.info.bits_per_sample > 8):
+            return
+        with METRICS.timer('loudness_seconds', source='convert'):
+            loudness = self.meter.result()
+        LOUDNESS_STORE.remember(str(flac_path), self.md5.hexdigest(), loudness)
 
-    # 3. 关联音频和字幕
-    associations = associate_audio_subtitles(audio_files, subtitle_files)
 
-    # 4. 重命名音频和关联字幕
-    for audio_path in audio_files:
-        # 重命名音频文件
-        new_audio_path = rename_file_with_counter(audio_path, counter)
-        if not new_audio_path:
-            continue
+def probe_wav(wav_path):
+    """读取WAV文件头，无法解析时返回None"""
+    try:
+        with open(wav_path, 'rb') as f:
+            return read_wav_header(f)
+    except (OSError, ValueError):
+        return None
 
-        # 更新关联
-        if audio_path in associations:
-            for sub_path in associations[audio_path]:
-                if os.path.exists(sub_path):
-                    # 重命名关联字幕
-                    rename_file_with_counter(sub_path, counter)
-                    # 从待处理列表中移除
-                    if sub_path in subtitle_files:
-                        subtitle_files.remove(sub_path)
 
-        counter += 1
+def pcm_digest(wav_path):
+    """单独读取一遍WAV数据计算PcmDigest（编码后端没有提供时使用），无法解析时返回None"""
+    try:
+        with open(wav_path, 'rb') as f:
+            info = read_wav_header(f)
+            digest = PcmDigest(info)
+            for chunk in iter_wav_chunks(f, info):
+                digest.update(chunk)
+    except (OSError, ValueError):
+        return None
+    return digest
 
-    # 5. 重命名剩余字幕
-    for sub_path in subtitle_files:
-        if os.path.exists(sub_path):
-            rename_file_with_counter(sub_path, counter)
-            counter += 1
 
+def _crc_table(poly, width):
+    """生成按字节查表的CRC表（高位在前）"""
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = (crc << 1) ^ poly if crc & top else crc << 1
+        table.append(crc & mask)
+    return table
 
-def preprocess_directory(root_dir):
-    """
-    预处理目录（遍历所有子文件夹）
 
-    参数:
-        root_dir: 根目录路径
-    """
-    for foldername, subfolders, filenames in os.walk(root_dir):
-        process_folder(foldername)
+FLAC_CRC8_TABLE = _crc_table(0x07, 8)  # 帧头校验
+FLAC_CRC16_TABLE = _crc_table(0x8005, 16)  # 整帧校验
+FLAC_TAIL_BYTES = 1 << 18  # STREAMINFO没有记录最大帧长度时，检查文件末尾的字节数
 
 
-# ======================== 翻译模块 ========================
-class Translator:
-    """腾讯云翻译服务封装"""
+def _flac_crc8(data):
+    crc = 0
+    for byte in data:
+        crc = FLAC_CRC8_TABLE[crc ^ byte]
+    return crc
 
-    def __init__(self, secret_id, secret_key):
-        """初始化翻译客户端"""
-        self.cred = credential.Credential(secret_id, secret_key)
-        http_profile = HttpProfile()
-        http_profile.endpoint = "tmt.tencentcloudapi.com"
-        client_profile = ClientProfile()
-        client_profile.httpProfile = http_profile
-        self.client = tmt_client.TmtClient(self.cred, "ap-guangzhou", client_profile)
-
-    def translate_text(self, text):
-        """翻译文本到中文"""
-        try:
-            req = models.TextTranslateRequest()
-            req.SourceText = text
-            req.Source = "ja"
-            req.Target = "zh"
-            req.ProjectId = 0
 
-            resp = self.client.TextTranslate(req)
-            return resp.TargetText
-        except TencentCloudSDKException as e:
-            logger.error(f"翻译错误: {e}")
+def _flac_crc16(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ FLAC_CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def parse_flac_frame_header(data, pos):
+    """
+    解析data[pos:]处的FLAC帧头
+
+    返回:
+        (帧号或首个采样号, 是否为可变块大小, 块大小)，不是有效帧头（含CRC-8错误）时返回None
+    """
+    try:
+        if data[pos] != 0xFF or data[pos + 1] & 0xFE != 0xF8:
             return None
-        except Exception as e:
-            logger.error(f"未知翻译错误: {e}")
+        variable = bool(data[pos + 1] & 1)
+        blocksize_code = data[pos + 2] >> 4
+        rate_code = data[pos + 2] & 0x0F
+        channel_code = data[pos + 3] >> 4
+        size_code = (data[pos + 3] >> 1) & 7
+        if blocksize_code == 0 or rate_code == 15 or channel_code > 10 or size_code == 3 or data[pos + 3] & 1:
+            return None
+
+        # 帧号/采样号使用类UTF-8的变长编码
+        i = pos + 4
+        first = data[i]
+        ones = 0
+        while ones < 8 and first & (0x80 >> ones):
+            ones += 1
+        if ones == 1 or ones > 7:
+            return None
+        number = first & ((1 << (7 - ones)) - 1) if ones else first
+        i += 1
+        for _ in range(max(ones - 1, 0)):
+            if data[i] & 0xC0 != 0x80:
+                return None
+            number = (number << 6) | (data[i] & 0x3F)
+            i += 1
+
+        if blocksize_code == 1:
+            blocksize = 192
+        elif blocksize_code <= 5:
+            blocksize = 576 << (blocksize_code - 2)
+        elif blocksize_code == 6:
+            blocksize = data[i] + 1
+            i += 1
+        elif blocksize_code == 7:
+            blocksize = (data[i] << 8 | data[i + 1]) + 1
+            i += 2
+        else:
+            blocksize = 256 << (blocksize_code - 8)
+        i += {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+
+        if _flac_crc8(data[pos:i]) != data[i]:
             return None
+        return number, variable, blocksize
+    except IndexError:
+        return None
 
 
-def sanitize_name(name):
+def flac_tail_complete(flac_path, stream):
     """
-    清理名称中的非法字符
+    检查FLAC文件是否以完整的最后一帧结束（不解码）
+
+    从文件末尾向前查找帧头，帧头CRC-8和整帧CRC-16（到文件末尾）都正确时即为最后一帧，
+    再确认该帧结束位置的采样号等于STREAMINFO中的总采样数。编码中断或写入被截断时不成立。
 
     参数:
-        name: 原始名称
+        flac_path: FLAC文件路径
+        stream: mutagen的FLAC StreamInfo
 
     返回:
-        清理后的名称
+        是否完整
     """
-    return re.sub(ILLEGAL_CHARS, '。', name)
+    tail_bytes = (stream.max_framesize or FLAC_TAIL_BYTES) + 16
+    with open(flac_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(max(0, size - tail_bytes))
+        data = f.read()
+
+    pos = len(data) - 1
+    while True:
+        pos = data.rfind(b'\xff', 0, pos)
+        if pos < 0:
+            return False
+        header = parse_flac_frame_header(data, pos)
+        if header is None or _flac_crc16(data[pos:]) != 0:
+            continue
+        number, variable, blocksize = header
+        first_sample = number if variable else number * stream.max_blocksize
+        return first_sample + blocksize == stream.total_samples
 
 
-def translate_and_rename_file(file_path, translator):
+def verify_flac(flac_path, info, digest=None):
     """
-    翻译并重命名单个文件
+    只读取FLAC的STREAMINFO，与源WAV比较声道数、采样率、采样数和PCM数据MD5，不解码音频
+
+    FLAC的MD5按有符号小端、每个采样占整字节计算，与16/24/32位整数PCM的WAV数据块逐字节相同；
+    位深不同（如8位、浮点WAV由ffmpeg转换格式）时只比较采样数。
+    STREAMINFO位于文件开头，截断的文件仍会记录完整的采样数和MD5，因此还要检查最后一帧是否完整。
 
     参数:
-        file_path: 文件路径
-        translator: 翻译器实例
+        flac_path: FLAC文件路径
+        info: 源WAV的WavInfo，无法解析时为None
+        digest: 源WAV的PcmDigest
 
     返回:
-        是否成功
+        一致时返回None，否则返回不一致的原因
     """
-    path_obj = Path(file_path)
-    stem = path_obj.stem
+    from mutagen.flac import FLAC
 
-    # 解析文件名中的编号和原始名称
-    match = re.match(r'(?:「(\d{2})」|【(\d{2})】)(.*)', stem)
-    if match:
-        number = match.group(1) or match.group(2)
-        original_name = match.group(3).strip()
+    try:
+        stream = FLAC(flac_path).info
+    except Exception as e:
+        return f"无法读取FLAC: {e}"
+    if info is None:
+        return None if stream.total_samples else 'FLAC中没有采样数据'
+    if stream.channels != info.channels or stream.sample_rate != info.sample_rate:
+        return f"格式不一致（WAV {info.channels}ch/{info.sample_rate}Hz，FLAC {stream.channels}ch/{stream.sample_rate}Hz）"
+
+    if digest is not None:
+        frames = digest.frames
+    elif info.data_size is not None:
+        frames = info.data_size // info.block_align
     else:
-        number = None
-        original_name = stem
-
-    # 翻译名称
-    translated = translator.translate_text(original_name)
-    if not translated:
-        logger.warning(f"翻译失败: {original_name}")
-        return False
+        frames = stream.total_samples
+    if stream.total_samples != frames:
+        return f"采样数不一致（WAV {frames}，FLAC {stream.total_samples}）"
+    if frames and not flac_tail_complete(flac_path, stream):
+        return '最后一个音频帧不完整（文件被截断）'
+
+    same_layout = (
+        info.is_integer_pcm and info.bits_per_sample in (16, 24, 32)
+        and stream.bits_per_sample == info.bits_per_sample
+        and info.block_align == info.channels * info.bits_per_sample // 8
+    )
+    if digest is not None and same_layout and stream.md5_signature:
+        if stream.md5_signature != int(digest.md5.hexdigest(), 16):
+            return 'PCM数据MD5不一致'
+    return None
+
+
+class FlacEncoder:
+    """FLAC编码后端接口"""
+
+    name = ''
+    MAX_LEVEL = 12  # 支持的最高压缩等级，更高的等级按此等级编码
+
+    def available(self):
+        """后端在当前环境是否可用"""
+        raise NotImplementedError
+
+    def supports(self, info):
+        """是否支持该WAV格式（info为WavInfo）"""
+        return True
 
-    # 清理非法字符
-    translated = sanitize_name(translated)
+    def encode(self, wav_path, flac_path, compression_level=None):
+        """
+        将WAV编码为FLAC，失败时抛出异常
 
-    # 构建新文件名
-    if number:
-        new_name = f"「{number}」{translated}[{original_name}]{path_obj.suffix}"
-    else:
-        new_name = f"{translated}[{original_name}]{path_obj.suffix}"
+        返回:
+            编码时读取的源PCM数据的PcmDigest，没有计算时返回None（由调用方另行读取）
+        """
+        with open(wav_path, 'rb') as src:
+            return self.encode_stream(src, flac_path, compression_level)
 
-    new_path = path_obj.with_name(new_name)
+    def encode_stream(self, src, flac_path, compression_level=None):
+        """从文件对象顺序读取WAV并编码为FLAC（不需要seek，可直接读取ZIP成员），返回PcmDigest"""
+        raise NotImplementedError
 
-    try:
-        path_obj.rename(new_path)
-        logger.info(f"文件翻译重命名: {path_obj.name} -> {new_name}")
-        time.sleep(0.2)  # API速率限制
-        return True
-    except Exception as e:
-        logger.error(f"文件重命名失败: {path_obj.name} -> {new_name}, 错误: {e}")
-        return False
 
+class FfmpegEncoder(FlacEncoder):
+    """
+    调用ffmpeg进程编码
 
-def translate_and_rename_directory(dir_path, translator):
+    能解析文件头的WAV由本进程读取并通过管道送入ffmpeg，读取时顺带计算PCM数据的MD5，
+    校验时不需要再读一遍源文件。
     """
-    翻译并重命名目录
 
-    参数:
-        dir_path: 目录路径
-        translator: 翻译器实例
+    name = 'ffmpeg'
 
-    返回:
-        是否成功
-    """
-    path_obj = Path(dir_path)
-    original_name = path_obj.name
+    def __init__(self):
+        self._available = None
 
-    # 翻译目录名
-    translated = translator.translate_text(original_name)
-    if not translated:
-        logger.warning(f"目录翻译失败: {original_name}")
-        return False
+    def available(self):
+        if self._available is None:
+            self._available = check_ffmpeg_available()
+        return self._available
 
-    # 清理非法字符
-    translated = sanitize_name(translated)
+    @staticmethod
+    def _command(flac_path, compression_level, source):
+        level = profile_level() if compression_level is None else compression_level
+        return ['ffmpeg'] + source + ['-compression_level', str(level), '-y', str(flac_path)]
 
-    # 构建新目录名
-    new_name = f"{translated}[{original_name}]"
-    new_path = path_obj.parent / new_name
+    def encode(self, wav_path, flac_path, compression_level=None):
+        if probe_wav(wav_path) is not None:
+            return super().encode(wav_path, flac_path, compression_level)
 
-    try:
-        path_obj.rename(new_path)
-        logger.info(f"目录翻译重命名: {original_name} -> {new_name}")
-        time.sleep(0.2)  # API速率限制
-        return True
-    except Exception as e:
-        logger.error(f"目录重命名失败: {original_name} -> {new_name}, 错误: {e}")
-        return False
+        # 文件头无法解析时由ffmpeg直接读取
+        cmd = self._command(flac_path, compression_level, ['-i', str(wav_path)])
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **SUBPROCESS_FLAGS)
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg错误代码 {process.returncode}")
+        return None
 
+    def encode_stream(self, src, flac_path, compression_level=None):
+        header = RecordingReader(src)
+        info = read_wav_header(header)
+        digest = PcmDigest(info)
+        cmd = self._command(flac_path, compression_level, ['-f', 'wav', '-i', 'pipe:0'])
+        process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **SUBPROCESS_FLAGS
+        )
+        try:
+            process.stdin.write(header.recorded)
+            for chunk in iter_wav_chunks(src, info):
+                digest.update(chunk)
+                process.stdin.write(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg提前退出，错误由返回码体现
+            pass
+        finally:
+            returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg错误代码 {returncode}")
+        return digest
+
+
+class LibFlacEncoder(FlacEncoder):
+    """
+    使用libFLAC（pyflac）在进程内编码
 
-def get_deepest_directories(root_dir):
+    按块读取WAV数据送入编码器，不需要启动外部进程。pyflac根据数组类型决定位深，
+    因此只处理16位整数PCM，其他格式交给ffmpeg。
     """
-    获取按深度排序的目录树（深度优先）
 
-    参数:
-        root_dir: 根目录路径
+    name = 'libflac'
+    MAX_LEVEL = 8
 
-    返回:
-        目录路径列表（按深度从深到浅排序）
-    """
-    dirs_by_depth = {}
+    def available(self):
+        try:
+            import numpy  # noqa: F401
+            import pyflac  # noqa: F401
+        except ImportError:
+            return False
+        return True
 
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        depth = len(Path(dirpath).relative_to(root_dir).parts)
+    def supports(self, info):
+        return info.is_integer_pcm and info.bits_per_sample == 16 and 1 <= info.channels <= 8
 
-        if depth not in dirs_by_depth:
-            dirs_by_depth[depth] = []
-        dirs_by_depth[depth].append(dirpath)
+    def encode_stream(self, src, flac_path, compression_level=None):
+        import numpy as np
+        import pyflac
 
-    # 按深度排序（从深到浅）
-    sorted_dirs = []
-    for depth in sorted(dirs_by_depth.keys(), reverse=True):
-        sorted_dirs.extend(dirs_by_depth[depth])
+        level = profile_level() if compression_level is None else compression_level
+        with open(flac_path, 'wb+') as dst:
+            info = read_wav_header(src)
+            digest = PcmDigest(info)
+            # 提供seek/tell回调，编码结束时libFLAC会回写STREAMINFO（总采样数和MD5）
+            encoder = pyflac.StreamEncoder(
+                sample_rate=info.sample_rate,
+                write_callback=lambda buffer, num_bytes, num_samples, current_frame: dst.write(buffer),
+                seek_callback=dst.seek,
+                tell_callback=dst.tell,
+                compression_level=min(level, self.MAX_LEVEL),
+            )
+            for chunk in iter_wav_chunks(src, info):
+                digest.update(chunk)
+                samples = np.frombuffer(chunk, dtype='<i2').reshape(-1, info.channels)
+                encoder.process(samples)
+            if not encoder.finish():
+                raise RuntimeError(f"libFLAC编码失败: {encoder.state}")
+        return digest
 
-    return sorted_dirs
 
+FLAC_ENCODERS = [LibFlacEncoder(), FfmpegEncoder()]
 
-def process_files_for_translation(dir_path, translator):
-    """
-    处理目录中的文件（翻译流程）
+
+def available_flac_encoders():
+    """返回按FLAC_ENCODER设置筛选后、当前可用的编码后端列表（按优先级排列）"""
+    encoders = [e for e in FLAC_ENCODERS if FLAC_ENCODER in ('auto', e.name)]
+    return [e for e in encoders if e.available()]
+
+
+def select_flac_encoder(wav_path, info=None):
+    """
+    为WAV文件选择编码后端
+
+    参数:
+        wav_path: WAV文件路径
+        info: 已读取的WavInfo，未提供时读取文件头
+
+    返回:
+        FlacEncoder实例，没有可用后端时返回None
+    """
+    # 文件头无法解析时交给ffmpeg处理
+    info = info or probe_wav(wav_path)
+
+    for encoder in available_flac_encoders():
+        if info is None and encoder.name != 'ffmpeg':
+            continue
+        if info is None or encoder.supports(info):
+            return encoder
+    return None
+
+
+# ======================== 编码配置模块 ========================
+FLAC_PROFILE_LEVELS = {'archive': 12, 'balanced': 5, 'fast': 1}  # 各编码配置的压缩等级（libFLAC最高为8，超过时按8编码）
+ENCODE_AUTO_LEVELS = (12, 8, 5, 3, 1, 0)  # auto配置可选用的压缩等级，从高到低
+CALIBRATION_SMOOTHING = 0.3  # 用实际转换结果修正校准表时新数据的权重（指数移动平均）
+
+
+def profile_level(profile=None):
+    """
+    返回编码配置的固定压缩等级
+
+    auto配置下转换队列中的文件由ENCODE_SCHEDULER逐个指定等级，
+    没有指定时（如导入ZIP时直接编码）使用balanced等级。
+    """
+    profile = FLAC_PROFILE if profile is None else profile
+    if profile == 'auto':
+        profile = 'balanced'
+    if profile not in FLAC_PROFILE_LEVELS:
+        raise ValueError(f"未知的编码配置: {profile}")
+    return FLAC_PROFILE_LEVELS[profile]
+
+
+def parse_duration(text):
+    """把'8h'、'90m'、'3600'这样的时长解析为秒数，空字符串返回None，无法解析时抛出ValueError"""
+    text = str(text).strip().lower()
+    if not text:
+        return None
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([smh]?)', text)
+    if not match:
+        raise ValueError(f"无法解析时长: {text!r}")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+
+
+def encoder_levels(encoder):
+    """返回编码后端在auto配置下实际可用的压缩等级（从高到低，超过MAX_LEVEL的等级合并）"""
+    return sorted({min(level, encoder.MAX_LEVEL) for level in ENCODE_AUTO_LEVELS}, reverse=True)
+
+
+def calibration_sample(wav_path, seconds):
+    """
+    从WAV中截取一段PCM（从三分之一处开始，避开开头的静音）
+
+    返回:
+        (PCM字节数, 可直接编码的WAV字节串)，无法读取时返回None
+    """
+    try:
+        with open(wav_path, 'rb') as f:
+            info = read_wav_header(f)
+            start = f.tell()
+            available = info.data_size if info.data_size is not None else os.path.getsize(wav_path) - start
+            length = min(available, int(seconds * info.sample_rate) * info.block_align)
+            offset = (available - length) // 3
+            f.seek(start + offset - offset % info.block_align)
+            pcm = f.read(length)
+    except (OSError, ValueError):
+        return None
+    pcm = pcm[:len(pcm) - len(pcm) % info.block_align]
+    if not pcm:
+        return None
+
+    fmt = struct.pack(
+        '<HHIIHH', info.format_tag, info.channels, info.sample_rate,
+        info.sample_rate * info.block_align, info.block_align, info.bits_per_sample
+    )
+    header = b'RIFF' + struct.pack('<I', 4 + 8 + len(fmt) + 8 + len(pcm)) + b'WAVE'
+    header += b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(pcm))
+    return len(pcm), header + pcm
+
+
+class EncodeCalibration:
+    """
+    FLAC编码速度和压缩率的校准表（JSON，多台主机可以共用同一个文件）
+
+    以“主机名/编码后端/压缩等级”为键，记录单个转换线程每秒处理的WAV字节数和FLAC与WAV的体积比。
+    某个编码后端没有记录时，截取一段待转换的WAV按各压缩等级编码测量；之后用实际转换结果
+    按指数移动平均修正，记录的速度因此也包含校验耗时和多个线程同时转换时的相互影响。
+    """
+
+    def __init__(self, path, host=None):
+        self.path = path
+        self.host = host or socket.gethostname()
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"无法读取编码校准表，重新测量: {e}")
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _key(self, encoder_name, level):
+        return f"{self.host}/{encoder_name}/{level}"
+
+    def get(self, encoder_name, level):
+        """返回 (每秒字节数, 体积比)，没有记录或记录已过期时返回None"""
+        with self.lock:
+            entry = self.entries.get(self._key(encoder_name, level))
+        if not entry or time.time() - entry.get('updated', 0) > CALIBRATION_MAX_AGE:
+            return None
+        return entry['speed'], entry['ratio']
+
+    def update(self, encoder_name, level, bytes_in, bytes_out, seconds):
+        """记录一次测量（替换原有记录）"""
+        if bytes_in <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            self.entries[self._key(encoder_name, level)] = {
+                'speed': bytes_in / seconds, 'ratio': bytes_out / bytes_in, 'updated': time.time()
+            }
+
+    def adjust(self, encoder_name, level, bytes_in, bytes_out, seconds, weight):
+        """
+        用一个文件的实际转换结果修正记录
+
+        该等级的体积比按weight平滑；实际速度与记录的偏差按同样的比例作用于该编码后端的所有等级，
+        各等级之间的相对速度沿用校准结果，没有用到的等级也能反映校验和多线程转换的开销。
+
+        参数:
+            weight: 新数据的权重（0-1）
+        """
+        key = self._key(encoder_name, level)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or bytes_in <= 0 or seconds <= 0:
+                return
+            entry['ratio'] += weight * (bytes_out / bytes_in - entry['ratio'])
+            scale = 1 + weight * (bytes_in / seconds / entry['speed'] - 1)
+            prefix = self._key(encoder_name, '')
+            for name, other in self.entries.items():
+                if name.startswith(prefix):
+                    other['speed'] *= scale
+            entry['updated'] = time.time()
+
+    def calibrate(self, encoder, wav_path):
+        """
+        截取wav_path中的一段音频，按encoder_levels中的各等级编码并记录结果
+
+        返回:
+            是否成功
+        """
+        sample = calibration_sample(wav_path, CALIBRATION_SAMPLE_SECONDS)
+        if sample is None:
+            return False
+        pcm_size, data = sample
+        tmp_dir = tempfile.mkdtemp(prefix='asmr-calibrate-')
+        try:
+            for level in encoder_levels(encoder):
+                flac_path = os.path.join(tmp_dir, f'{level}.flac')
+                start = time.perf_counter()
+                encoder.encode_stream(io.BytesIO(data), flac_path, level)
+                seconds = time.perf_counter() - start
+                self.update(encoder.name, level, pcm_size, os.path.getsize(flac_path), seconds)
+                logger.info(
+                    f"  编码校准({encoder.name}) 等级{level}: {pcm_size / seconds / 1e6:.1f} MB/秒, "
+                    f"体积比 {os.path.getsize(flac_path) / pcm_size:.3f}"
+                )
+        except Exception as e:
+            logger.warning(f"编码校准失败({encoder.name}): {e}")
+            return False
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return True
+
+    def save(self):
+        """写回校准表（先读取文件中其他主机的记录再合并，多台主机共用时不会互相覆盖）"""
+        if not self.path:
+            return
+        prefix = f"{self.host}/"
+        merged = {key: value for key, value in self._load().items() if not key.startswith(prefix)}
+        with self.lock:
+            merged.update((key, value) for key, value in self.entries.items() if key.startswith(prefix))
+            text = json.dumps(merged, ensure_ascii=False, indent=2, sort_keys=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"无法保存编码校准表: {e}")
+
+
+class EncodeJob:
+    """一个待转换的WAV及其可选的压缩等级 [(等级, 每秒字节数, 体积比), ...]（从高到低，越往后越快）"""
+
+    __slots__ = ('action', 'size', 'encoder', 'options', 'choice')
+
+    def __init__(self, action, size, encoder, options):
+        self.action = action
+        self.size = size
+        self.encoder = encoder
+        self.options = options
+        self.choice = 0
+
+    @property
+    def seconds(self):
+        return self.size / self.options[self.choice][1]
+
+    @property
+    def output_bytes(self):
+        return self.size * self.options[self.choice][2]
+
+
+def predict_makespan(jobs, workers):
+    """按转换线程池的执行顺序（jobs已按大小从大到小排列，空闲线程领取下一个）模拟整批耗时"""
+    finish = [0.0] * workers
+    for job in jobs:
+        heapq.heapreplace(finish, finish[0] + job.seconds)
+    return max(finish)
+
+
+def choose_levels(jobs, workers, allowance):
+    """
+    在时间额度内为一批文件选择压缩等级（修改各EncodeJob.choice）
+
+    从全部使用最高等级开始，超出额度时每次选择“每节省一秒增加体积最少”的一步
+    （同一编码后端从某个等级降到下一个等级），从大文件开始降级，
+    用二分查找确定降级多少个文件刚好满足额度。
+    """
+    while predict_makespan(jobs, workers) > allowance:
+        steps = {}
+        for job in jobs:
+            if job.choice + 1 < len(job.options):
+                steps.setdefault((job.encoder.name, job.choice), []).append(job)
+        if not steps:
+            return False
+
+        def cost(key):
+            job = steps[key][0]
+            (_, speed, ratio), (_, faster, larger) = job.options[job.choice:job.choice + 2]
+            return (larger - ratio) / (1 / speed - 1 / faster)
+
+        members = steps[min(steps, key=cost)]
+        members.sort(key=lambda job: job.size, reverse=True)
+        low, high = 1, len(members)
+        while low < high:
+            middle = (low + high) // 2
+            for job in members[:middle]:
+                job.choice += 1
+            fits = predict_makespan(jobs, workers) <= allowance
+            for job in members[:middle]:
+                job.choice -= 1
+            if fits:
+                high = middle
+            else:
+                low = middle + 1
+        for job in members[:low]:
+            job.choice += 1
+    return True
+
+
+class EncodeEstimate:
+    """一批转换的预测结果，转换完成后与实际结果对比"""
+
+    def __init__(self, jobs, allowance, predicted_seconds):
+        self.jobs = jobs
+        self.allowance = allowance
+        self.predicted_seconds = predicted_seconds
+        self.predicted_bytes = sum(job.output_bytes for job in jobs if job.options)
+        self.input_bytes = sum(job.size for job in jobs)
+        self.started = time.monotonic()
+
+
+class EncodeScheduler:
+    """
+    auto编码配置的调度：在时间预算内为转换队列中的每个WAV选择压缩等级
+
+    运行开始时用start()设置预算和整个队列的WAV总字节数。每批转换开始前按剩余时间和这批文件
+    在剩余队列中所占的比例得到本批的时间额度，用校准表预测各等级的耗时和体积后选择等级；
+    实际转换结果写回校准表，前面的批次比预计快时，后面的批次可以使用更高的等级。
+    没有调用start()时（如监视模式），每批转换各自使用完整的预算。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calibrate_lock = threading.Lock()
+        self.calibration = None
+        self.calibrated = set()  # 本进程已尝试测量过的编码后端，失败时不再重试
+        self.reset()
+
+    def reset(self):
+        """清除本次运行的预算和统计（校准表保留）"""
+        with self.lock:
+            self.deadline = None
+            self.remaining_bytes = None
+            self.totals = {'predicted_seconds': 0.0, 'seconds': 0.0, 'predicted_bytes': 0.0, 'bytes': 0, 'files': 0}
+
+    def start(self, total_bytes):
+        """
+        开始一次运行
+
+        参数:
+            total_bytes: 整个转换队列的WAV总字节数
+        """
+        self.reset()
+        if FLAC_PROFILE != 'auto':
+            return
+        budget = parse_duration(ENCODE_BUDGET)
+        with self.lock:
+            self.deadline = time.monotonic() + budget if budget else None
+            self.remaining_bytes = total_bytes
+        if budget:
+            logger.info(f"自动编码配置: 待转换WAV共 {total_bytes / 1e9:.2f} GB，时间预算 {budget:g} 秒")
+
+    def _calibration(self):
+        with self.lock:
+            if self.calibration is None:
+                self.calibration = EncodeCalibration(CALIBRATION_PATH)
+            return self.calibration
+
+    def _options(self, encoder, wav_path):
+        """返回编码后端可选的 [(等级, 每秒字节数, 体积比), ...]，去掉比更高等级还慢的等级"""
+        calibration = self._calibration()
+        levels = encoder_levels(encoder)
+        measured = [calibration.get(encoder.name, level) for level in levels]
+        if None in measured:
+            # 同时开始的多批转换只测量一次，其他批次等待测量结果
+            with self.calibrate_lock:
+                if encoder.name not in self.calibrated:
+                    self.calibrated.add(encoder.name)
+                    logger.info(f"测量本机编码速度({encoder.name}): {Path(wav_path).name}")
+                    if calibration.calibrate(encoder, wav_path):
+                        calibration.save()
+            measured = [calibration.get(encoder.name, level) for level in levels]
+
+        options = []
+        for level, entry in zip(levels, measured):
+            if entry is not None and (not options or entry[0] > options[-1][1]):
+                options.append((level, entry[0], entry[1]))
+        return options
+
+    def assign(self, actions, workers):
+        """
+        为一批convert操作选择压缩等级（写入action.level）
+
+        参数:
+            actions: PlanAction列表，已按源文件大小从大到小排列
+            workers: 转换线程数
+
+        返回:
+            EncodeEstimate，非auto配置时返回None
+        """
+        if FLAC_PROFILE != 'auto' or not actions:
+            return None
+        jobs = []
+        for action in actions:
+            try:
+                size = os.path.getsize(action.src)
+            except OSError:
+                continue
+            encoder = select_flac_encoder(action.src)
+            options = self._options(encoder, action.src) if encoder is not None else []
+            jobs.append(EncodeJob(action, size, encoder, options))
+        known = [job for job in jobs if job.options]
+
+        with self.lock:
+            batch_bytes = sum(job.size for job in jobs)
+            deadline = self.deadline
+            if deadline is None and self.remaining_bytes is None and ENCODE_BUDGET:
+                deadline = time.monotonic() + parse_duration(ENCODE_BUDGET)
+            remaining_bytes = max(self.remaining_bytes or 0, batch_bytes)
+        allowance = None
+        if deadline is not None and batch_bytes:
+            allowance = max(0.0, deadline - time.monotonic()) * batch_bytes / remaining_bytes
+
+        if allowance is not None and known and not choose_levels(known, workers, allowance):
+            logger.warning("时间额度不足，全部使用最快的压缩等级也无法按时完成")
+        for job in known:
+            job.action.level = job.options[job.choice][0]
+
+        predicted = predict_makespan(known, workers) if known else 0.0
+        estimate = EncodeEstimate(jobs, allowance, predicted)
+        levels = {}
+        for job in known:
+            levels[job.action.level] = levels.get(job.action.level, 0) + 1
+        summary = ', '.join(f"等级{level} {count} 个" for level, count in sorted(levels.items(), reverse=True))
+        limit = f"，时间额度 {allowance:.1f} 秒" if allowance is not None else ''
+        logger.info(
+            f"自动编码配置: {len(jobs)} 个WAV共 {batch_bytes / 1e6:.1f} MB{limit}，{summary or '无校准数据'}；"
+            f"预计 {predicted:.1f} 秒，输出 {estimate.predicted_bytes / 1e6:.1f} MB"
+        )
+        return estimate
+
+    def observe(self, encoder_name, level, bytes_in, bytes_out, seconds):
+        """用一个文件的实际转换结果修正校准表（只在auto配置下记录）"""
+        if FLAC_PROFILE != 'auto' or self.calibration is None or level is None:
+            return
+        self.calibration.adjust(encoder_name, level, bytes_in, bytes_out, seconds, CALIBRATION_SMOOTHING)
+
+    def finish(self, estimate, results):
+        """
+        一批转换完成后对比预测与实际结果，并保存校准表
+
+        参数:
+            estimate: assign返回的EncodeEstimate
+            results: [(编号, 操作, 结果), ...]
+        """
+        seconds = time.monotonic() - estimate.started
+        predicted = {id(job.action) for job in estimate.jobs if job.options}
+        actual_bytes = 0
+        for _, action, result in results:
+            if result is not None and id(action) in predicted:
+                with contextlib.suppress(OSError):
+                    actual_bytes += os.path.getsize(result[1])
+        with self.lock:
+            if self.remaining_bytes is not None:
+                self.remaining_bytes = max(0, self.remaining_bytes - estimate.input_bytes)
+            self.totals['predicted_seconds'] += estimate.predicted_seconds
+            self.totals['seconds'] += seconds
+            self.totals['predicted_bytes'] += estimate.predicted_bytes
+            self.totals['bytes'] += actual_bytes
+            self.totals['files'] += len(estimate.jobs)
+        METRICS.count('encode_plan_seconds', estimate.predicted_seconds, kind='predicted')
+        METRICS.count('encode_plan_seconds', seconds, kind='actual')
+        METRICS.count('encode_plan_bytes', estimate.predicted_bytes, kind='predicted')
+        METRICS.count('encode_plan_bytes', actual_bytes, kind='actual')
+        logger.info(
+            f"编码预测对比: 预计 {estimate.predicted_seconds:.1f} 秒、{estimate.predicted_bytes / 1e6:.1f} MB，"
+            f"实际 {seconds:.1f} 秒、{actual_bytes / 1e6:.1f} MB"
+        )
+        if self.calibration is not None:
+            self.calibration.save()
+
+    def report(self):
+        """在日志中输出本次运行所有批次的预测与实际结果"""
+        with self.lock:
+            totals = dict(self.totals)
+            deadline = self.deadline
+        if not totals['files']:
+            return
+        logger.info(
+            f"自动编码配置汇总: {totals['files']} 个WAV，预计 {totals['predicted_seconds']:.1f} 秒、"
+            f"{totals['predicted_bytes'] / 1e6:.1f} MB，实际 {totals['seconds']:.1f} 秒、{totals['bytes'] / 1e6:.1f} MB"
+        )
+        if deadline is not None and time.monotonic() > deadline:
+            logger.warning(f"转换超出时间预算 {time.monotonic() - deadline:.1f} 秒")
+
+
+ENCODE_SCHEDULER = EncodeScheduler()
+
+
+def queued_wav_bytes(index, root_dir):
+    """返回索引中root_dir下所有WAV的总字节数（auto编码配置的队列大小）"""
+    return sum(
+        entry.size for folder in index.folders_under(root_dir) for entry in index.files(folder, 'audio')
+        if entry.name.lower().endswith('.wav')
+    )
+
+
+# ======================== ZIP导入模块 ========================
+INGEST_STAGING_PREFIX = '.asmr-ingest-'  # 导入过程中的临时文件夹前缀，完成后整体改名为专辑文件夹
+
+
+def _zip_unicode_path(info, raw_name):
+    """读取Info-ZIP Unicode Path扩展字段（0x7075），校验与原始文件名对应时返回UTF-8文件名"""
+    extra = info.extra
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[i:i + 4])
+        data = extra[i + 4:i + 4 + size]
+        if header_id == 0x7075 and len(data) > 5 and data[0] == 1:
+            if struct.unpack('<I', data[1:5])[0] == zlib.crc32(raw_name):
+                try:
+                    return data[5:].decode('utf-8')
+                except UnicodeDecodeError:
+                    return None
+        i += 4 + size
+    return None
+
+
+def repair_zip_name(info):
+    """
+    还原ZIP成员名
+
+    未设置UTF-8标志时zipfile按CP437解码文件名，日文压缩包（CP932）因此变成乱码。
+    先把文件名还原为原始字节，优先使用Unicode Path扩展字段，否则按ZIP_NAME_ENCODINGS依次尝试解码。
+
+    参数:
+        info: zipfile.ZipInfo
+
+    返回:
+        以'/'分隔的成员名
+    """
+    name = info.orig_filename
+    if not info.flag_bits & 0x800:
+        try:
+            raw_name = name.encode('cp437')
+        except UnicodeEncodeError:
+            # 已按其他编码解码（如Python 3.11的metadata_encoding）
+            raw_name = None
+        if raw_name is not None:
+            name = _zip_unicode_path(info, raw_name)
+            for encoding in ZIP_NAME_ENCODINGS:
+                if name is not None:
+                    break
+                try:
+                    name = raw_name.decode(encoding)
+                except UnicodeDecodeError:
+                    continue
+            if name is None:
+                name = info.orig_filename
+    return name.replace('\\', '/')
+
+
+def zip_member_parts(name):
+    """
+    把成员名拆分为安全的路径片段（去掉盘符和空片段，清理非法字符）
+
+    返回:
+        片段列表，包含'..'（可能写到目标目录之外）时返回None
+    """
+    parts = []
+    for part in name.split('/'):
+        if part in ('', '.'):
+            continue
+        if part == '..':
+            return None
+        parts.append(sanitize_name(part.rstrip(' .')) or '_')
+    if parts and re.match(r'^[A-Za-z]:$', name.split('/')[0]):
+        parts = parts[1:]
+    return parts
+
+
+def plan_archive(zip_file, archive_path):
+    """
+    计算压缩包的解压方案
+
+    所有成员都位于同一个顶层文件夹时，以该文件夹作为专辑名，否则使用压缩包文件名。
+
+    返回:
+        (专辑名, [(ZipInfo, 相对专辑的路径片段), ...])
+    """
+    members = []
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        parts = zip_member_parts(repair_zip_name(info))
+        if not parts:
+            logger.warning(f"跳过不安全的成员路径: {info.filename}")
+            continue
+        members.append((info, parts))
+
+    tops = {parts[0] for _, parts in members}
+    if len(tops) == 1 and all(len(parts) > 1 for _, parts in members):
+        return tops.pop(), [(info, parts[1:]) for info, parts in members]
+    return sanitize_name(Path(archive_path).stem), members
+
+
+def stream_wav_member(zip_file, info, flac_path):
+    """
+    把ZIP中的WAV成员直接送入FLAC编码器，不在磁盘上写出WAV
+
+    编码后按STREAMINFO校验，并读完成员剩余数据以触发zipfile的CRC校验。
+
+    返回:
+        是否成功（失败时删除不完整的FLAC，由调用方改为原样解压）
+    """
+    try:
+        with zip_file.open(info) as raw:
+            header = RecordingReader(raw)
+            wav_info = read_wav_header(header)
+            encoder = select_flac_encoder(None, wav_info)
+            if encoder is None:
+                return False
+            with METRICS.timer('encode_seconds', encoder=encoder.name):
+                digest = encoder.encode_stream(PrefixedReader(header.recorded, raw), flac_path)
+            while raw.read(1 << 20):
+                pass
+        if VERIFY_FLAC:
+            with METRICS.timer('verify_seconds'):
+                problem = verify_flac(flac_path, wav_info, digest)
+            if problem is not None:
+                raise ValueError(f"FLAC校验失败 - {problem}")
+        if digest is not None:
+            digest.remember_loudness(flac_path)
+    except Exception as e:
+        logger.warning(f"无法直接编码 {Path(info.filename).name}，改为原样解压: {e}")
+        with contextlib.suppress(OSError):
+            os.remove(flac_path)
+        return False
+    return True
+
+
+def extract_member(zip_file, info, target_path):
+    """解压单个成员：WAV直接编码为FLAC，其他文件按块复制，返回写出的路径"""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if target_path.lower().endswith('.wav'):
+        flac_path = target_path[:-4] + '.flac'
+        if stream_wav_member(zip_file, info, flac_path):
+            METRICS.count('ingest_files', kind='flac')
+            METRICS.count('bytes_out', os.path.getsize(flac_path), stage='ingest')
+            return flac_path
+
+    with zip_file.open(info) as src, open(target_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    METRICS.count('ingest_files', kind='file')
+    METRICS.count('bytes_out', info.file_size, stage='ingest')
+    return target_path
+
+
+def ingest_archive(archive_path, dest_dir, dry_run=False, max_workers=None):
+    """
+    把一个ZIP导入为dest_dir下的专辑文件夹
+
+    成员先解压到临时文件夹，全部成功后整体改名为专辑文件夹，中断时不会留下不完整的专辑。
+    WAV成员由转换线程池并行编码为FLAC，其他成员依次复制。
+
+    参数:
+        archive_path: ZIP路径
+        dest_dir: 目标目录
+        dry_run: 只输出导入计划
+        max_workers: 同时编码的WAV数，默认使用CONVERT_WORKERS
+
+    返回:
+        专辑文件夹路径，失败或跳过时返回None
+    """
+    with zipfile.ZipFile(archive_path) as zip_file:
+        album_name, members = plan_archive(zip_file, archive_path)
+        album_path = os.path.join(dest_dir, album_name)
+        wav_count = sum(1 for _, parts in members if parts[-1].lower().endswith('.wav'))
+        logger.info(f"导入 {Path(archive_path).name} -> {album_name}（{len(members)} 个文件，其中WAV {wav_count} 个）")
+        if os.path.exists(album_path):
+            logger.warning(f"专辑文件夹已存在，跳过: {album_path}")
+            return None
+        if dry_run:
+            for _, parts in members:
+                logger.info(f"  [预演] {'/'.join(parts)}")
+            return None
+
+        staging = os.path.join(dest_dir, INGEST_STAGING_PREFIX + album_name)
+        if os.path.exists(staging):
+            # 上次导入中断留下的临时文件夹
+            shutil.rmtree(staging)
+        try:
+            wavs = []
+            for info, parts in members:
+                target_path = os.path.join(staging, *parts)
+                if parts[-1].lower().endswith('.wav'):
+                    wavs.append((info, target_path))
+                else:
+                    extract_member(zip_file, info, target_path)
+
+            workers = max(1, min(max_workers or CONVERT_WORKERS, len(wavs) or 1))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(extract_member, zip_file, info, path) for info, path in wavs]:
+                    future.result()
+
+            os.rename(staging, album_path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    METRICS.count('ingest_archives')
+    METRICS.count('bytes_in', os.path.getsize(archive_path), stage='ingest')
+    return album_path
+
+
+def ingest_archives(ingest_dir, dest_dir, dry_run=False):
+    """
+    导入目录中的所有ZIP，成功后删除或移动到imported文件夹
+
+    返回:
+        新专辑文件夹路径列表
+    """
+    archives = sorted(
+        entry.path for entry in os.scandir(ingest_dir)
+        if entry.is_file() and entry.name.lower().endswith('.zip')
+    )
+    albums = []
+    for archive_path in archives:
+        try:
+            album_path = ingest_archive(archive_path, dest_dir, dry_run)
+        except Exception as e:
+            logger.error(f"导入失败: {Path(archive_path).name} - {e}")
+            continue
+        if album_path is None:
+            continue
+        albums.append(album_path)
+        if INGEST_DELETE:
+            os.remove(archive_path)
+        else:
+            imported_dir = os.path.join(ingest_dir, 'imported')
+            os.makedirs(imported_dir, exist_ok=True)
+            os.replace(archive_path, os.path.join(imported_dir, Path(archive_path).name))
+    if archives:
+        logger.info(f"已导入 {len(albums)}/{len(archives)} 个压缩包")
+    return albums
+
+
+# ======================== 预处理模块 ========================
+@timed('convert')
+def convert_wav_to_flac(wav_path, encoder=None, compression_level=None):
+    """
+    将WAV转换为FLAC（编码后端由FLAC_ENCODER决定）
+
+    参数:
+        wav_path: WAV文件路径
+        encoder: 指定的FlacEncoder实例，默认按文件格式自动选择
+        compression_level: 压缩等级，默认使用FLAC_PROFILE对应的等级
+
+    返回:
+        成功: 新FLAC文件路径
+        失败: None
+    """
+    wav_path_obj = Path(wav_path)
+    flac_path = wav_path_obj.with_suffix('.flac')
+
+    info = probe_wav(wav_path)
+    encoder = encoder or select_flac_encoder(wav_path, info)
+    if encoder is None:
+        logger.error(f"转换失败: {wav_path_obj.name} - 没有可用的FLAC编码器")
+        return None
+
+    level = profile_level() if compression_level is None else compression_level
+    started = time.perf_counter()
+    try:
+        try:
+            with METRICS.timer('encode_seconds', encoder=encoder.name):
+                digest = encoder.encode(wav_path_obj, flac_path, level)
+        except Exception as e:
+            logger.error(f"转换失败({encoder.name}): {wav_path_obj.name} - {str(e)}")
+            # 删除不完整的输出文件
+            if flac_path.exists():
+                os.remove(flac_path)
+            return None
+
+        if not flac_path.exists():
+            logger.error(f"转换失败: {wav_path_obj.name} - 未生成输出文件")
+            return None
+
+        # 删除WAV前确认FLAC完整：编码在转换线程中进行，校验紧接着在同一线程中完成
+        if VERIFY_FLAC and not check_flac(wav_path, flac_path, info, digest):
+            return None
+        if digest is not None:
+            digest.remember_loudness(flac_path)
+
+        bytes_in, bytes_out = os.path.getsize(wav_path), os.path.getsize(flac_path)
+        METRICS.count('bytes_in', bytes_in, stage='convert')
+        METRICS.count('bytes_out', bytes_out, stage='convert')
+        METRICS.count('encode_levels', level=min(level, encoder.MAX_LEVEL))
+        ENCODE_SCHEDULER.observe(
+            encoder.name, min(level, encoder.MAX_LEVEL), bytes_in, bytes_out, time.perf_counter() - started
+        )
+        try:
+            os.remove(wav_path)
+            logger.info(f"转换成功并删除原文件: {wav_path_obj.name} -> {flac_path.name}")
+            return str(flac_path)
+        except Exception as e:
+            logger.error(f"无法删除原文件 {wav_path_obj.name}: {str(e)}")
+            return None
+
+    except Exception as e:
+        logger.error(f"转换失败: {wav_path_obj.name} - {str(e)}")
+        return None
+
+
+def check_flac(wav_path, flac_path, info, digest=None):
+    """
+    校验转换结果，不一致时删除FLAC并保留WAV
+
+    参数:
+        wav_path: 源WAV路径
+        flac_path: 输出FLAC路径
+        info: 源WAV的WavInfo
+        digest: 编码时计算的PcmDigest，没有时单独读取一遍WAV
+
+    返回:
+        是否一致
+    """
+    with METRICS.timer('verify_seconds'):
+        if digest is None and info is not None:
+            digest = pcm_digest(wav_path)
+        problem = verify_flac(flac_path, info, digest)
+    if problem is None:
+        return True
+    logger.error(f"FLAC校验失败，保留原文件: {Path(wav_path).name} - {problem}")
+    METRICS.count('verify_failures')
+    with contextlib.suppress(OSError):
+        os.remove(flac_path)
+    return False
+
+
+def reuse_flac(wav_path, source_flac, flac_path):
+    """
+    用内容相同的WAV已转换好的FLAC代替编码：复制并清除其中的标签和图片，成功后删除WAV
+
+    参数:
+        wav_path: WAV文件路径
+        source_flac: 已有的FLAC文件
+        flac_path: 输出FLAC路径
+
+    返回:
+        是否成功（失败时调用方改为正常编码）
+    """
+    from mutagen.flac import FLAC
+
+    try:
+        shutil.copyfile(source_flac, flac_path)
+        audio = FLAC(flac_path)
+        audio.clear_pictures()
+        if audio.tags is not None:
+            audio.tags.clear()
+        audio.save()
+        if VERIFY_FLAC and not check_flac(wav_path, flac_path, probe_wav(wav_path)):
+            return False
+        os.remove(wav_path)
+    except Exception as e:
+        logger.warning(f"无法复用 {Path(source_flac).name}，改为重新编码: {e}")
+        with contextlib.suppress(OSError):
+            if os.path.exists(wav_path):
+                os.remove(flac_path)
+        return False
+    METRICS.count('dedup_reused')
+    METRICS.count('files', stage='convert')
+    logger.info(f"复用内容相同的FLAC并删除原文件: {Path(wav_path).name} <- {source_flac}")
+    return True
+
+
+def normalized_subtitle_path(subtitle_path):
+    """
+    计算标准化后的字幕路径（只计算，不修改文件）
+
+    参数:
+        subtitle_path: 字幕文件路径
+
+    返回:
+        VTT字幕: 去除冗余扩展名后的路径
+        其他: None
+    """
+    path_obj = Path(subtitle_path)
+    filename_lower = path_obj.name.lower()
+
+    if filename_lower.endswith('.wav.vtt'):
+        new_path = path_obj.with_name(path_obj.stem.replace('.wav', '') + '.vtt')
+    elif filename_lower.endswith('.mp3.vtt'):
+        new_path = path_obj.with_name(path_obj.stem.replace('.mp3', '') + '.vtt')
+    elif filename_lower.endswith('.flac.vtt'):
+        new_path = path_obj.with_name(path_obj.stem.replace('.flac', '') + '.vtt')
+    elif filename_lower.endswith('.m4a.vtt'):
+        new_path = path_obj.with_name(path_obj.stem.replace('.m4a', '') + '.vtt')
+    elif filename_lower.endswith('.vtt'):
+        new_path = path_obj
+    else:
+        return None
+    return new_path
+
+
+def detect_encoding(file_path, sample_size=None):
+    """
+    读取文件开头一小段检测文本编码
+
+    参数:
+        file_path: 文件路径
+        sample_size: 读取的字节数，默认使用SUBTITLE_SNIFF_BYTES
+
+    返回:
+        编码名称，全部候选都无法解码时返回None
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size or SUBTITLE_SNIFF_BYTES)
+        truncated = bool(f.read(1))
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    for encoding in SUBTITLE_ENCODINGS:
+        # 样本末尾可能截断多字节字符，使用增量解码器
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=not truncated)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+VTT_TIMESTAMP = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{1,2})[.,](\d{1,3})')
+VTT_CUE_TAG = re.compile(r'<[^>]*>')
+
+
+def parse_vtt_timestamp(timestamp):
+    """
+    解析WebVTT时间戳（hh:mm:ss.ttt 或 mm:ss.ttt）
+
+    返回:
+        毫秒数，格式不正确返回None
+    """
+    match = VTT_TIMESTAMP.fullmatch(timestamp.strip())
+    if not match:
+        return None
+    h, m, s, ms = match.groups()
+    return ((int(h or 0) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms.ljust(3, '0'))
+
+
+def format_lrc_timestamp(milliseconds):
+    """将毫秒数格式化为LRC时间标签 [mm:ss.xxx]（分钟可超过两位）"""
+    minutes, rest = divmod(milliseconds, 60000)
+    seconds, ms = divmod(rest, 1000)
+    return f"[{minutes:02d}:{seconds:02d}.{ms:03d}]"
+
+
+def iter_vtt_as_lrc(lines):
+    """
+    流式解析WebVTT并逐条产出LRC行
+
+    跳过文件头、NOTE/STYLE/REGION块和cue标识，
+    多行cue文本合并为一行，去除<v 说话人>等标签并还原HTML实体。
+
+    参数:
+        lines: 可迭代的文本行（如打开的文件对象）
+
+    返回:
+        生成器，每次产出一行LRC文本（不含换行符）
+    """
+    in_header = True
+    skip_block = False
+    start = None
+    pending_text = []
+
+    for raw_line in lines:
+        line = raw_line.strip()
+
+        # 空行结束当前块
+        if not line:
+            if start is not None:
+                text = ' '.join(pending_text)
+                yield f"{format_lrc_timestamp(start)}{text}"
+            in_header = False
+            skip_block = False
+            start = None
+            pending_text = []
+            continue
+
+        if in_header or skip_block:
+            continue
+
+        if start is None:
+            if '-->' in line:
+                start = parse_vtt_timestamp(line.split('-->', 1)[0])
+                if start is None:
+                    skip_block = True
+            elif line.startswith(('NOTE', 'STYLE', 'REGION')):
+                skip_block = True
+            # 其他情况为cue标识，忽略
+            continue
+
+        text = html.unescape(VTT_CUE_TAG.sub('', line)).strip()
+        if text:
+            pending_text.append(text)
+
+    if start is not None:
+        yield f"{format_lrc_timestamp(start)}{' '.join(pending_text)}"
+
+
+@timed('subtitle')
+def convert_vtt_to_lrc(vtt_path, lrc_path=None):
+    """
+    将VTT字幕转换为LRC格式并删除原文件（流式读写，不把整个文件读入内存）
+
+    参数:
+        vtt_path: VTT文件路径
+        lrc_path: 输出的LRC路径，默认与VTT同名
+
+    返回:
+        成功: 新LRC文件路径
+        失败: None
+    """
+    path_obj = Path(vtt_path)
+    lrc_path = Path(lrc_path) if lrc_path else path_obj.with_suffix('.lrc')
+    tmp_path = lrc_path.with_name(lrc_path.name + '.tmp')
+
+    try:
+        encoding = detect_encoding(vtt_path)
+        if encoding is None:
+            logger.error(f"字幕转换失败: 无法解码文件 - {path_obj.name}")
+            return None
+
+        # 先写临时文件，完成后再替换，避免中断时留下不完整的LRC
+        with open(vtt_path, 'r', encoding=encoding, errors='replace') as src, \
+                open(tmp_path, 'w', encoding='utf-8') as dst:
+            for i, lrc_line in enumerate(iter_vtt_as_lrc(src)):
+                if i:
+                    dst.write('\n')
+                dst.write(lrc_line)
+
+        os.replace(tmp_path, lrc_path)
+        METRICS.count('bytes_in', os.path.getsize(vtt_path), stage='subtitle')
+        METRICS.count('bytes_out', os.path.getsize(lrc_path), stage='subtitle')
+        os.remove(vtt_path)
+        logger.info(f"字幕转换: {path_obj.name} -> {lrc_path.name}")
+        return str(lrc_path)
+
+    except Exception as e:
+        logger.error(f"字幕转换失败: {path_obj.name} - {str(e)}")
+        if tmp_path.exists():
+            os.remove(tmp_path)
+        return None
+
+
+TRACK_KEY_EXTS = frozenset(AUDIO_EXTS | {'.vtt', '.lrc'})  # 计算配对键时去掉的扩展名
+
+
+def track_key(file_path):
+    """
+    音频与字幕配对用的规范化文件名
+
+    去掉末尾所有音频、字幕扩展名（01.wav.vtt、01.flac.lrc都视为01）及其前面的空白（"01 .lrc"），
+    统一全角半角和大小写。
+
+    参数:
+        file_path: 文件路径
+
+    返回:
+        配对键
+    """
+    name = unicodedata.normalize('NFKC', os.path.basename(file_path)).casefold()
+    stem, ext = os.path.splitext(name)
+    while ext in TRACK_KEY_EXTS:
+        name = stem.rstrip()
+        stem, ext = os.path.splitext(name)
+    return name.strip()
+
+
+class TrackRecord:
+    """
+    一个音轨：音频文件及配对键相同的字幕
+
+    没有同名音频的字幕按配对键单独成组，此时audio为None。
+    number为编号重命名时分配给整组的编号。
+    """
+
+    __slots__ = ('key', 'audio', 'subtitles', 'number')
+
+    def __init__(self, key, audio=None):
+        self.key = key
+        self.audio = audio
+        self.subtitles = []
+        self.number = None
+
+    @property
+    def lead(self):
+        """决定整组文件名的文件：音频，没有音频时为第一个字幕"""
+        return self.audio or self.subtitles[0]
+
+    def numbered_moves(self):
+        """
+        计算整组的编号重命名（只计算，不修改文件）
+
+        返回:
+            [(原路径, 新路径), ...]，字幕使用音频的新文件名加上自己的扩展名
+        """
+        new_lead = numbered_path(self.lead, self.number)
+        followers = [path for path in self.subtitles if path != self.lead]
+        moves = [(self.lead, str(new_lead))]
+        moves.extend(follow_lead_name(new_lead, followers, lambda path: numbered_path(path, self.number)))
+        return moves
+
+
+def follow_lead_name(new_lead, subtitle_paths, fallback):
+    """
+    组内字幕随音频改名：使用音频的新文件名加上字幕自己的扩展名，改名后仍与音频同名配对
+
+    参数:
+        new_lead: 音频（或组内第一个字幕）的新路径(Path)
+        subtitle_paths: 组内其他字幕路径
+        fallback: 扩展名与组内已有文件重复时，计算该字幕新路径的函数
+
+    返回:
+        [(字幕路径, 新路径), ...]，新路径仍与组内其他文件重复时保持原路径
+    """
+    moves = []
+    used = {str(new_lead).lower()}
+    for sub_path in subtitle_paths:
+        new_path = str(new_lead.with_suffix(Path(sub_path).suffix))
+        if new_path.lower() in used:
+            new_path = str(fallback(sub_path))
+        if new_path.lower() in used:
+            new_path = sub_path
+        used.add(new_path.lower())
+        moves.append((sub_path, new_path))
+    return moves
+
+
+def group_tracks(audio_files, subtitle_files):
+    """
+    按配对键把字幕归入音轨
+
+    参数:
+        audio_files: 音频文件列表（按编号顺序）
+        subtitle_files: 字幕文件列表
+
+    返回:
+        TrackRecord列表：先是各音频（保持audio_files的顺序），再是没有同名音频的字幕组（按首次出现的顺序）；
+        多个音频的配对键相同时，字幕归入第一个
+    """
+    tracks = []
+    by_key = {}
+    for audio_path in audio_files:
+        track = TrackRecord(track_key(audio_path), audio_path)
+        tracks.append(track)
+        by_key.setdefault(track.key, track)
+
+    for sub_path in subtitle_files:
+        key = track_key(sub_path)
+        track = by_key.get(key)
+        if track is None:
+            track = by_key[key] = TrackRecord(key)
+            tracks.append(track)
+        track.subtitles.append(sub_path)
+    return tracks
+
+
+def associate_audio_subtitles(audio_files, subtitle_files):
+    """
+    将字幕文件与同名音频文件相关联（按track_key配对）
+
+    参数:
+        audio_files: 音频文件列表
+        subtitle_files: 字幕文件列表
+
+    返回:
+        字典: {音频路径: [关联字幕路径1, ...]}
+    """
+    return {
+        track.audio: track.subtitles
+        for track in group_tracks(audio_files, subtitle_files)
+        if track.audio and track.subtitles
+    }
+
+
+def match_track_prefix(stem):
+    """
+    识别文件名开头的音轨编号前缀（如 track01_、RJ123456 、【Trck03】、トラック5、SP-A）
+
+    PATTERNS以^锚定，各部分的长度都有上限，匹配只检查文件名开头有限的字符，耗时与标题长度无关。
+
+    参数:
+        stem: 文件名（不含扩展名）
+
+    返回:
+        前缀的结束位置，没有编号前缀时返回0
+    """
+    match = PATTERNS.match(stem)
+    return match.end() if match else 0
+
+
+@functools.lru_cache(maxsize=TRACK_PREFIX_CACHE_SIZE)
+def remove_patterns(filename):
+    """
+    移除文件名开头的音轨编号前缀
+
+    参数:
+        filename: 原始文件名（不含扩展名）
+
+    返回:
+        清理后的文件名
+    """
+    return filename[match_track_prefix(filename):].strip()
+
+
+def numbered_path(file_path, counter):
+    """
+    计算带编号的新路径（只计算，不修改文件）
+
+    参数:
+        file_path: 文件路径
+        counter: 当前计数器值
+
+    返回:
+        新文件路径(Path)
+    """
+    path_obj = Path(file_path)
+    # 先去掉上次运行生成的编号前缀，避免重复运行时前缀叠加
+    stem = NUMBER_PREFIX.sub('', path_obj.stem)
+    cleaned_name = remove_patterns(stem)
+    return path_obj.with_name(f"「{counter:02d}」{cleaned_name}{path_obj.suffix}")
+
+
+def plan_folder(folder_path, index):
+    """
+    计算单个文件夹的预处理计划（只读取索引，不修改文件）
+
+    参数:
+        folder_path: 文件夹路径
+        index: LibraryIndex实例
+
+    返回:
+        PlanAction列表: 字幕转换、WAV转换、编号重命名
+    """
+    audio_files, subtitle_files, _ = index.classify(folder_path)
+    actions = []
+
+    # 1. 字幕: 去除冗余扩展名并把VTT转换为LRC
+    final_subtitles = []  # [(转换后的路径, 转换前的路径或None), ...]
+    for sub_path in sorted(subtitle_files):
+        normalized = normalized_subtitle_path(sub_path)
+        if normalized is None:
+            final_subtitles.append((sub_path, None))
+            continue
+        lrc_path = str(normalized.with_suffix('.lrc'))
+        actions.append(PlanAction('subtitle', sub_path, lrc_path))
+        final_subtitles.append((lrc_path, sub_path))
+
+    # 2. 音频: WAV转换为FLAC（保持排序位置不变）
+    audio_files.sort(key=lambda x: Path(x).name.lower())
+    final_audio = []
+    for audio_path in audio_files:
+        if Path(audio_path).suffix.lower() == '.wav':
+            flac_path = str(Path(audio_path).with_suffix('.flac'))
+            actions.append(PlanAction('convert', audio_path, flac_path))
+            final_audio.append((flac_path, audio_path))
+        else:
+            final_audio.append((audio_path, None))
+
+    # 3. 按配对键把字幕归入音轨，没有同名音频的字幕排在最后
+    tracks = group_tracks([path for path, _ in final_audio], [path for path, _ in final_subtitles])
+    original = dict(final_audio + final_subtitles)
+
+    # 4. 每组分配一个编号，整组的新文件名一次算出
+    moves = []
+    for number, track in enumerate(tracks, 1):
+        track.number = number
+        moves.extend(
+            (src, dst, original.get(src)) for src, dst in track.numbered_moves() if src != dst
+        )
+
+    # 目标名与其他待重命名文件冲突时（如重新编号），先移动到临时名
+    sources = {src for src, _, _ in moves}
+    if any(dst in sources for _, dst, _ in moves):
+        staged = []
+        for i, (src, dst, alt) in enumerate(moves):
+            tmp_path = os.path.join(folder_path, f".asmr-tmp-{i}{Path(src).suffix}")
+            actions.append(PlanAction('rename', src, tmp_path, alt=alt))
+            tmp_alt = str(Path(tmp_path).with_suffix(Path(alt).suffix)) if alt else None
+            staged.append((tmp_path, dst, tmp_alt))
+        moves = staged
+
+    for src, dst, alt in moves:
+        actions.append(PlanAction('rename', src, dst, alt=alt))
+    return actions
+
+
+def plan_reuse(actions, index):
+    """
+    内容相同的WAV只编码一次
+
+    同一批计划中内容相同的WAV，除第一个外改为复制第一个的转换结果；
+    运行记录中已有由相同内容的WAV转换得到的FLAC时，直接复制该FLAC。
+    只有大小与本批其他WAV或已记录的来源相同的WAV才计算摘要。
+
+    参数:
+        actions: PlanAction列表（convert操作会被原地修改）
+        index: LibraryIndex实例
+
+    返回:
+        actions
+    """
+    manifest = index.manifest
+    converts = []
+    size_counts = {}
+    for action in actions:
+        entry = index.get(action.src) if action.op == 'convert' else None
+        if entry is not None and entry.size > 0:
+            converts.append((action, entry.size))
+            size_counts[entry.size] = size_counts.get(entry.size, 0) + 1
+    known_sizes = manifest.origin_sizes() if manifest is not None and converts else set()
+
+    first = {}  # {内容指纹: 本批中第一个转换结果}
+    for action, size in converts:
+        if size_counts[size] < 2 and size not in known_sizes:
+            continue
+        try:
+            action.digest = hash_file(action.src)
+        except OSError as e:
+            logger.warning(f"无法读取: {action.src} - {e}")
+            continue
+        source = first.get(action.digest)
+        if source is None and manifest is not None:
+            source = next((path for path in manifest.find_origin(action.digest) if os.path.exists(path)), None)
+        if source is None:
+            first[action.digest] = action.dst
+            continue
+        action.op = 'copy'
+        action.alt = source
+    return actions
+
+
+def sort_plan(actions):
+    """按PLAN_ORDER稳定排序，相同类型的操作保持原有顺序"""
+    return sorted(actions, key=lambda action: PLAN_ORDER.index(action.op))
+
+
+def process_folder(folder_path, index=None, journal=None, dry_run=False):
+    """
+    处理单个文件夹（预处理流程）
+
+    参数:
+        folder_path: 文件夹路径
+        index: LibraryIndex实例，提供时从索引读取文件并同步更新，不再访问目录
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+    """
+    logger.info(f"处理文件夹: {folder_path}")
+    if index is None:
+        index = LibraryIndex()
+        index.scan(folder_path, recursive=False)
+
+    actions = plan_folder(folder_path, index)
+    if DEDUP:
+        plan_reuse(actions, index)
+    apply_plan(sort_plan(actions), index, journal, dry_run)
+
+
+def preprocess_directory(root_dir, max_workers=None, index=None, journal=None, dry_run=False):
+    """
+    预处理目录（遍历所有子文件夹）
+
+    参数:
+        root_dir: 根目录路径
+        max_workers: 并行转换的进程数，默认使用CONVERT_WORKERS
+        index: LibraryIndex实例，不提供时扫描一次root_dir
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+    """
+    if index is None:
+        index = LibraryIndex.from_root(root_dir)
+    else:
+        index.ensure(root_dir)
+    preprocess_folders(index.folders_under(root_dir), index, journal, dry_run, max_workers)
+
+
+def pending_folders(folders, index, stage):
+    """
+    筛选出需要执行某阶段的文件夹（跳过上次已完成且未变化的）
+
+    返回:
+        (文件夹列表, {文件夹: 阶段开始前的指纹})
+    """
+    manifest = index.manifest
+    pending = []
+    signatures = {}
+    for folder in folders:
+        signature = index.signature(folder)
+        if manifest is not None and manifest.folder_done(folder, stage, signature):
+            logger.debug(f"跳过未变化的文件夹: {folder}")
+            continue
+        pending.append(folder)
+        signatures[folder] = signature
+    return pending, signatures
+
+
+def mark_folders(folders, signatures, index, stage, dry_run=False):
+    """阶段完成后在运行记录中标记各文件夹"""
+    manifest = index.manifest
+    if manifest is None or dry_run:
+        return
+    for folder in folders:
+        manifest.mark_folder(folder, stage, signatures[folder], index.signature(folder))
+
+
+def preprocess_folders(folders, index, journal=None, dry_run=False, max_workers=None):
+    """
+    预处理一组文件夹（跳过上次已预处理且未变化的）
+
+    参数:
+        folders: 文件夹路径列表
+        index: LibraryIndex实例
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+        max_workers: 并行转换的进程数，默认使用CONVERT_WORKERS
+    """
+    folders, signatures = pending_folders(folders, index, 'preprocess')
+
+    # 所有文件夹只生成一份计划：先并行转换所有WAV和字幕，再逐个文件夹重命名
+    actions = []
+    for foldername in folders:
+        actions.extend(plan_folder(foldername, index))
+    if DEDUP:
+        plan_reuse(actions, index)
+    apply_plan(sort_plan(actions), index, journal, dry_run, max_workers=max_workers)
+
+    mark_folders(folders, signatures, index, 'preprocess', dry_run)
+
+
+# ======================== 翻译模块 ========================
+class TranslationCache:
+    """
+    持久化的翻译缓存（SQLite）
+
+    以(源语言, 目标语言, 原文)为键，超过max_entries时按最近使用时间淘汰最旧的条目。
+    hits/misses记录本次运行的命中情况。
+    """
+
+    def __init__(self, db_path, max_entries=None):
+        self.db_path = db_path
+        self.max_entries = max_entries or TRANSLATION_CACHE_SIZE
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS translations (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                text TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (source, target, text)
+            );
+            CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used);
+        ''')
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+    def get(self, source, target, text):
+        """查询缓存，未命中返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT translated FROM translations WHERE source = ? AND target = ? AND text = ?',
+                (source, target, text)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.count('translate_cache', result='miss')
+                return None
+            self.hits += 1
+            METRICS.count('translate_cache', result='hit')
+            self.conn.execute(
+                'UPDATE translations SET last_used = ? WHERE source = ? AND target = ? AND text = ?',
+                (time.time(), source, target, text)
+            )
+            self.conn.commit()
+            return row[0]
+
+    def put(self, source, target, text, translated):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self.lock:
+            exists = self.conn.execute(
+                'SELECT 1 FROM translations WHERE source = ? AND target = ? AND text = ?',
+                (source, target, text)
+            ).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO translations (source, target, text, translated, last_used) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (source, target, text, translated, time.time())
+            )
+            if not exists:
+                self.size += 1
+            if self.max_entries and self.size > self.max_entries:
+                excess = self.size - self.max_entries
+                self.conn.execute(
+                    'DELETE FROM translations WHERE rowid IN '
+                    '(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)',
+                    (excess,)
+                )
+                self.size -= excess
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+@functools.lru_cache(maxsize=None)
+def tencent_sdk():
+    """
+    按需导入腾讯云翻译SDK（导入耗时较长，只在实际翻译时加载一次）
+
+    返回:
+        包含credential、TencentCloudSDKException、tmt_client、models、HttpProfile、ClientProfile的命名空间
+    """
+    from tencentcloud.common import credential
+    from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+    from tencentcloud.tmt.v20180321 import tmt_client, models
+    from tencentcloud.common.profile.http_profile import HttpProfile
+    from tencentcloud.common.profile.client_profile import ClientProfile
+    return types.SimpleNamespace(
+        credential=credential, TencentCloudSDKException=TencentCloudSDKException, tmt_client=tmt_client,
+        models=models, HttpProfile=HttpProfile, ClientProfile=ClientProfile,
+    )
+
+
+class StubTmtClient:
+    """
+    本地翻译桩服务，接口与TmtClient的TextTranslate/TextTranslateBatch一致
+
+    不访问网络，按translate_func生成译文，并像腾讯云一样检查批量请求的长度限制，
+    用于离线测试和基准测试。calls记录收到的请求次数。
+    """
+
+    def __init__(self, translate_func=None):
+        self.translate_func = translate_func or (lambda text: f"译{text}")
+        self.calls = 0
+
+    def TextTranslate(self, req):
+        self.calls += 1
+        resp = tencent_sdk().models.TextTranslateResponse()
+        resp.TargetText = self.translate_func(req.SourceText)
+        resp.Source = req.Source
+        resp.Target = req.Target
+        return resp
+
+    def TextTranslateBatch(self, req):
+        self.calls += 1
+        sdk = tencent_sdk()
+        if sum(len(text) for text in req.SourceTextList) >= TRANSLATE_BATCH_CHARS:
+            raise sdk.TencentCloudSDKException('FailedOperation.TextTooLong', '批量请求文本长度超过限制')
+        resp = sdk.models.TextTranslateBatchResponse()
+        resp.TargetTextList = [self.translate_func(text) for text in req.SourceTextList]
+        resp.Source = req.Source
+        resp.Target = req.Target
+        return resp
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限速器
+
+    参数:
+        rate: 每秒补充的令牌数
+        capacity: 桶容量（允许的突发请求数），默认与rate相同
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def chunk_texts(texts, max_chars=None, max_items=None):
+    """
+    将文本按批量请求的长度限制分组
+
+    参数:
+        texts: 文本列表
+        max_chars: 每组文本总长度上限（不含），默认使用TRANSLATE_BATCH_CHARS
+        max_items: 每组最多条数，默认使用TRANSLATE_BATCH_ITEMS
+
+    返回:
+        生成器，每次产出一组文本列表；单条超长的文本单独成组
+    """
+    max_chars = max_chars or TRANSLATE_BATCH_CHARS
+    max_items = max_items or TRANSLATE_BATCH_ITEMS
+    chunk = []
+    chunk_chars = 0
+    for text in texts:
+        if chunk and (chunk_chars + len(text) >= max_chars or len(chunk) >= max_items):
+            yield chunk
+            chunk = []
+            chunk_chars = 0
+        chunk.append(text)
+        chunk_chars += len(text)
+    if chunk:
+        yield chunk
+
+
+class Translator:
+    """腾讯云翻译服务封装"""
+
+    def __init__(self, secret_id, secret_key, cache=None, client=None, limiter=None, max_workers=None):
+        """
+        初始化翻译客户端
+
+        参数:
+            secret_id: 腾讯云Secret ID
+            secret_key: 腾讯云Secret Key
+            cache: TranslationCache实例，提供时先查缓存再调用API
+            client: 自定义客户端（如StubTmtClient），提供时不创建腾讯云客户端
+            limiter: 限速器（需提供acquire方法），默认按TRANSLATE_QPS创建令牌桶
+            max_workers: 批量翻译时同时进行中的请求数，默认使用TRANSLATE_WORKERS
+        """
+        self.sdk = sdk = tencent_sdk()
+        if client is None:
+            self.cred = sdk.credential.Credential(secret_id, secret_key)
+            http_profile = sdk.HttpProfile()
+            http_profile.endpoint = "tmt.tencentcloudapi.com"
+            client_profile = sdk.ClientProfile()
+            client_profile.httpProfile = http_profile
+            client = sdk.tmt_client.TmtClient(self.cred, "ap-guangzhou", client_profile)
+        self.client = client
+        self.cache = cache
+        if limiter is None and TRANSLATE_QPS:
+            limiter = TokenBucket(TRANSLATE_QPS)
+        self.limiter = limiter
+        self.max_workers = max_workers or TRANSLATE_WORKERS
+
+    def _call(self, action, req):
+        """
+        限速调用接口，遇到限流或网络错误时按指数退避重试
+
+        参数:
+            action: 接口名（如"TextTranslate"）
+            req: 请求对象
+
+        返回:
+            接口响应，重试耗尽后抛出最后一次的异常
+        """
+        texts = getattr(req, 'SourceTextList', None) or [req.SourceText]
+        for attempt in range(TRANSLATE_MAX_RETRIES + 1):
+            if self.limiter is not None:
+                with METRICS.timer('translate_wait_seconds'):
+                    self.limiter.acquire()
+            try:
+                with METRICS.timer('translate_api_seconds', action=action):
+                    resp = getattr(self.client, action)(req)
+                METRICS.count('translate_api_calls', action=action, status='ok')
+                METRICS.count('translate_chars', sum(len(text) for text in texts))
+                return resp
+            except self.sdk.TencentCloudSDKException as e:
+                code = e.get_code() or ''
+                METRICS.count('translate_api_calls', action=action, status='error')
+                if attempt >= TRANSLATE_MAX_RETRIES or not code.startswith(TRANSLATE_RETRY_CODES):
+                    raise
+                METRICS.count('translate_retries', code=code)
+                delay = 0.5 * (2 ** attempt) + random.uniform(0, 0.5)
+                logger.warning(f"翻译接口限流或网络错误({code})，{delay:.1f}秒后重试")
+                time.sleep(delay)
+
+    def translate_text(self, text, source="ja", target="zh"):
+        """翻译文本（默认日语到中文）"""
+        if self.cache is not None:
+            cached = self.cache.get(source, target, text)
+            if cached is not None:
+                return cached
+
+        try:
+            req = self.sdk.models.TextTranslateRequest()
+            req.SourceText = text
+            req.Source = source
+            req.Target = target
+            req.ProjectId = 0
+
+            resp = self._call('TextTranslate', req)
+            if self.cache is not None and resp.TargetText:
+                self.cache.put(source, target, text, resp.TargetText)
+            return resp.TargetText
+        except self.sdk.TencentCloudSDKException as e:
+            logger.error(f"翻译错误: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"未知翻译错误: {e}")
+            return None
+
+    def translate_batch(self, texts, source="ja", target="zh"):
+        """
+        批量翻译文本（去重、查缓存后按长度限制分组调用批量接口）
+
+        参数:
+            texts: 文本列表
+            source: 源语言
+            target: 目标语言
+
+        返回:
+            字典: {原文: 译文或None}
+        """
+        results = {}
+        for partial in self.translate_batch_iter(texts, source, target):
+            results.update(partial)
+        return results
+
+    def translate_batch_iter(self, texts, source="ja", target="zh"):
+        """
+        与translate_batch相同，但多个请求并发进行，每完成一组就产出一次结果
+
+        返回:
+            生成器，每次产出 {原文: 译文或None}（缓存命中的结果最先产出）
+        """
+        cached_results = {}
+        pending = []
+        for text in dict.fromkeys(texts):
+            if not text:
+                continue
+            cached = self.cache.get(source, target, text) if self.cache is not None else None
+            if cached is not None:
+                cached_results[text] = cached
+            else:
+                pending.append(text)
+
+        if cached_results:
+            yield cached_results
+        if not pending:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for chunk in chunk_texts(pending):
+                # 单条文本超过批量限制时改用单条接口
+                if len(chunk) == 1 and len(chunk[0]) >= TRANSLATE_BATCH_CHARS:
+                    futures.append(executor.submit(
+                        lambda text: {text: self.translate_text(text, source, target)}, chunk[0]
+                    ))
+                else:
+                    futures.append(executor.submit(self._translate_chunk, chunk, source, target))
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _translate_chunk(self, chunk, source, target):
+        """调用一次批量翻译接口，失败时该组全部返回None"""
+        try:
+            req = self.sdk.models.TextTranslateBatchRequest()
+            req.SourceTextList = chunk
+            req.Source = source
+            req.Target = target
+            req.ProjectId = 0
+
+            resp = self._call('TextTranslateBatch', req)
+            translated_list = list(resp.TargetTextList or [])
+            if len(translated_list) != len(chunk):
+                logger.error(f"批量翻译返回条数不符: 请求 {len(chunk)} 条, 返回 {len(translated_list)} 条")
+                return {text: None for text in chunk}
+        except self.sdk.TencentCloudSDKException as e:
+            logger.error(f"批量翻译错误: {e}")
+            return {text: None for text in chunk}
+        except Exception as e:
+            logger.error(f"未知批量翻译错误: {e}")
+            return {text: None for text in chunk}
+
+        results = {}
+        for text, translated in zip(chunk, translated_list):
+            results[text] = translated or None
+            if self.cache is not None and translated:
+                self.cache.put(source, target, text, translated)
+        return results
+
+
+def sanitize_name(name):
+    """
+    清理名称中的非法字符
+
+    参数:
+        name: 原始名称
+
+    返回:
+        清理后的名称
+    """
+    return re.sub(ILLEGAL_CHARS, '。', name)
+
+
+def parse_numbered_stem(stem):
+    """
+    解析文件名中的编号和原始名称
+
+    参数:
+        stem: 文件名（不含扩展名）
+
+    返回:
+        (编号或None, 原始名称)
+    """
+    match = re.match(r'(?:「(\d{2})」|【(\d{2})】)(.*)', stem)
+    if match:
+        return match.group(1) or match.group(2), match.group(3).strip()
+    return None, stem
+
+
+def translated_file_path(file_path, translated):
+    """
+    根据译文计算翻译后的文件路径（只计算，不修改文件）
+
+    参数:
+        file_path: 文件路径
+        translated: 原始名称的译文
+
+    返回:
+        新文件路径(Path)，格式为「编号」译名[原名].扩展名
+    """
+    path_obj = Path(file_path)
+    number, original_name = parse_numbered_stem(path_obj.stem)
+
+    # 清理非法字符
+    translated = sanitize_name(translated)
+
+    # 构建新文件名
+    if number:
+        new_name = f"「{number}」{translated}[{original_name}]{path_obj.suffix}"
+    else:
+        new_name = f"{translated}[{original_name}]{path_obj.suffix}"
+    return path_obj.with_name(new_name)
+
+
+def translated_directory_path(dir_path, translated):
+    """根据译文计算翻译后的目录路径，格式为 译名[原名]"""
+    path_obj = Path(dir_path)
+    return path_obj.parent / f"{sanitize_name(translated)}[{path_obj.name}]"
+
+
+def list_translation_files(dir_path, index=None):
+    """
+    列出目录中需要翻译的音频文件及其关联字幕
 
     参数:
         dir_path: 目录路径
-        translator: 翻译器实例
+        index: LibraryIndex实例，提供时从索引读取文件并跳过已翻译的文件
+
+    返回:
+        (audio_files, associations)
     """
     # 获取目录中的文件
     audio_files = []
     subtitle_files = []
 
-    for filename in os.listdir(dir_path):
-        file_path = os.path.join(dir_path, filename)
-        if not os.path.isfile(file_path):
-            continue
-
-        ext = Path(filename).suffix.lower()
+    if index is not None:
+        entries = [entry.path for entry in index.files(dir_path)]
+    else:
+        entries = [
+            os.path.join(dir_path, filename)
+            for filename in os.listdir(dir_path)
+            if os.path.isfile(os.path.join(dir_path, filename))
+        ]
+
+    for file_path in entries:
+        ext = Path(file_path).suffix.lower()
         if ext in AUDIO_EXTS:
             audio_files.append(file_path)
         elif ext == '.lrc':
@@ -584,40 +3720,851 @@ def process_files_for_translation(dir_path, translator):
     # 关联音频和字幕
     associations = associate_audio_subtitles(audio_files, subtitle_files)
 
-    # 处理音频文件
-    for audio_path in audio_files:
-        # 翻译并重命名音频
-        if translate_and_rename_file(audio_path, translator):
-            # 处理关联的字幕
-            if audio_path in associations:
-                for sub_path in associations[audio_path]:
-                    if os.path.exists(sub_path):
-                        translate_and_rename_file(sub_path, translator)
+    # 跳过之前已经翻译过的文件
+    manifest = index.manifest if index is not None else None
+    if manifest is not None:
+        audio_files = [p for p in audio_files if not manifest.file_flag(p, 'translate')]
+
+    return audio_files, associations
+
+
+def process_files_for_translation(dir_path, translator, index=None, translations=None, journal=None, dry_run=False):
+    """
+    处理目录中的文件（翻译流程）
+
+    参数:
+        dir_path: 目录路径
+        translator: 翻译器实例
+        index: LibraryIndex实例，提供时从索引读取文件并同步更新
+        translations: 批量翻译结果 {原文: 译文}，不提供时对本目录的文件名批量翻译一次
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+    """
+    audio_files, associations = list_translation_files(dir_path, index)
+
+    # 音频与关联字幕同名，只需翻译音频文件名
+    if translations is None:
+        names = [parse_numbered_stem(Path(p).stem)[1] for p in audio_files]
+        translations = translator.translate_batch(names)
+
+    # 处理音频文件
+    actions = []
+    for audio_path in audio_files:
+        actions.extend(plan_track_translation(audio_path, associations.get(audio_path, []), translations))
+    apply_plan(actions, index, journal, dry_run)
+
+
+def plan_track_translation(audio_path, subtitle_paths, translations):
+    """
+    计算一个音频文件及其关联字幕的翻译重命名计划
+
+    参数:
+        audio_path: 音频文件路径
+        subtitle_paths: 关联字幕路径列表
+        translations: 翻译结果 {原文: 译文}
+
+    返回:
+        PlanAction列表（翻译失败时为空）
+    """
+    original_name = parse_numbered_stem(Path(audio_path).stem)[1]
+    translated = translations.get(original_name)
+    if not translated:
+        logger.warning(f"翻译失败: {original_name}")
+        return []
+
+    # 字幕随音频改名，不单独翻译字幕的文件名
+    new_audio = translated_file_path(audio_path, translated)
+    moves = [(audio_path, str(new_audio))]
+    moves.extend(follow_lead_name(new_audio, subtitle_paths, lambda path: translated_file_path(path, translated)))
+    return [PlanAction('rename', src, dst, flag='translate') for src, dst in moves if src != dst]
+
+
+def translate_jp_directory(jp_dir, secret_id, secret_key, index=None, journal=None, dry_run=False):
+    """
+    翻译日语目录（文件优先，目录后处理）
+
+    参数:
+        jp_dir: 日语目录路径
+        secret_id: 腾讯云Secret ID
+        secret_key: 腾讯云Secret Key
+        index: LibraryIndex实例，不提供时扫描一次jp_dir
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件（仍会调用翻译接口，结果写入缓存供正式运行使用）
+    """
+    translator = create_translator(secret_id, secret_key)
+    if index is None:
+        index = LibraryIndex.from_root(jp_dir)
+    else:
+        index.ensure(jp_dir)
+
+    # 文件重命名不影响目录结构，深度排序只需计算一次
+    dirs_to_process = index.deepest_directories(jp_dir)
+    rename_dirs = [dir_path for dir_path in dirs_to_process if dir_path != os.path.normpath(jp_dir)]
+    translate_folders(dirs_to_process, rename_dirs, translator, index, journal, dry_run)
+
+    cache = translator.cache
+    if cache is not None:
+        logger.info(f"翻译缓存: 命中 {cache.hits} 次, 未命中 {cache.misses} 次")
+        cache.close()
+
+
+def create_translator(secret_id, secret_key):
+    """按TRANSLATION_CACHE_PATH和TRANSLATE_OFFLINE创建翻译器（带缓存）"""
+    cache = TranslationCache(TRANSLATION_CACHE_PATH) if TRANSLATION_CACHE_PATH else None
+    client = StubTmtClient() if TRANSLATE_OFFLINE else None
+    return Translator(secret_id, secret_key, cache, client)
+
+
+def translate_folders(folders, rename_dirs, translator, index, journal=None, dry_run=False):
+    """
+    翻译一组文件夹中的文件名，再翻译目录名
+
+    参数:
+        folders: 要翻译文件名的文件夹（跳过上次已完成且未变化的）
+        rename_dirs: 要翻译名称的目录，必须按深度从深到浅排列（跳过已翻译的）
+        translator: 翻译器实例
+        index: LibraryIndex实例
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+
+    返回:
+        {原目录路径: 新目录路径}
+    """
+    manifest = index.manifest
+
+    # 收集所有需要翻译的文件名和目录名，统一批量翻译
+    file_dirs, signatures = pending_folders(folders, index, 'translate')
+    pending_tracks = {}  # {原文: [(音频路径, 关联字幕列表), ...]}
+    for dir_path in file_dirs:
+        audio_files, associations = list_translation_files(dir_path, index)
+        for audio_path in audio_files:
+            name = parse_numbered_stem(Path(audio_path).stem)[1]
+            pending_tracks.setdefault(name, []).append((audio_path, associations.get(audio_path, [])))
+
+    rename_dirs = [
+        dir_path for dir_path in rename_dirs
+        if not (manifest is not None and manifest.folder_flag(dir_path, 'translate'))
+    ]
+    names = list(pending_tracks) + [Path(dir_path).name for dir_path in rename_dirs]
+    logger.info(f"批量翻译: {len(set(names))} 个名称")
+
+    # 第一步：处理文件，多个请求并发进行，每返回一组结果就把对应文件的重命名计划写入日志并执行
+    translations = {}
+    for partial in translator.translate_batch_iter(names):
+        translations.update(partial)
+        actions = []
+        for name in partial:
+            for audio_path, subtitle_paths in pending_tracks.pop(name, []):
+                actions.extend(plan_track_translation(audio_path, subtitle_paths, translations))
+        apply_plan(actions, index, journal, dry_run)
+
+    for tracks in pending_tracks.values():
+        for audio_path, _ in tracks:
+            logger.warning(f"翻译失败: {Path(audio_path).name}")
+
+    mark_folders(file_dirs, signatures, index, 'translate', dry_run)
+
+    # 第二步：处理目录（深度优先，先改深层目录名不影响浅层目录路径）
+    actions = []
+    for dir_path in rename_dirs:
+        translated = translations.get(Path(dir_path).name)
+        if not translated:
+            logger.warning(f"目录翻译失败: {Path(dir_path).name}")
+            continue
+        new_dir_path = str(translated_directory_path(dir_path, translated))
+        actions.append(PlanAction('rename_dir', dir_path, new_dir_path, flag='translate'))
+    apply_plan(actions, index, journal, dry_run)
+    return {action.src: action.dst for action in actions}
+
+
+# ======================== 字幕翻译模块 ========================
+LRC_TIME_TAGS = re.compile(r'^(?:\[\d+:\d{1,2}(?:[.:]\d{1,3})?\])+')  # 行首的一个或多个时间标签
+LYRICS_TEXT = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]')  # 含假名或汉字的行才需要翻译
+
+
+def split_lrc_line(line):
+    """
+    拆分LRC行的时间标签和文本
+
+    返回:
+        (时间标签, 文本)；不是歌词行（如[ar:...]等元数据、空行）时时间标签为空字符串，文本为原行
+    """
+    match = LRC_TIME_TAGS.match(line)
+    if not match:
+        return '', line
+    return match.group(0), line[match.end():].strip()
+
+
+def lyrics_translated(lrc_path):
+    """LRC文件第一行为LYRICS_TRANSLATED_TAG时返回True（已由本脚本翻译过）"""
+    with open(lrc_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.readline().rstrip('\r\n') == LYRICS_TRANSLATED_TAG
+
+
+class LyricsFile:
+    """翻译中的LRC文件：译文先写入临时文件，所有行都翻译成功后替换原文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.out = None
+        self.translated = 0  # 写入译文的行数
+        self.failed = 0  # 翻译失败的行数
+
+    def write(self, line):
+        if self.out is None:
+            self.out = open(self.tmp_path, 'w', encoding='utf-8')
+            self.out.write(LYRICS_TRANSLATED_TAG)
+        self.out.write('\n' + line)
+
+    def finish(self, index=None):
+        """
+        文件全部写出后调用：没有失败的行时替换原文件，否则删除临时文件，下次运行重试
+
+        返回:
+            是否替换了原文件
+        """
+        if self.failed:
+            self.abort()
+            METRICS.count('lyrics_files', status='failed')
+            logger.warning(f"字幕翻译失败: {Path(self.path).name} - {self.failed} 行未翻译，保留原文件")
+            return False
+        if self.out is None:
+            return False
+        self.out.close()
+        os.replace(self.tmp_path, self.path)
+        if index is not None:
+            index.add_file(self.path)
+        METRICS.count('lyrics_files', status='ok')
+        METRICS.count('lyrics_lines', self.translated)
+        logger.info(f"字幕翻译: {Path(self.path).name} ({self.translated} 行)")
+        return True
+
+    def abort(self):
+        """删除未完成的临时文件"""
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+
+def iter_lyrics_lines(lrc_paths):
+    """
+    依次流式读取各LRC文件
+
+    返回:
+        生成器，每次产出 (LyricsFile, 时间标签, 文本)；每个文件结束时产出 (LyricsFile, None, None)，
+        无法解码的文件只产出结束标记并计为失败
+    """
+    for path in lrc_paths:
+        lyrics = LyricsFile(path)
+        encoding = detect_encoding(path)
+        if encoding is None:
+            logger.error(f"字幕翻译失败: 无法解码文件 - {Path(path).name}")
+            lyrics.failed += 1
+            yield lyrics, None, None
+            continue
+        with open(path, 'r', encoding=encoding, errors='replace') as f:
+            for line in f:
+                tags, text = split_lrc_line(line.rstrip('\r\n'))
+                yield lyrics, tags, text
+        yield lyrics, None, None
+
+
+def flush_lyrics_window(window, translator, index=None):
+    """
+    批量翻译窗口中的字幕行并写出，窗口中结束的文件随后替换原文件
+
+    参数:
+        window: [(LyricsFile, 时间标签, 文本), ...]
+        translator: 翻译器实例
+        index: LibraryIndex实例
+
+    返回:
+        失败的文件路径列表
+    """
+    texts = [text for _, tags, text in window if tags and LYRICS_TEXT.search(text)]
+    translations = translator.translate_batch(texts) if texts else {}
+
+    failed = []
+    for lyrics, tags, text in window:
+        if tags is None:
+            if not lyrics.finish(index) and lyrics.failed:
+                failed.append(lyrics.path)
+            continue
+        if not (tags and LYRICS_TEXT.search(text)):
+            lyrics.write(f"{tags}{text}")
+            continue
+        translated = translations.get(text)
+        if not translated:
+            lyrics.failed += 1
+            continue
+        if LYRICS_MODE == 'translated':
+            lyrics.write(f"{tags}{translated}")
+        else:
+            lyrics.write(f"{tags}{text}")
+            if translated != text:
+                lyrics.write(f"{tags}{translated}")
+        lyrics.translated += 1
+    return failed
+
+
+def translate_lyrics(lrc_paths, translator, index=None, dry_run=False):
+    """
+    翻译LRC字幕的内容，保留时间标签
+
+    依次流式读取各文件，行放入窗口，窗口中的文本达到LYRICS_WINDOW_CHARS后，
+    把含日语的行去重、按批量接口的长度限制分组翻译（共用翻译器的缓存和限速器），再写出这些行。
+    同一批文件中的多个小字幕可以合并在同一批请求中，大文件也不会整个读入内存。
+    写出的文件以LYRICS_TRANSLATED_TAG开头，再次运行时跳过；有行翻译失败时保留原文件，下次重试。
+    每个文件都是写完临时文件后一次替换，中断时原文件不受影响，因此不写入计划日志。
+
+    参数:
+        lrc_paths: LRC文件路径列表
+        translator: 翻译器实例
+        index: LibraryIndex实例，提供时同步更新文件记录
+        dry_run: 只输出计划，不调用翻译接口，不修改文件
+
+    返回:
+        翻译失败（保留原文件）的文件路径列表
+    """
+    if dry_run:
+        # 预演时文件可能只是计划中的新路径，不读取内容
+        for path in lrc_paths:
+            logger.info(f"  [预演] 字幕翻译: {path}")
+        return []
+    lrc_paths = [path for path in lrc_paths if not lyrics_translated(path)]
+
+    failed = []
+    window = []
+    window_chars = 0
+    current = None
+    try:
+        for current, tags, text in iter_lyrics_lines(lrc_paths):
+            window.append((current, tags, text))
+            window_chars += len(text or '')
+            if window_chars >= LYRICS_WINDOW_CHARS:
+                failed.extend(flush_lyrics_window(window, translator, index))
+                window = []
+                window_chars = 0
+        failed.extend(flush_lyrics_window(window, translator, index))
+        window = []
+    except BaseException:
+        # 删除窗口中和正在读取的文件已写出一部分的临时文件
+        for lyrics in {entry[0] for entry in window} | ({current} if current else set()):
+            lyrics.abort()
+        raise
+    return failed
+
+
+def translate_lyrics_folders(folders, translator, index, dry_run=False):
+    """
+    翻译一组文件夹中LRC字幕的内容（跳过上次已完成且未变化的，有文件翻译失败的文件夹下次重试）
+
+    参数:
+        folders: 文件夹路径列表
+        translator: 翻译器实例
+        index: LibraryIndex实例
+        dry_run: 只输出计划，不修改文件
+    """
+    folders, signatures = pending_folders(folders, index, 'lyrics')
+    lrc_paths = [
+        entry.path for folder in folders for entry in index.files(folder, 'subtitle')
+        if entry.path.lower().endswith('.lrc')
+    ]
+    failed = {os.path.dirname(path) for path in translate_lyrics(lrc_paths, translator, index, dry_run)}
+    mark_folders([folder for folder in folders if folder not in failed], signatures, index, 'lyrics', dry_run)
+
+
+def translate_jp_lyrics(jp_dir, secret_id, secret_key, index=None, dry_run=False):
+    """
+    翻译日语目录中所有LRC字幕的内容
+
+    参数:
+        jp_dir: 日语目录路径
+        secret_id: 腾讯云Secret ID
+        secret_key: 腾讯云Secret Key
+        index: LibraryIndex实例，不提供时扫描一次jp_dir
+        dry_run: 只输出计划，不修改文件
+    """
+    translator = create_translator(secret_id, secret_key)
+    if index is None:
+        index = LibraryIndex.from_root(jp_dir)
+    else:
+        index.ensure(jp_dir)
+    try:
+        translate_lyrics_folders(index.folders_under(jp_dir), translator, index, dry_run)
+    finally:
+        if translator.cache is not None:
+            translator.cache.close()
+
+
+# ======================== 响度分析模块 ========================
+LOUDNESS_ABSOLUTE_GATE = -70.0  # BS.1770绝对门限（LUFS）
+LOUDNESS_RELATIVE_GATE = -10.0  # BS.1770相对门限（LU）
+LOUDNESS_BIN_WIDTH = 0.1  # 块响度直方图的分辨率（LU），专辑响度由各音轨的直方图合并计算
+LOUDNESS_CHANNEL_WEIGHTS = (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)  # 5.1声道（L R C LFE Ls Rs）的权重，其他声道数全部为1
+REPLAYGAIN_TAGS = ('REPLAYGAIN_TRACK_GAIN', 'REPLAYGAIN_TRACK_PEAK', 'REPLAYGAIN_ALBUM_GAIN', 'REPLAYGAIN_ALBUM_PEAK')
+
+
+def k_weighting_filters(sample_rate):
+    """
+    K加权滤波器两级二阶节（高频搁架、高通）的系数
+
+    由与BS.1770在48kHz下的系数相同的模拟原型经双线性变换得到，适用于任意采样率。
+
+    返回:
+        [(b, a), (b, a)]，a[0]为1
+    """
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = (
+        [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+        [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0],
+    )
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return [shelf, highpass]
+
+
+@functools.lru_cache(maxsize=None)
+def k_weighting_impulse(sample_rate):
+    """
+    K加权滤波器（高频搁架+高通两级二阶滤波器）的冲激响应
+
+    冲激响应衰减到1e-12以下即截断，之后用FFT卷积按块滤波，等效于逐样本递推但可以向量化。
+
+    返回:
+        numpy数组
+    """
+    import numpy as np
+
+    stages = k_weighting_filters(sample_rate)
+    response = []
+    states = [[0.0, 0.0, 0.0, 0.0] for _ in stages]  # 每级的 x[n-1], x[n-2], y[n-1], y[n-2]
+    quiet = 0
+    n = 0
+    while n < sample_rate * 4 and quiet < 64:
+        x = 1.0 if n == 0 else 0.0
+        for (b, a), state in zip(stages, states):
+            y = b[0] * x + b[1] * state[0] + b[2] * state[1] - a[1] * state[2] - a[2] * state[3]
+            state[:] = [x, state[0], y, state[2]]
+            x = y
+        response.append(x)
+        quiet = quiet + 1 if abs(x) < 1e-12 else 0
+        n += 1
+    return np.array(response[:len(response) - quiet + 1])
+
+
+def pcm_to_float(chunk, info):
+    """
+    把WAV的PCM字节数据转换为 (帧数, 声道数) 的浮点数组（满幅为±1）
+
+    参数:
+        chunk: 完整帧的字节数据
+        info: WavInfo
+
+    返回:
+        numpy数组，不支持的格式返回None
+    """
+    import numpy as np
+
+    width = info.block_align // info.channels
+    if info.is_integer_pcm:
+        if width == 1:
+            samples = (np.frombuffer(chunk, dtype=np.uint8).astype(np.float64) - 128) / 128
+        elif width == 2:
+            samples = np.frombuffer(chunk, dtype='<i2') / 32768.0
+        elif width == 3:
+            raw = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            value = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            samples = ((value << 8) >> 8) / 8388608.0
+        elif width == 4:
+            samples = np.frombuffer(chunk, dtype='<i4') / 2147483648.0
+        else:
+            return None
+    elif info.format_tag == 3 and width in (4, 8):
+        samples = np.frombuffer(chunk, dtype='<f4' if width == 4 else '<f8').astype(np.float64)
+    else:
+        return None
+    return samples.reshape(-1, info.channels)
+
+
+class TrackLoudness:
+    """
+    单个音轨的响度分析结果
+
+    blocks为400ms块（75%重叠）响度的直方图 {格序号: [块数, 均方能量之和]}，只包含高于绝对门限的块，
+    多个音轨的直方图合并后即可按BS.1770计算专辑的综合响度。peak为采样峰值（满幅为1）。
+    """
+
+    def __init__(self, blocks, peak):
+        self.blocks = blocks
+        self.peak = peak
+
+    def to_dict(self):
+        return {'blocks': {str(k): v for k, v in self.blocks.items()}, 'peak': self.peak}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(k): v for k, v in data['blocks'].items()}, data['peak'])
+
+
+def integrated_loudness(tracks):
+    """
+    按BS.1770-4门限计算综合响度
+
+    参数:
+        tracks: TrackLoudness列表（一个音轨或整张专辑）
+
+    返回:
+        综合响度（LUFS），没有高于门限的块（静音或短于400ms）时返回None
+    """
+    merged = {}
+    for track in tracks:
+        for index, (count, energy) in track.blocks.items():
+            total = merged.setdefault(index, [0, 0.0])
+            total[0] += count
+            total[1] += energy
+    count = sum(c for c, _ in merged.values())
+    if not count:
+        return None
+
+    threshold = -0.691 + 10 * math.log10(sum(e for _, e in merged.values()) / count) + LOUDNESS_RELATIVE_GATE
+    gated = [
+        (c, e) for index, (c, e) in merged.items()
+        if LOUDNESS_ABSOLUTE_GATE + (index + 0.5) * LOUDNESS_BIN_WIDTH >= threshold
+    ]
+    count = sum(c for c, _ in gated)
+    if not count:
+        return None
+    return -0.691 + 10 * math.log10(sum(e for _, e in gated) / count)
+
+
+class LoudnessMeter:
+    """
+    流式计算BS.1770/EBU R128响度和采样峰值
+
+    每次送入一段PCM数据：用FFT重叠相加做K加权滤波，按声道权重累加平方后按100ms分段求和，
+    结束时由相邻4段组成400ms块（75%重叠）。整个过程按块向量化，内存只与音轨时长的段数有关。
+    """
+
+    def __init__(self, sample_rate, channels):
+        import numpy as np
+
+        self.np = np
+        self.impulse = k_weighting_impulse(sample_rate)
+        self.step = max(1, round(sample_rate / 10))
+        if channels == len(LOUDNESS_CHANNEL_WEIGHTS):
+            self.weights = np.array(LOUDNESS_CHANNEL_WEIGHTS)
+        else:
+            self.weights = np.ones(channels)
+        self.tail = np.zeros((len(self.impulse) - 1, channels))
+        self.pending = np.zeros(0)
+        self.segments = []
+        self.peak = 0.0
+        self.spectra = {}
+
+    @classmethod
+    def for_wav(cls, info):
+        """为WAV格式创建响度分析器，没有numpy或格式不支持时返回None"""
+        if info is None or not info.channels or not info.sample_rate:
+            return None
+        try:
+            return cls(info.sample_rate, info.channels)
+        except ImportError:
+            return None
+
+    def feed_pcm(self, chunk, info):
+        """送入WAV的PCM字节数据"""
+        samples = pcm_to_float(chunk, info)
+        if samples is not None:
+            self.feed(samples)
+
+    def feed(self, samples):
+        """送入 (帧数, 声道数) 的浮点数组"""
+        np = self.np
+        frames = len(samples)
+        if not frames:
+            return
+        self.peak = max(self.peak, float(np.abs(samples).max()))
+
+        # FFT卷积，上一段卷积结果超出部分（尾部）叠加到本段开头
+        length = frames + len(self.impulse) - 1
+        size = 1 << (length - 1).bit_length()
+        if size not in self.spectra:
+            self.spectra[size] = np.fft.rfft(self.impulse, size)
+        filtered = np.fft.irfft(np.fft.rfft(samples, size, axis=0) * self.spectra[size][:, None], size, axis=0)
+        filtered = filtered[:length]
+        filtered[:len(self.tail)] += self.tail
+        self.tail = filtered[frames:]
+
+        energy = np.concatenate([self.pending, (filtered[:frames] ** 2) @ self.weights])
+        usable = len(energy) - len(energy) % self.step
+        if usable:
+            self.segments.append(energy[:usable].reshape(-1, self.step).sum(axis=1))
+        self.pending = energy[usable:]
+
+    def result(self):
+        """结束分析，返回TrackLoudness"""
+        np = self.np
+        segments = np.concatenate(self.segments) if self.segments else np.zeros(0)
+        blocks = {}
+        if len(segments) >= 4:
+            energy = (segments[:-3] + segments[1:-2] + segments[2:-1] + segments[3:]) / (4 * self.step)
+            with np.errstate(divide='ignore'):
+                loudness = -0.691 + 10 * np.log10(energy)
+            keep = loudness > LOUDNESS_ABSOLUTE_GATE
+            bins = ((loudness[keep] - LOUDNESS_ABSOLUTE_GATE) / LOUDNESS_BIN_WIDTH).astype(np.int64)
+            counts = np.bincount(bins)
+            sums = np.bincount(bins, weights=energy[keep])
+            blocks = {int(i): [int(counts[i]), float(sums[i])] for i in np.flatnonzero(counts)}
+        return TrackLoudness(blocks, self.peak)
+
+
+def decode_loudness(audio_path):
+    """
+    用ffmpeg按块解码音频文件并分析响度（在响度分析进程池中运行）
+
+    参数:
+        audio_path: 音频文件路径
+
+    返回:
+        TrackLoudness，无法解码时返回None
+    """
+    import mutagen
+    import numpy as np
+
+    try:
+        info = mutagen.File(audio_path).info
+        channels, sample_rate = info.channels, info.sample_rate
+    except Exception as e:
+        logger.warning(f"响度分析失败: 无法读取 {Path(audio_path).name} - {e}")
+        return None
+
+    meter = LoudnessMeter(sample_rate, channels)
+    cmd = ['ffmpeg', '-v', 'error', '-i', str(audio_path), '-map', '0:a:0', '-f', 'f64le', '-acodec', 'pcm_f64le', 'pipe:1']
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, **SUBPROCESS_FLAGS)
+    frame_bytes = 8 * channels
+    pending = b''
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * (1 << 16))
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            meter.feed(np.frombuffer(data[:usable], dtype='<f8').reshape(-1, channels))
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        logger.warning(f"响度分析失败: ffmpeg无法解码 {Path(audio_path).name}")
+        return None
+    return meter.result()
+
+
+def flac_pcm_md5(audio_path):
+    """读取FLAC的STREAMINFO中的PCM数据MD5（十六进制），不是FLAC或编码器未记录时返回None"""
+    if Path(audio_path).suffix.lower() != '.flac':
+        return None
+    from mutagen.flac import FLAC
+
+    try:
+        md5 = FLAC(audio_path).info.md5_signature
+    except Exception:
+        return None
+    return f"{md5:032x}" if md5 else None
+
+
+class LoudnessStore:
+    """
+    响度分析结果的缓存，按PCM数据MD5索引
+
+    转换WAV时顺带得到的结果先保存在内存中，操作完成后写入运行记录；
+    写入标签时依次查找内存和运行记录，都没有时才解码分析。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.memory = {}  # {PCM数据MD5: TrackLoudness}
+        self.unsaved = {}  # {FLAC路径: PCM数据MD5}
+
+    def remember(self, flac_path, pcm_md5, loudness):
+        with self.lock:
+            self.memory[pcm_md5] = loudness
+            self.unsaved[os.path.normpath(flac_path)] = pcm_md5
+
+    def persist(self, flac_path, manifest):
+        """把转换flac_path时得到的结果写入运行记录，之后不再保留在内存中"""
+        with self.lock:
+            pcm_md5 = self.unsaved.pop(os.path.normpath(flac_path), None)
+            loudness = self.memory.pop(pcm_md5, None) if pcm_md5 else None
+        if loudness is not None:
+            manifest.set_loudness(pcm_md5, loudness)
+
+    def get(self, pcm_md5, manifest=None):
+        with self.lock:
+            loudness = self.memory.get(pcm_md5)
+        if loudness is None and manifest is not None:
+            loudness = manifest.loudness(pcm_md5)
+        return loudness
+
+
+LOUDNESS_STORE = LoudnessStore()
+_LOUDNESS_POOL = []  # 共用的响度分析进程池（由start_loudness_pool创建）
+_LOUDNESS_POOL_LOCK = threading.Lock()
+LOUDNESS_WORKER_IMPORT = (  # 本文件以其他模块名加载时（如asmr-bench.py），子进程先按同一名称加载本文件
+    "import importlib.util, sys\n"
+    "spec = importlib.util.spec_from_file_location(name, path)\n"
+    "module = importlib.util.module_from_spec(spec)\n"
+    "sys.modules[name] = module\n"
+    "spec.loader.exec_module(module)\n"
+)
+
+
+def start_loudness_pool():
+    """
+    创建共用的响度分析进程池，需要在启动其他线程之前调用
+
+    子进程用spawn方式启动，不会继承父进程中被其他线程持有的锁（如logging的锁）。
+
+    返回:
+        进程池，REPLAYGAIN关闭或LOUDNESS_WORKERS为0时返回None（在当前进程中分析）
+    """
+    if not REPLAYGAIN or not LOUDNESS_WORKERS:
+        return None
+    with _LOUDNESS_POOL_LOCK:
+        if not _LOUDNESS_POOL:
+            options = {'max_workers': LOUDNESS_WORKERS, 'mp_context': multiprocessing.get_context('spawn')}
+            if __name__ != '__main__':
+                options['initializer'] = exec
+                options['initargs'] = (LOUDNESS_WORKER_IMPORT, {'name': __name__, 'path': os.path.abspath(__file__)})
+            _LOUDNESS_POOL.append(ProcessPoolExecutor(**options))
+        return _LOUDNESS_POOL[0]
+
+
+def stop_loudness_pool():
+    """关闭共用的响度分析进程池"""
+    with _LOUDNESS_POOL_LOCK:
+        pool = _LOUDNESS_POOL.pop() if _LOUDNESS_POOL else None
+    if pool is not None:
+        pool.shutdown()
+
+
+def loudness_pool():
+    """返回start_loudness_pool创建的进程池，没有创建时返回None"""
+    with _LOUDNESS_POOL_LOCK:
+        return _LOUDNESS_POOL[0] if _LOUDNESS_POOL else None
+
+
+@run_once
+def loudness_decoder_available():
+    """单独解码分析响度需要ffmpeg，不可用时只提示一次"""
+    if check_ffmpeg_available():
+        return True
+    logger.warning("未找到ffmpeg，跳过响度分析")
+    return False
 
 
-def translate_jp_directory(jp_dir, secret_id, secret_key):
+def measure_loudness(audio_paths, manifest=None):
     """
-    翻译日语目录（文件优先，目录后处理）
+    取得一组音频文件的响度：先复用转换时或上次的分析结果，其余文件在进程池中解码分析
 
     参数:
-        jp_dir: 日语目录路径
-        secret_id: 腾讯云Secret ID
-        secret_key: 腾讯云Secret Key
+        audio_paths: 音频文件路径列表（FLAC、MP3、M4A）
+        manifest: RunManifest实例，提供时读取并保存分析结果
+
+    返回:
+        {音频路径: TrackLoudness}，分析失败的文件不包含在内
+    """
+    results = {}
+    pending = []  # [(音频路径, PCM数据MD5或None), ...]
+    for path in audio_paths:
+        pcm_md5 = flac_pcm_md5(path)
+        loudness = LOUDNESS_STORE.get(pcm_md5, manifest) if pcm_md5 else None
+        if loudness is None:
+            pending.append((path, pcm_md5))
+        else:
+            results[path] = loudness
+            METRICS.count('loudness_tracks', source='cache')
+    if not pending:
+        return results
+    if not loudness_decoder_available():
+        return results
+
+    paths = [path for path, _ in pending]
+    with METRICS.timer('loudness_seconds', source='decode'):
+        pool = loudness_pool()
+        measured = None
+        if pool is not None:
+            try:
+                measured = list(pool.map(decode_loudness, paths))
+            except Exception as e:
+                logger.warning(f"响度分析进程池不可用，改为在当前进程中分析: {e}")
+        if measured is None:
+            measured = [decode_loudness(path) for path in paths]
+
+    for (path, pcm_md5), loudness in zip(pending, measured):
+        if loudness is None:
+            continue
+        results[path] = loudness
+        METRICS.count('loudness_tracks', source='decode')
+        if pcm_md5 and manifest is not None:
+            manifest.set_loudness(pcm_md5, loudness)
+    return results
+
+
+def replaygain_tags(audio_paths, manifest=None):
     """
-    translator = Translator(secret_id, secret_key)
+    计算一个文件夹（专辑）中各音轨的ReplayGain 2.0标签值
+
+    专辑增益按所有音轨合并后的综合响度计算，只有全部音轨都分析成功时才写入专辑标签。
 
-    # 第一步：处理文件（深度优先）
-    dirs_to_process = get_deepest_directories(jp_dir)
-    for dir_path in dirs_to_process:
-        logger.info(f"处理文件: {dir_path}")
-        process_files_for_translation(dir_path, translator)
+    参数:
+        audio_paths: 文件夹内的音频文件路径列表
+        manifest: RunManifest实例
 
-    # 第二步：处理目录（深度优先）
-    dirs_to_process = get_deepest_directories(jp_dir)
-    for dir_path in dirs_to_process:
-        if dir_path != JP_DIR:
-            logger.info(f"处理目录: {dir_path}")
-            translate_and_rename_directory(dir_path, translator)
+    返回:
+        {音频路径: {标签名: 值}}，无法分析（如静音）的音轨不包含在内
+    """
+    paths = [path for path in audio_paths if Path(path).suffix.lower() in ('.flac', '.mp3', '.m4a')]
+    if not paths:
+        return {}
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        logger.warning("未安装numpy，跳过ReplayGain计算")
+        return {}
+
+    tracks = measure_loudness(paths, manifest)
+    album = {}
+    if len(tracks) == len(paths):
+        album_loudness = integrated_loudness(tracks.values())
+        if album_loudness is not None:
+            album = {
+                'REPLAYGAIN_ALBUM_GAIN': f"{REPLAYGAIN_REFERENCE - album_loudness:+.2f} dB",
+                'REPLAYGAIN_ALBUM_PEAK': f"{max(t.peak for t in tracks.values()):.6f}",
+            }
+
+    gains = {}
+    for path, track in tracks.items():
+        loudness = integrated_loudness([track])
+        if loudness is None:
+            continue
+        gains[path] = {
+            'REPLAYGAIN_TRACK_GAIN': f"{REPLAYGAIN_REFERENCE - loudness:+.2f} dB",
+            'REPLAYGAIN_TRACK_PEAK': f"{track.peak:.6f}",
+            **album,
+        }
+    return gains
 
 
 # ======================== 标签更新模块 ========================
@@ -650,17 +4597,124 @@ def find_cover_image(audio_path, image_files):
     return image_files[0] if image_files else None
 
 
-def tag_audio_file(audio_path, cover_image=None):
+def prepare_cover(image_path, max_size=None, quality=None):
+    """
+    读取封面图片，尺寸超过max_size时缩放并重新编码为JPEG
+
+    参数:
+        image_path: 图片路径
+        max_size: 最大边长，默认使用COVER_MAX_SIZE，0表示不缩放
+        quality: JPEG质量，默认使用COVER_JPEG_QUALITY
+
+    返回:
+        (图片数据, mime类型)，读取失败返回None
+    """
+    max_size = COVER_MAX_SIZE if max_size is None else max_size
+    quality = quality or COVER_JPEG_QUALITY
+
+    try:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logger.error(f"封面读取失败: {Path(image_path).name} - {e}")
+        return None
+
+    img_ext = Path(image_path).suffix.lower()
+    mime_type = 'image/jpeg' if img_ext in ['.jpg', '.jpeg'] else f'image/{img_ext[1:]}'
+    if not max_size:
+        return data, mime_type
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, mime_type
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_size:
+                return data, mime_type
+
+            original_size = image.size
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+            if image.mode not in ('RGB', 'L'):
+                # 透明背景填充为白色
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.split()[-1])
+                image = background
+
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=quality, optimize=True)
+    except Exception as e:
+        logger.warning(f"封面缩放失败，使用原图: {Path(image_path).name} - {e}")
+        return data, mime_type
+
+    logger.info(
+        f"封面缩放: {Path(image_path).name} {original_size[0]}x{original_size[1]} -> "
+        f"{image.size[0]}x{image.size[1]}, {len(data) // 1024}KB -> {output.tell() // 1024}KB"
+    )
+    return output.getvalue(), 'image/jpeg'
+
+
+class CoverCache:
+    """
+    单个文件夹的封面缓存
+
+    封面的选择规则与find_cover_image相同，但只建立一次查找表，
+    每张图片只读取和处理一次，文件夹内所有音频共用处理后的数据。
+    """
+
+    def __init__(self, image_files):
+        self.by_stem = {}
+        for img in image_files:
+            self.by_stem.setdefault(Path(img).stem, img)
+
+        self.common = None
+        stems_lower = {}
+        for img in image_files:
+            stems_lower.setdefault(Path(img).stem.lower(), img)
+        for name in ['cover', 'folder', 'front', 'album']:
+            if name in stems_lower:
+                self.common = stems_lower[name]
+                break
+
+        self.first = image_files[0] if image_files else None
+        self.prepared = {}
+
+    def find(self, audio_path):
+        """为音频文件选择封面图片路径"""
+        return self.by_stem.get(Path(audio_path).stem) or self.common or self.first
+
+    def get(self, image_path):
+        """返回处理后的 (图片数据, mime类型)，同一张图片只处理一次"""
+        if image_path not in self.prepared:
+            self.prepared[image_path] = prepare_cover(image_path)
+        return self.prepared[image_path]
+
+
+@timed('tag')
+def tag_audio_file(audio_path, cover_image=None, cover=None, replaygain=None):
     """
     为音频文件添加元数据标签
 
+    先读取现有标签与目标标题、专辑、封面、ReplayGain比较，完全一致时不写入；
+    否则只修改不同的字段，保留其他标签，由mutagen利用已有的填充空间原地写入。
+
     参数:
         audio_path: 音频文件路径
-        cover_image: 封面图片路径
+        cover_image: 封面图片路径（未提供cover时读取）
+        cover: 已处理的封面 (图片数据, mime类型)，由CoverCache提供
+        replaygain: ReplayGain标签 {标签名: 值}，由replaygain_tags计算
 
     返回:
-        是否成功
+        是否成功（标签无需修改也视为成功）
     """
+    import mutagen.flac
+    from mutagen.flac import FLAC
+    from mutagen.id3 import ID3, APIC, TIT2, TALB, TXXX
+    from mutagen.mp3 import MP3
+    from mutagen.mp4 import MP4, MP4Cover
+
     try:
         # 获取标签数据
         folder = Path(audio_path).parent.name
@@ -670,73 +4724,112 @@ def tag_audio_file(audio_path, cover_image=None):
         ext = audio_path_obj.suffix.lower()
 
         # 添加封面图片
-        cover_data = None
-        if cover_image and os.path.exists(cover_image):
-            with open(cover_image, 'rb') as f:
-                cover_data = f.read()
+        if cover is None and cover_image and os.path.exists(cover_image):
+            cover = prepare_cover(cover_image)
+        cover_data, mime_type = cover if cover else (None, None)
+        replaygain = replaygain or {}
+
+        changed = False
 
         # MP3文件处理
         if ext == '.mp3':
             audio = MP3(audio_path, ID3=ID3)
-            if not audio.tags:
+            if audio.tags is None:
                 audio.add_tags()
 
-            audio.tags.add(TIT2(encoding=3, text=title))
-            audio.tags.add(TALB(encoding=3, text=folder))
+            if audio.tags.get('TIT2') is None or audio.tags['TIT2'].text != [title]:
+                audio.tags.setall('TIT2', [TIT2(encoding=3, text=title)])
+                changed = True
+            if audio.tags.get('TALB') is None or audio.tags['TALB'].text != [folder]:
+                audio.tags.setall('TALB', [TALB(encoding=3, text=folder)])
+                changed = True
 
             if cover_data:
-                img_ext = Path(cover_image).suffix.lower()
-                mime_type = 'image/jpeg' if img_ext in ['.jpg', '.jpeg'] else f'image/{img_ext[1:]}'
-
-                audio.tags.add(APIC(
-                    encoding=3,
-                    mime=mime_type,
-                    type=3,
-                    desc='Cover',
-                    data=cover_data
-                ))
-            audio.save()
+                existing = audio.tags.get('APIC:Cover')
+                if existing is None or existing.data != cover_data or existing.mime != mime_type:
+                    audio.tags.setall('APIC:Cover', [APIC(
+                        encoding=3,
+                        mime=mime_type,
+                        type=3,
+                        desc='Cover',
+                        data=cover_data
+                    )])
+                    changed = True
+
+            for name, value in replaygain.items():
+                existing = audio.tags.get(f'TXXX:{name}')
+                if existing is None or existing.text != [value]:
+                    audio.tags.setall(f'TXXX:{name}', [TXXX(encoding=3, desc=name, text=[value])])
+                    changed = True
 
         # FLAC文件处理
         elif ext == '.flac':
             audio = FLAC(audio_path)
-            audio.delete()
-            audio['title'] = title
-            audio['album'] = folder
+            if audio.tags is None:
+                audio.add_tags()
+
+            if audio.get('title') != [title]:
+                audio['title'] = title
+                changed = True
+            if audio.get('album') != [folder]:
+                audio['album'] = folder
+                changed = True
 
             if cover_data:
-                image = mutagen.flac.Picture()
-                image.type = 3
-                img_ext = Path(cover_image).suffix.lower()
-                image.mime = 'image/jpeg' if img_ext in ['.jpg', '.jpeg'] else f'image/{img_ext[1:]}'
-                image.data = cover_data
-                audio.add_picture(image)
-            audio.save()
+                front_covers = [p for p in audio.pictures if p.type == 3]
+                if len(front_covers) != 1 or front_covers[0].data != cover_data or front_covers[0].mime != mime_type:
+                    # 只替换正面封面，保留其他图片
+                    audio.metadata_blocks = [
+                        b for b in audio.metadata_blocks
+                        if not (b.code == mutagen.flac.Picture.code and b.type == 3)
+                    ]
+                    image = mutagen.flac.Picture()
+                    image.type = 3
+                    image.mime = mime_type
+                    image.data = cover_data
+                    audio.add_picture(image)
+                    changed = True
+
+            for name, value in replaygain.items():
+                if audio.get(name) != [value]:
+                    audio[name] = value
+                    changed = True
 
         # M4A文件处理
         elif ext == '.m4a':
             audio = MP4(audio_path)
 
-            # 保留原有封面
-            existing_covers = audio.get('covr', [])
-
-            # 仅当没有封面且提供了新封面时添加
-            if not existing_covers and cover_image and os.path.exists(cover_image):
-                with open(cover_image, 'rb') as f:
-                    cover_data = f.read()
-
-                img_ext = Path(cover_image).suffix.lower()
-                cover_format = MP4Cover.FORMAT_PNG if img_ext == '.png' else MP4Cover.FORMAT_JPEG
-                existing_covers.append(MP4Cover(cover_data, imageformat=cover_format))
+            # 仅当没有封面且提供了新封面时添加，保留原有封面
+            if not audio.get('covr') and cover_data:
+                cover_format = MP4Cover.FORMAT_PNG if mime_type == 'image/png' else MP4Cover.FORMAT_JPEG
+                audio['covr'] = [MP4Cover(cover_data, imageformat=cover_format)]
+                changed = True
 
             # 更新标签但保留其他元数据
-            audio['©nam'] = [title]
-            audio['©alb'] = [folder]
-
-            if existing_covers:
-                audio['covr'] = existing_covers
-
+            if audio.get('©nam') != [title]:
+                audio['©nam'] = [title]
+                changed = True
+            if audio.get('©alb') != [folder]:
+                audio['©alb'] = [folder]
+                changed = True
+
+            for name, value in replaygain.items():
+                key = f'----:com.apple.iTunes:{name}'
+                if [bytes(v) for v in audio.get(key, [])] != [value.encode('utf-8')]:
+                    audio[key] = [value.encode('utf-8')]
+                    changed = True
+
+        else:
+            return True
+
+        if changed:
+            # 重复文件被替换为硬链接时，只修改这一个文件
+            break_hardlink(audio_path)
             audio.save()
+            METRICS.count('tag_writes', result='written')
+        else:
+            logger.debug(f"标签未变化，跳过写入: {audio_path_obj.name}")
+            METRICS.count('tag_writes', result='unchanged')
 
         return True
     except Exception as e:
@@ -744,86 +4837,1166 @@ def tag_audio_file(audio_path, cover_image=None):
         return False
 
 
-def update_tags_for_folder(folder_path):
+def plan_folder_tags(folder_path, index, dry_run=False):
+    """
+    计算单个文件夹的标签计划（封面在文件夹内只选择一次，ReplayGain以文件夹为专辑计算）
+
+    参数:
+        folder_path: 文件夹路径
+        index: LibraryIndex实例
+        dry_run: 预演时文件可能只是计划中的新路径，不分析响度
+
+    返回:
+        PlanAction列表
+    """
+    audio_files, _, image_files = index.classify(folder_path)
+    covers = CoverCache(image_files)
+    gains = replaygain_tags(audio_files, index.manifest) if REPLAYGAIN and not dry_run else {}
+    return [
+        PlanAction('tag', audio_path, cover=covers.find(audio_path), gain=gains.get(audio_path))
+        for audio_path in audio_files
+    ]
+
+
+def update_tags_for_folder(folder_path, index=None, journal=None, dry_run=False):
     """
     更新单个文件夹的音频标签
 
     参数:
         folder_path: 文件夹路径
+        index: LibraryIndex实例，提供时从索引读取文件并刷新写入后的stat
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
     """
     logger.info(f"更新标签: {folder_path}")
-    audio_files, _, image_files = classify_files(folder_path)
-
-    for audio_path in audio_files:
-        cover_image = find_cover_image(audio_path, image_files)
-        if cover_image:
-            logger.info(f"  使用封面: {Path(cover_image).name}")
+    if index is None:
+        index = LibraryIndex()
+        index.scan(folder_path, recursive=False)
 
-        success = tag_audio_file(audio_path, cover_image)
-        status = "成功" if success else "失败"
-        logger.info(f"  标签更新: {Path(audio_path).name} - {status}")
+    apply_plan(plan_folder_tags(folder_path, index, dry_run), index, journal, dry_run)
 
 
-def update_all_tags(root_dir):
+def update_all_tags(root_dir, index=None, journal=None, dry_run=False):
     """
     更新目录中所有音频文件的标签
 
     参数:
         root_dir: 根目录路径
+        index: LibraryIndex实例，不提供时扫描一次root_dir
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+    """
+    if index is None:
+        index = LibraryIndex.from_root(root_dir)
+    else:
+        index.ensure(root_dir)
+    update_tags_for_folders(index.folders_under(root_dir), index, journal, dry_run)
+
+
+def update_tags_for_folders(folders, index, journal=None, dry_run=False):
+    """
+    更新一组文件夹的音频标签（跳过上次已完成且未变化的）
+
+    参数:
+        folders: 文件夹路径列表
+        index: LibraryIndex实例
+        journal: PlanJournal实例，提供时先写日志再执行
+        dry_run: 只输出计划，不修改文件
+    """
+    folders, signatures = pending_folders(folders, index, 'tags')
+
+    actions = []
+    for foldername in folders:
+        actions.extend(plan_folder_tags(foldername, index, dry_run))
+    apply_plan(actions, index, journal, dry_run)
+
+    mark_folders(folders, signatures, index, 'tags', dry_run)
+
+
+# ======================== 监视模块 ========================
+class InotifyWatcher:
+    """
+    基于inotify的目录监视（需要inotify_simple，仅Linux）
+
+    启动时为目录树中的每个文件夹添加监视，之后新建或移入的文件夹自动加入。
+    只关心音频、字幕、图片文件的变化，忽略运行记录、日志等其他文件。
+    """
+
+    def __init__(self, root_dir):
+        from inotify_simple import INotify, flags
+
+        self.flags = flags
+        self.mask = (
+            flags.CREATE | flags.CLOSE_WRITE | flags.MODIFY | flags.MOVED_TO
+            | flags.MOVED_FROM | flags.DELETE | flags.ATTRIB
+        )
+        self.inotify = INotify()
+        self.watches = {}  # {watch描述符: 文件夹路径}
+        self._add_tree(root_dir)
+
+    def _add_tree(self, root_dir):
+        """监视root_dir及其所有子文件夹，返回新加入的文件夹列表"""
+        added = []
+        for dirpath, _, _ in os.walk(root_dir):
+            try:
+                self.watches[self.inotify.add_watch(dirpath, self.mask)] = dirpath
+                added.append(os.path.normpath(dirpath))
+            except OSError as e:
+                logger.warning(f"无法监视目录: {dirpath} - {e}")
+        return added
+
+    def changes(self, timeout):
+        """等待最多timeout秒，返回有变化的文件夹集合"""
+        changed = set()
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & self.flags.IGNORED:
+                self.watches.pop(event.wd, None)
+                continue
+            folder = self.watches.get(event.wd)
+            if folder is None:
+                continue
+            if event.mask & self.flags.ISDIR:
+                if event.mask & (self.flags.CREATE | self.flags.MOVED_TO):
+                    # 整个专辑文件夹移入时，其中已有的文件不会再产生事件
+                    changed.update(self._add_tree(os.path.join(folder, event.name)))
+                continue
+            if classify_filename(event.name) is not None:
+                changed.add(os.path.normpath(folder))
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+
+class PollingWatcher:
+    """没有inotify时的轮询监视：每次扫描目录树，比较各文件夹的指纹"""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.signatures = self._snapshot()
+
+    def _snapshot(self):
+        index = LibraryIndex()
+        index.scan(self.root_dir)
+        return {folder: index.signature(folder) for folder in index.folders}
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        current = self._snapshot()
+        changed = {folder for folder, signature in current.items() if self.signatures.get(folder) != signature}
+        self.signatures = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(root_dir):
+    """优先使用inotify，不可用时改为轮询"""
+    try:
+        watcher = InotifyWatcher(root_dir)
+        logger.info("监视方式: inotify")
+        return watcher
+    except (ImportError, OSError) as e:
+        logger.info(f"inotify不可用({e})，改为每 {WATCH_POLL_INTERVAL} 秒轮询")
+        return PollingWatcher(root_dir)
+
+
+def is_under(path, root_dir):
+    """path是否为root_dir或其子路径"""
+    path = os.path.normpath(path)
+    root_dir = os.path.normpath(root_dir)
+    return path == root_dir or path.startswith(os.path.join(root_dir, ''))
+
+
+def process_watched_folder(folder_path, index, translator, journal=None, jp_dir=None):
+    """
+    处理一个已稳定的文件夹：预处理、翻译文件名和字幕（位于日语目录下时）、更新标签
+
+    目录名不在监视模式下翻译，以免改变仍在监视中的路径，下次完整运行时处理。
+
+    参数:
+        folder_path: 文件夹路径
+        index: LibraryIndex实例（已扫描该文件夹）
+        translator: 常驻的翻译器实例
+        journal: PlanJournal实例
+        jp_dir: 日语目录路径
+
+    返回:
+        处理完成后的文件夹指纹
+    """
+    logger.info(f"\n=== 处理新文件夹: {folder_path} ===")
+    manifest = index.manifest
+    stages = [('preprocess', lambda: process_folder(folder_path, index, journal))]
+    if jp_dir and is_under(folder_path, jp_dir):
+        stages.append(('translate', lambda: process_files_for_translation(
+            folder_path, translator, index, journal=journal
+        )))
+        if TRANSLATE_LYRICS:
+            stages.append(('lyrics', lambda: translate_lyrics_folders([folder_path], translator, index)))
+    stages.append(('tags', lambda: update_tags_for_folder(folder_path, index, journal)))
+
+    for stage, run in stages:
+        before = index.signature(folder_path)
+        with METRICS.timer('stage_seconds', stage=stage):
+            run()
+        if manifest is not None:
+            manifest.mark_folder(folder_path, stage, before, index.signature(folder_path))
+
+    if journal is not None:
+        journal.clear()
+    return index.signature(folder_path)
+
+
+def watch_directory(root_dir, jp_dir, secret_id, secret_key, stable_seconds=None, poll_interval=None):
+    """
+    常驻监视根目录，新增或变化的文件夹稳定后单独处理
+
+    翻译器（含缓存和限速器）和编码后端在整个监视期间只创建一次。
+    文件夹被处理后产生的变化（重命名、转换）会使指纹等于处理结果，不会被重复处理。
+
+    参数:
+        root_dir: 根目录
+        jp_dir: 日语目录（其下的文件夹会翻译文件名）
+        secret_id: 腾讯云Secret ID
+        secret_key: 腾讯云Secret Key
+        stable_seconds: 稳定时间，默认使用WATCH_STABLE_SECONDS
+        poll_interval: 检查间隔，默认使用WATCH_POLL_INTERVAL
     """
-    for foldername, subfolders, filenames in os.walk(root_dir):
-        update_tags_for_folder(foldername)
+    stable_seconds = WATCH_STABLE_SECONDS if stable_seconds is None else stable_seconds
+    poll_interval = WATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+
+    start_loudness_pool()
+    manifest = RunManifest.open(root_dir) if INCREMENTAL else None
+    journal = PlanJournal.open(root_dir)
+    translator = create_translator(secret_id, secret_key)
+    cache = translator.cache
+    index = LibraryIndex(manifest)
+    watcher = create_watcher(root_dir)
+
+    pending = {}  # {文件夹: (指纹, 指纹最后变化的时间)}
+    processed = {}  # {文件夹: 处理完成后的指纹}
+    logger.info(f"开始监视: {root_dir}（文件夹稳定 {stable_seconds} 秒后处理，Ctrl+C退出）")
+    try:
+        if journal.pending():
+            resume_journal(journal, manifest=manifest)
+            journal.clear()
+
+        while True:
+            for folder in watcher.changes(poll_interval):
+                pending.setdefault(folder, (None, 0.0))
+
+            now = time.monotonic()
+            for folder in list(pending):
+                if not os.path.isdir(folder):
+                    pending.pop(folder)
+                    continue
+                index.scan(folder, recursive=False)
+                signature = index.signature(folder)
+                last_signature, since = pending[folder]
+                if signature != last_signature:
+                    pending[folder] = (signature, now)
+                    continue
+                if now - since < stable_seconds:
+                    continue
+
+                pending.pop(folder)
+                if not index.files(folder) or processed.get(folder) == signature:
+                    continue
+                if manifest is not None and manifest.folder_done(folder, 'tags', signature):
+                    continue
+                try:
+                    processed[folder] = process_watched_folder(folder, index, translator, journal, jp_dir)
+                except Exception as e:
+                    logger.error(f"处理文件夹出错: {folder} - {e}")
+                write_metrics(log=False)
+    except KeyboardInterrupt:
+        logger.info("停止监视")
+        write_metrics()
+    finally:
+        watcher.close()
+        journal.close()
+        if cache is not None:
+            cache.close()
+        if manifest is not None:
+            manifest.close()
+        stop_loudness_pool()
+
+
+# ======================== 流水线模块 ========================
+class Album:
+    """
+    流水线中的处理单位
+
+    path: 专辑文件夹（翻译目录名后会更新为新路径）
+    recursive: 是否包含子文件夹；根目录、日语目录本身只处理其中直接存放的文件
+    translate: 是否位于日语目录下（需要翻译）
+    """
+
+    def __init__(self, path, recursive=True, translate=False):
+        self.path = path
+        self.recursive = recursive
+        self.translate = translate
+
+    def folders(self, index):
+        """返回专辑包含的文件夹（自顶向下）"""
+        if self.recursive:
+            return index.folders_under(self.path)
+        return [self.path] if self.path in index.folders else []
+
+
+def group_albums(index, root_dir, jp_dir=None):
+    """
+    把目录树划分为互不重叠的专辑
+
+    根目录、日语目录以及两者之间的各级目录只包含其中直接存放的文件，
+    它们的其他子文件夹各自作为一个专辑（包含所有下级文件夹）。
+
+    返回:
+        Album列表（按目录树自顶向下的顺序）
+    """
+    root_dir = os.path.normpath(root_dir)
+    containers = {root_dir}
+    tops = [root_dir]
+    if jp_dir:
+        jp_dir = os.path.normpath(jp_dir)
+        containers.add(jp_dir)
+        if is_under(jp_dir, root_dir):
+            path = jp_dir
+            while path != root_dir:
+                path = os.path.dirname(path)
+                containers.add(path)
+        else:
+            tops.append(jp_dir)
+
+    albums = []
+    for top in tops:
+        for folder in index.folders_under(top):
+            translate = bool(jp_dir) and is_under(folder, jp_dir)
+            if folder in containers:
+                albums.append(Album(folder, recursive=False, translate=translate))
+            elif os.path.dirname(folder) in containers:
+                albums.append(Album(folder, translate=translate))
+    return albums
+
+
+def run_pipeline(items, stages, queue_size=None):
+    """
+    通过有界队列连接的多阶段流水线
+
+    每个阶段有自己的工作线程，处理完的项目放入下一阶段的队列；队列满时上一阶段等待（背压）。
+    某个项目在一个阶段出错时记录错误，不再进入后续阶段，其他项目继续处理，全部结束后抛出RuntimeError，
+    以保留计划日志供下次恢复。遇到KeyboardInterrupt等致命异常时停止所有阶段并重新抛出。
+
+    参数:
+        items: 待处理的项目
+        stages: [(阶段名, 处理函数, 工作线程数), ...]
+        queue_size: 队列容量，默认使用PIPELINE_QUEUE_SIZE
+    """
+    queue_size = PIPELINE_QUEUE_SIZE if queue_size is None else queue_size
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    done = object()
+    abort = threading.Event()
+    errors = []
+
+    def work(stage_index):
+        name, func, _ = stages[stage_index]
+        while True:
+            item = queues[stage_index].get()
+            if item is done:
+                return
+            if abort.is_set():
+                # 已中止：继续取出队列中的项目，避免上一阶段阻塞
+                continue
+            try:
+                with METRICS.timer('pipeline_stage_seconds', stage=name):
+                    func(item)
+            except Exception as e:
+                logger.error(f"流水线阶段出错({name}): {getattr(item, 'path', item)} - {e}")
+                errors.append(e)
+                continue
+            except BaseException as e:
+                errors.append(e)
+                abort.set()
+                continue
+            if stage_index + 1 < len(stages):
+                queues[stage_index + 1].put(item)
+
+    workers = []
+    for stage_index, (name, _, count) in enumerate(stages):
+        threads = [
+            threading.Thread(target=work, args=(stage_index,), name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, count))
+        ]
+        for thread in threads:
+            thread.start()
+        workers.append(threads)
+
+    try:
+        for item in items:
+            if abort.is_set():
+                break
+            queues[0].put(item)
+
+        # 逐阶段结束：上一阶段的线程全部退出后，它的输出都已进入下一阶段的队列
+        for stage_index, threads in enumerate(workers):
+            for _ in threads:
+                queues[stage_index].put(done)
+            for thread in threads:
+                thread.join()
+    except BaseException:
+        abort.set()
+        raise
+
+    fatal = [e for e in errors if not isinstance(e, Exception)]
+    if fatal:
+        raise fatal[0]
+    if errors:
+        raise RuntimeError(f"流水线中有 {len(errors)} 个专辑处理失败")
+
+
+def album_stages(index, translator, journal=None, dry_run=False, phases=None):
+    """
+    单个专辑的预处理、翻译、字幕翻译、标签四个阶段
+
+    专辑内先翻译文件名，再按深度从深到浅翻译目录名，然后按新路径翻译字幕内容、写入标签。
+    phases只保留其中的阶段（按PHASES中的名称，默认使用PHASES），不翻译时translator可以为None。
+
+    返回:
+        [(阶段名, 处理函数, 流水线中的工作线程数), ...]，处理函数的参数为Album
+    """
+    phases = PHASES if phases is None else phases
+
+    def preprocess(album):
+        preprocess_folders(album.folders(index), index, journal, dry_run)
+
+    def translate(album):
+        if not album.translate:
+            return
+        folders = sorted(album.folders(index), key=lambda f: f.count(os.sep), reverse=True)
+        rename_dirs = folders if album.recursive else []
+        renamed = translate_folders(folders, rename_dirs, translator, index, journal, dry_run)
+        album.path = renamed.get(album.path, album.path)
+
+    def lyrics(album):
+        if album.translate and TRANSLATE_LYRICS:
+            translate_lyrics_folders(album.folders(index), translator, index, dry_run)
+
+    def tags(album):
+        update_tags_for_folders(album.folders(index), index, journal, dry_run)
+
+    stages = [
+        ('preprocess', preprocess, PIPELINE_PREPROCESS_WORKERS),
+        ('translate', translate, PIPELINE_TRANSLATE_WORKERS),
+        ('lyrics', lyrics, PIPELINE_TRANSLATE_WORKERS),
+        ('tags', tags, PIPELINE_TAG_WORKERS),
+    ]
+    return [stage for stage in stages if stage[0] in phases]
+
+
+def process_albums_pipelined(root_dir, jp_dir, translator, index, journal=None, dry_run=False, phases=None):
+    """
+    按专辑流水线完成预处理、翻译、字幕翻译、标签四个阶段
+
+    专辑之间互不重叠，同一专辑按顺序经过各阶段，不同专辑的各阶段同时进行。
+
+    参数:
+        root_dir: 根目录
+        jp_dir: 日语目录
+        translator: 翻译器实例（各专辑共用）
+        index: LibraryIndex实例
+        journal: PlanJournal实例
+        dry_run: 只输出计划，不修改文件
+        phases: 要执行的阶段，默认全部
+    """
+    albums = group_albums(index, root_dir, jp_dir)
+    logger.info(f"流水线处理: {len(albums)} 个专辑")
+    run_pipeline(albums, album_stages(index, translator, journal, dry_run, phases))
+
+
+# ======================== 分片模块 ========================
+class LeaseManager:
+    """
+    基于租约文件的专辑认领，多个工作进程（或多台主机）可以同时处理同一个根目录
+
+    每个专辑对应租约目录中的一个文件，用O_CREAT|O_EXCL创建，同一时间只有一个工作进程能创建成功。
+    后台线程定期更新所持租约的修改时间（心跳），超过timeout未更新的租约视为过期，可被其他工作进程接管。
+    过期判断使用租约目录所在文件系统的时钟，不受各主机时钟偏差影响。
+    专辑处理完成后写入完成标记（专辑指纹），指纹不变时其他工作进程不再处理。
+    """
+
+    def __init__(self, lease_dir, worker_id=None, timeout=None, heartbeat=None):
+        self.lease_dir = lease_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.timeout = LEASE_TIMEOUT if timeout is None else timeout
+        self.heartbeat = LEASE_HEARTBEAT if heartbeat is None else heartbeat
+        self.lock = threading.Lock()
+        self.held = {}  # {专辑键: (租约文件路径, 租约内容)}
+        self.lost = set()
+        os.makedirs(lease_dir, exist_ok=True)
+        self.clock_path = self.path(self.worker_id, '.clock')
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._beat, name='lease-heartbeat', daemon=True)
+        self.thread.start()
+
+    def path(self, key, suffix):
+        """专辑键对应的租约目录中的文件"""
+        return os.path.join(self.lease_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + suffix)
+
+    def journal_path(self, key):
+        """专辑的计划日志（接管过期租约的工作进程从这里继续）"""
+        return self.path(key, '.journal.jsonl')
+
+    def flags_path(self, key):
+        """专辑的完成标记日志（ShardManifest写入，专辑完成后继续保留）"""
+        return self.path(key, '.flags.jsonl')
+
+    def now(self):
+        """租约目录所在文件系统的当前时间"""
+        with open(self.clock_path, 'a'):
+            pass
+        os.utime(self.clock_path)
+        return os.stat(self.clock_path).st_mtime
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def acquire(self, key):
+        """
+        尝试认领专辑
+
+        返回:
+            成功返回True；租约由其他工作进程持有且未过期时返回False
+        """
+        path = self.path(key, '.lease')
+        record = json.dumps(
+            {'key': key, 'worker': self.worker_id, 'since': time.time()}, ensure_ascii=False
+        )
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._break_stale(path):
+                    METRICS.count('lease_claims', result='busy')
+                    return False
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(record)
+            with self.lock:
+                self.held[key] = (path, record)
+            METRICS.count('lease_claims', result='acquired')
+            return True
+        METRICS.count('lease_claims', result='busy')
+        return False
+
+    def _break_stale(self, path):
+        """租约已过期时移除它，返回True表示可以重新尝试创建"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return True
+        if self.now() - stat.st_mtime < self.timeout:
+            return False
+
+        # 先改名再核对：多个工作进程同时接管时，只有一个能移走同一个文件
+        owner = self._read(path)
+        stale = self.path(self.worker_id, '.stale')
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return True
+        try:
+            if self._read(stale) != owner or os.stat(stale).st_mtime != stat.st_mtime:
+                # 移走的是其他工作进程刚创建的新租约，放回原处
+                with contextlib.suppress(OSError):
+                    os.link(stale, path)
+                return False
+        finally:
+            os.remove(stale)
+        logger.warning(f"接管过期租约: {owner}")
+        METRICS.count('lease_claims', result='expired')
+        return True
+
+    def _beat(self):
+        while not self.stop_event.wait(self.heartbeat):
+            with self.lock:
+                held = list(self.held.items())
+            for key, (path, record) in held:
+                try:
+                    if self._read(path) != record:
+                        raise FileNotFoundError(path)
+                    os.utime(path)
+                except OSError:
+                    with self.lock:
+                        if key not in self.held:
+                            continue
+                        self.lost.add(key)
+                    logger.warning(f"租约已失效（可能已被其他工作进程接管）: {key}")
+
+    def lost_lease(self, key):
+        """持有期间租约是否失效过"""
+        with self.lock:
+            return key in self.lost
+
+    def release(self, key):
+        """释放租约（只删除自己持有的租约文件）"""
+        with self.lock:
+            entry = self.held.pop(key, None)
+            self.lost.discard(key)
+        if entry is None:
+            return
+        path, record = entry
+        if self._read(path) == record:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def is_done(self, key, signature):
+        """专辑是否已处理完成且之后没有变化"""
+        return self._read(self.path(key, '.done')) == signature
+
+    def mark_done(self, key, signature):
+        """写入专辑的完成标记"""
+        path = self.path(key, '.done')
+        temp_path = self.path(self.worker_id, '.done.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(signature)
+        os.replace(temp_path, path)
+
+    def close(self):
+        """停止心跳并释放所有租约"""
+        self.stop_event.set()
+        self.thread.join()
+        with self.lock:
+            keys = list(self.held)
+        for key in keys:
+            self.release(key)
+        with contextlib.suppress(OSError):
+            os.remove(self.clock_path)
+
+
+class ShardManifest(RunManifest):
+    """
+    分片模式下工作进程自己的运行记录
+
+    多台主机通过NFS同时读写同一个SQLite文件并不可靠，因此SQLite保存在本机临时目录中，进程结束时删除；
+    专辑是否完成由租约目录中的完成标记判断。需要在工作进程之间共享的路径标记（如文件名已翻译）
+    和之后的改名，另外追加写入租约目录中该专辑的标记日志，认领专辑时先重放到本地记录，
+    接管其他工作进程未完成的专辑、或专辑变化后重新处理时都不会重复翻译。
+    """
+
+    def __init__(self, root_dir):
+        self.state_dir = tempfile.mkdtemp(prefix='asmr-shard-')
+        super().__init__(os.path.join(self.state_dir, MANIFEST_NAME), root_dir)
+        self.log_lock = threading.Lock()
+        self.log_path = None
+
+    def attach(self, log_path):
+        """开始处理一个专辑：重放它的标记日志，之后的标记和改名同时追加到这个日志"""
+        with self.log_lock:
+            self.log_path = None
+        events = []
+        with contextlib.suppress(FileNotFoundError):
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    with contextlib.suppress(ValueError):
+                        events.append(json.loads(line))
+        # 日志中的路径相对根目录；重放时log_path为None，不会再次写入日志
+        for event in events:
+            op, (first, second) = event.get('op'), event.get('args', ('', ''))
+            first = os.path.join(self.root_dir, first)
+            if op == 'folder_flag':
+                self.set_folder_flag(first, second)
+            elif op == 'file_flag':
+                self.set_file_flag(first, second)
+            elif op == 'rename_file':
+                self.rename_file(first, os.path.join(self.root_dir, second))
+            elif op == 'rename_folder':
+                self.rename_folder(first, os.path.join(self.root_dir, second))
+        with self.log_lock:
+            self.log_path = log_path
+
+    def detach(self, log_path=None):
+        """专辑处理结束；专辑目录改名后把标记日志移到新的专辑键下"""
+        with self.log_lock:
+            current, self.log_path = self.log_path, None
+        if log_path and current and log_path != current and os.path.exists(current):
+            os.replace(current, log_path)
+
+    def _log(self, op, *args):
+        with self.log_lock:
+            if self.log_path is None:
+                return
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'op': op, 'args': list(args)}, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def set_folder_flag(self, folder_path, flag):
+        super().set_folder_flag(folder_path, flag)
+        self._log('folder_flag', self._key(folder_path), flag)
+
+    def set_file_flag(self, file_path, flag):
+        super().set_file_flag(file_path, flag)
+        self._log('file_flag', self._key(file_path), flag)
+
+    def rename_file(self, old_path, new_path):
+        super().rename_file(old_path, new_path)
+        self._log('rename_file', self._key(old_path), self._key(new_path))
+
+    def rename_folder(self, old_path, new_path):
+        super().rename_folder(old_path, new_path)
+        self._log('rename_folder', self._key(old_path), self._key(new_path))
+
+    def close(self):
+        super().close()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+
+def album_key(album_path, root_dir):
+    """专辑在租约中的标识（相对根目录的路径）"""
+    return os.path.relpath(os.path.normpath(album_path), os.path.normpath(root_dir)).replace(os.sep, '/')
+
+
+def album_signature(album, index):
+    """由专辑内各文件夹的相对路径和指纹计算专辑指纹"""
+    digest = hashlib.sha1()
+    for folder in album.folders(index):
+        digest.update(f"{os.path.relpath(folder, album.path)}\0{index.signature(folder)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def process_leased_album(album, root_dir, index, leases, translator):
+    """
+    认领并处理一个专辑
+
+    认领成功后先完成上一个持有者留下的计划日志，再重新扫描专辑，
+    最后依次执行预处理、翻译、标签三个阶段。
+
+    参数:
+        album: Album实例
+        root_dir: 根目录
+        index: LibraryIndex实例
+        leases: LeaseManager实例
+        translator: 翻译器实例
+
+    返回:
+        'processed' / 'done'（已完成或已不存在）/ 'busy'（由其他工作进程持有）/ 'failed'
+    """
+    key = album_key(album.path, root_dir)
+    if not leases.acquire(key):
+        return 'busy'
+
+    manifest = index.manifest
+    journal = PlanJournal(leases.journal_path(key))
+    final_key = None
+    try:
+        if manifest is not None:
+            manifest.attach(leases.flags_path(key))
+        pending = journal.pending()
+        if pending:
+            logger.info(f"继续上一个工作进程未完成的计划: {album.path}")
+            for _, action in pending:
+                if action.op == 'rename_dir' and action.src == album.path:
+                    album.path = action.dst
+            resume_journal(journal, manifest=index.manifest)
+
+        if not os.path.isdir(album.path):
+            journal.clear()
+            return 'done'
+        index.scan(album.path, recursive=album.recursive)
+        if leases.is_done(album_key(album.path, root_dir), album_signature(album, index)):
+            journal.clear()
+            return 'done'
+
+        logger.info(f"\n=== 处理专辑: {album.path} ===")
+        for stage, func, _ in album_stages(index, translator, journal):
+            with METRICS.timer('stage_seconds', stage=stage):
+                func(album)
+        if leases.lost_lease(key):
+            logger.warning(f"处理期间租约失效，专辑可能被重复处理: {album.path}")
+        final_key = album_key(album.path, root_dir)
+        leases.mark_done(final_key, album_signature(album, index))
+        journal.clear()
+        return 'processed'
+    except Exception as e:
+        logger.error(f"处理专辑出错: {album.path} - {e}")
+        return 'failed'
+    finally:
+        journal.close()
+        if manifest is not None:
+            manifest.detach(leases.flags_path(final_key) if final_key else None)
+        leases.release(key)
+
+
+def run_shard_worker(root_dir, jp_dir, secret_id, secret_key, worker_id=None):
+    """
+    分片模式的工作进程，可在多个进程或多台主机上同时运行
+
+    各工作进程扫描同一目录树，按相同顺序尝试认领专辑，每个专辑只由认领成功的进程处理。
+    被其他进程持有的专辑每隔LEASE_HEARTBEAT秒重试一次，直到它完成或租约过期后由本进程接管。
+    每个专辑的计划日志和标记日志保存在租约目录中，多台主机需要把共享目录挂载在相同路径下。
+    运行记录使用本机的ShardManifest，不写入共享目录中的SQLite。
+
+    参数:
+        root_dir: 根目录
+        jp_dir: 日语目录
+        secret_id: 腾讯云Secret ID
+        secret_key: 腾讯云Secret Key
+        worker_id: 工作进程标识，默认使用“主机名-进程号”
+
+    返回:
+        {'worker': 标识, 'processed': [专辑键], 'done': 跳过的专辑数, 'failed': [专辑键]}
+    """
+    lease_dir = os.path.join(root_dir, LEASE_DIR_NAME)
+    start_loudness_pool()
+    manifest = ShardManifest(root_dir) if INCREMENTAL else None
+    leases = LeaseManager(lease_dir, worker_id)
+    translator = create_translator(secret_id, secret_key)
+    result = {'worker': leases.worker_id, 'processed': [], 'done': 0, 'failed': []}
+    METRICS.reset()
+    logger.info(f"分片工作进程: {leases.worker_id}")
+
+    try:
+        index = LibraryIndex.from_root(root_dir, manifest)
+        if jp_dir:
+            index.ensure(jp_dir)
+        albums = [
+            album for album in group_albums(index, root_dir, jp_dir)
+            if not is_under(album.path, lease_dir)
+        ]
+        # 其他工作进程也在转换同一队列，按全部WAV计算额度偏保守
+        ENCODE_SCHEDULER.start(queued_wav_bytes(index, root_dir))
+
+        while albums:
+            busy = []
+            for album in albums:
+                key = album_key(album.path, root_dir)
+                status = process_leased_album(album, root_dir, index, leases, translator)
+                if status == 'busy':
+                    busy.append(album)
+                elif status == 'done':
+                    result['done'] += 1
+                else:
+                    result[status].append(key)
+            albums = busy
+            if albums:
+                logger.info(f"{len(albums)} 个专辑正由其他工作进程处理，{leases.heartbeat} 秒后重试")
+                time.sleep(leases.heartbeat)
+    finally:
+        leases.close()
+        if translator.cache is not None:
+            translator.cache.close()
+        if manifest is not None:
+            manifest.close()
+        stop_loudness_pool()
+        ENCODE_SCHEDULER.report()
+        write_metrics()
+
+    logger.info(f"本进程处理了 {len(result['processed'])} 个专辑，失败 {len(result['failed'])} 个")
+    return result
 
 
 # ======================== 主流程控制 ========================
+@run_once
 def check_ffmpeg_available():
-    """检查ffmpeg是否可用"""
+    """检查ffmpeg是否可用（每个进程只检查一次）"""
     try:
         subprocess.run(
             ['ffmpeg', '-version'],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
             check=True,
-            creationflags=subprocess.CREATE_NO_WINDOW
+            **SUBPROCESS_FLAGS
         )
         return True
     except Exception:
-        logger.error("系统PATH中未找到ffmpeg，请先安装并添加到环境变量")
+        logger.warning("系统PATH中未找到ffmpeg，请先安装并添加到环境变量")
         return False
 
 
-def main_workflow():
-    """主工作流程控制"""
+def main_workflow(phases=None):
+    """
+    主工作流程控制
+
+    参数:
+        phases: 要执行的阶段（PHASES中各阶段的子集），默认使用PHASES；
+            只有翻译和字幕翻译阶段需要JP_DIR，导入压缩包和查找重复文件随预处理阶段执行
+    """
+    phases = PHASES if phases is None else phases
+    if not TRANSLATE_LYRICS:
+        phases = tuple(phase for phase in phases if phase != 'lyrics')
     # 1. 检查目录有效性
     if not os.path.isdir(ROOT_DIR):
         logger.error(f"根目录不存在: {ROOT_DIR}")
         return
-    if not os.path.isdir(JP_DIR):
-        logger.error(f"日语目录不存在: {JP_DIR}")
-        return
-
-    # 2. 预处理（转换音频和字幕）
-    logger.info("\n=== 开始预处理 ===")
-    preprocess_directory(ROOT_DIR)
+    if 'translate' in phases or 'lyrics' in phases:
+        if not JP_DIR:
+            logger.info("未设置日语目录，跳过翻译")
+            phases = tuple(phase for phase in phases if phase not in ('translate', 'lyrics'))
+        elif not os.path.isdir(JP_DIR):
+            logger.error(f"日语目录不存在: {JP_DIR}")
+            return
+    jp_dir = JP_DIR if 'translate' in phases or 'lyrics' in phases else ''
 
-    # 3. 翻译（日语目录）
-    logger.info("\n=== 开始翻译 ===")
-    translate_jp_directory(JP_DIR, SECRET_ID, SECRET_KEY)
+    manifest = RunManifest.open(ROOT_DIR, readonly=DRY_RUN) if INCREMENTAL else None
+    journal = None if DRY_RUN else PlanJournal.open(ROOT_DIR)
+    METRICS.reset()
+    if 'tags' in phases and not DRY_RUN:
+        start_loudness_pool()
 
-    # 4. 更新标签
-    logger.info("\n=== 开始更新标签 ===")
-    update_all_tags(ROOT_DIR)
+    try:
+        # 上次运行中断时，先完成日志中未执行的操作，再扫描目录
+        if journal is not None and journal.pending():
+            logger.info("\n=== 恢复上次中断的处理 ===")
+            with METRICS.timer('stage_seconds', stage='resume'):
+                resume_journal(journal, manifest=manifest)
+
+        # 导入下载目录中的ZIP
+        if INGEST_DIR and 'preprocess' in phases:
+            logger.info("\n=== 导入压缩包 ===")
+            with METRICS.timer('stage_seconds', stage='ingest'):
+                ingest_archives(INGEST_DIR, INGEST_DEST or JP_DIR or ROOT_DIR, DRY_RUN)
+
+        # 扫描一次目录树，各阶段共用同一个索引
+        logger.info("\n=== 扫描目录 ===")
+        with METRICS.timer('stage_seconds', stage='scan'):
+            index = LibraryIndex.from_root(ROOT_DIR, manifest)
+            if jp_dir:
+                index.ensure(jp_dir)
+        if 'preprocess' in phases:
+            ENCODE_SCHEDULER.start(queued_wav_bytes(index, ROOT_DIR))
+
+        if PIPELINE:
+            # 2-4. 按专辑流水线处理，不同专辑的转换、翻译、标签同时进行
+            logger.info("\n=== 开始处理 ===")
+            translator = create_translator(SECRET_ID, SECRET_KEY) if jp_dir else None
+            try:
+                with METRICS.timer('stage_seconds', stage='pipeline'):
+                    process_albums_pipelined(ROOT_DIR, jp_dir, translator, index, journal, DRY_RUN, phases)
+            finally:
+                if translator is not None and translator.cache is not None:
+                    translator.cache.close()
+        else:
+            # 2. 预处理（转换音频和字幕）
+            if 'preprocess' in phases:
+                logger.info("\n=== 开始预处理 ===")
+                with METRICS.timer('stage_seconds', stage='preprocess'):
+                    preprocess_directory(ROOT_DIR, index=index, journal=journal, dry_run=DRY_RUN)
+
+            # 3. 翻译（日语目录）
+            if 'translate' in phases:
+                logger.info("\n=== 开始翻译 ===")
+                with METRICS.timer('stage_seconds', stage='translate'):
+                    translate_jp_directory(jp_dir, SECRET_ID, SECRET_KEY, index=index, journal=journal, dry_run=DRY_RUN)
+            if 'lyrics' in phases:
+                logger.info("\n=== 开始翻译字幕 ===")
+                with METRICS.timer('stage_seconds', stage='lyrics'):
+                    translate_jp_lyrics(jp_dir, SECRET_ID, SECRET_KEY, index=index, dry_run=DRY_RUN)
+
+            # 4. 更新标签
+            if 'tags' in phases:
+                logger.info("\n=== 开始更新标签 ===")
+                with METRICS.timer('stage_seconds', stage='tags'):
+                    update_all_tags(ROOT_DIR, index=index, journal=journal, dry_run=DRY_RUN)
+
+        # 5. 查找内容相同的音频
+        if DEDUP and 'preprocess' in phases:
+            logger.info("\n=== 查找重复文件 ===")
+            with METRICS.timer('stage_seconds', stage='dedup'):
+                entries = [
+                    entry for folder in index.folders_under(ROOT_DIR) for entry in index.files(folder, 'audio')
+                ]
+                link = DEDUP_ACTION == 'hardlink' and not DRY_RUN
+                report_duplicates(entries, ContentIndex(manifest), link, index)
+
+        # 全部阶段完成后删除计划日志
+        if journal is not None:
+            journal.clear()
+    finally:
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.close()
+        stop_loudness_pool()
+        ENCODE_SCHEDULER.report()
+        write_metrics()
 
     logger.info("\n=== 所有处理完成 ===")
 
 
-def main():
-    """主函数入口"""
-    if not check_ffmpeg_available():
-        return
+# ======================== 命令行模块 ========================
+COMMANDS = {
+    'all': ('依次预处理、翻译、更新标签（默认）', None),
+    'preprocess': ('只预处理：wav转flac、字幕转lrc、按编号整理文件名', ('preprocess',)),
+    'translate': ('只翻译日语目录中的文件名、文件夹名和字幕内容', ('translate', 'lyrics')),
+    'lyrics': ('只翻译日语目录中LRC字幕的内容', ('lyrics',)),
+    'tag': ('只更新音频标签和封面', ('tags',)),
+    'watch': ('常驻监视根目录，处理新增或变化的文件夹', None),
+    'shard': ('分片模式：与其他工作进程一起认领根目录下的专辑处理', None),
+}
+
+
+def coerce_setting(name, value):
+    """
+    把配置文件或环境变量中的值转换为常量原有的类型
+
+    参数:
+        name: 常量名
+        value: 配置文件中的值，或环境变量中的字符串（列表类常量用JSON数组表示）
+
+    返回:
+        转换后的值，无法转换时抛出ValueError
+    """
+    default = globals()[name]
+    if isinstance(default, bool):
+        if not isinstance(value, str):
+            return bool(value)
+        lowered = value.strip().lower()
+        if lowered in ('1', 'true', 'yes', 'on'):
+            return True
+        if lowered in ('0', 'false', 'no', 'off', ''):
+            return False
+        raise ValueError(f"{name} 需要布尔值: {value!r}")
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    if isinstance(default, str):
+        return str(value)
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"{name} 需要列表: {value!r}")
+    return type(default)(value)
+
+
+def load_settings(config_path=None, environ=None):
+    """
+    按配置文件、环境变量的顺序覆盖常量（后者优先）
 
-    main_workflow()
+    配置文件为JSON对象，键为常量名（如"ROOT_DIR"、"TRANSLATE_QPS"）；
+    环境变量为ENV_PREFIX加常量名（如ASMR_ROOT_DIR、ASMR_SECRET_ID）。
+
+    参数:
+        config_path: 配置文件路径，默认使用环境变量ASMR_CONFIG或CONFIG_PATH，不存在时忽略
+        environ: 环境变量字典，默认使用os.environ
+
+    返回:
+        实际读取的配置文件路径，未读取时为None
+    """
+    environ = os.environ if environ is None else environ
+    explicit = config_path or environ.get(f"{ENV_PREFIX}CONFIG")
+    config_path = explicit or CONFIG_PATH
+    settings = {}
+    if config_path and (explicit or os.path.isfile(config_path)):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+        if not isinstance(settings, dict):
+            raise ValueError(f"配置文件应为JSON对象: {config_path}")
+    else:
+        config_path = None
+    for name in SETTING_NAMES:
+        env_name = f"{ENV_PREFIX}{name}"
+        if env_name in environ:
+            settings[name] = environ[env_name]
+
+    for name, value in settings.items():
+        if name not in SETTING_NAMES:
+            logger.warning(f"忽略未知的配置项: {name}")
+            continue
+        globals()[name] = coerce_setting(name, value)
+    return config_path
+
+
+def build_parser():
+    """命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        description='ASMR音频处理：wav转flac、字幕转lrc、翻译文件名、写入标签',
+        epilog=f"其他常量可以写在配置文件（JSON）中，或用{ENV_PREFIX}加常量名的环境变量设置，如{ENV_PREFIX}SECRET_ID",
+    )
+    parser.add_argument('-c', '--config', help=f'配置文件路径（默认{ENV_PREFIX}CONFIG或{CONFIG_PATH}）')
+    subparsers = parser.add_subparsers(dest='command', metavar='{' + ','.join(COMMANDS) + '}')
+    for name, (help_text, _) in COMMANDS.items():
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.add_argument('root', nargs='?', help='根目录（默认ROOT_DIR）；translate、lyrics时未指定--jp则翻译此目录')
+        sub.add_argument('--jp', help='日语目录（默认JP_DIR），只有翻译时需要')
+        sub.add_argument('-n', '--dry-run', action='store_true', default=None, help='只输出处理计划，不修改任何文件')
+        if name in ('all', 'preprocess', 'watch', 'shard'):
+            sub.add_argument(
+                '--profile', choices=list(FLAC_PROFILE_LEVELS) + ['auto'],
+                help='FLAC编码配置（默认FLAC_PROFILE），auto时按--budget为每个文件选择压缩等级'
+            )
+            sub.add_argument('--budget', help='auto编码配置下转换队列的时间预算，如8h、90m、3600（默认ENCODE_BUDGET）')
+        if name == 'shard':
+            sub.add_argument('--worker-id', help='工作进程标识（默认WORKER_ID或“主机名-进程号”）')
+    return parser
+
+
+def main(argv=None):
+    """
+    主函数入口
+
+    不带子命令时按常量（WATCH、SHARD）选择运行模式，与旧版直接运行脚本的行为相同。
+    mutagen、腾讯云SDK、libFLAC等依赖只在执行到需要它们的阶段时导入，
+    tag、translate等单阶段命令启动时不会加载编码和翻译以外的依赖。
+
+    参数:
+        argv: 命令行参数列表，默认使用sys.argv[1:]
+    """
+    global ROOT_DIR, JP_DIR, DRY_RUN, WORKER_ID, FLAC_PROFILE, ENCODE_BUDGET
+
+    args = build_parser().parse_args(argv)
+    try:
+        load_settings(args.config)
+    except (OSError, ValueError) as e:
+        logger.error(f"读取配置失败: {e}")
+        return 2
+
+    command = args.command or ('watch' if WATCH else 'shard' if SHARD else 'all')
+    phases = COMMANDS[command][1]
+    if getattr(args, 'root', None):
+        ROOT_DIR = os.path.abspath(args.root)
+    if getattr(args, 'jp', None):
+        JP_DIR = os.path.abspath(args.jp)
+    elif command in ('translate', 'lyrics') and (args.root or not JP_DIR):
+        JP_DIR = ROOT_DIR
+    if getattr(args, 'dry_run', None):
+        DRY_RUN = True
+    if getattr(args, 'worker_id', None):
+        WORKER_ID = args.worker_id
+    if getattr(args, 'profile', None):
+        FLAC_PROFILE = args.profile
+    if getattr(args, 'budget', None):
+        ENCODE_BUDGET = args.budget
+    try:
+        profile_level()
+        parse_duration(ENCODE_BUDGET)
+    except ValueError as e:
+        logger.error(f"编码配置错误: {e}")
+        return 2
+
+    if phases is None or 'preprocess' in phases:
+        encoders = available_flac_encoders()
+        if not encoders:
+            logger.error("没有可用的FLAC编码器，请安装ffmpeg或pyflac")
+            return 1
+        logger.info(f"FLAC编码后端: {', '.join(e.name for e in encoders)}")
+
+    if command in ('watch', 'shard'):
+        if not os.path.isdir(ROOT_DIR):
+            logger.error(f"根目录不存在: {ROOT_DIR}")
+            return 1
+    if command == 'watch':
+        watch_directory(ROOT_DIR, JP_DIR, SECRET_ID, SECRET_KEY)
+    elif command == 'shard':
+        run_shard_worker(ROOT_DIR, JP_DIR, SECRET_ID, SECRET_KEY, WORKER_ID)
+    else:
+        main_workflow(phases)
+    return 0
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,42 @@
+import importlib.util
+import math
+import os
+import struct
+import sys
+import wave
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'asmr-process.py')
+
+
+def load_asmr_process():
+    """按模块名asmr_process加载asmr-process.py（文件名含连字符，不能直接import），与asmr-bench.py相同"""
+    if 'asmr_process' in sys.modules:
+        return sys.modules['asmr_process']
+    spec = importlib.util.spec_from_file_location('asmr_process', SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['asmr_process'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def asmr():
+    return load_asmr_process()
+
+
+def write_wav(path, seconds=0.5, sample_rate=44100, channels=2, frequency=440.0):
+    """写入16位PCM的测试WAV（正弦波，各声道相位不同），返回路径"""
+    frames = int(sample_rate * seconds)
+    samples = []
+    for i in range(frames):
+        for channel in range(channels):
+            value = math.sin(2 * math.pi * frequency * i / sample_rate + channel)
+            samples.append(int(value * 12000))
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(struct.pack(f'<{len(samples)}h', *samples))
+    return str(path)
@@ -0,0 +1,98 @@
+import hashlib
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import load_asmr_process, write_wav
+
+asmr = load_asmr_process()
+ENCODERS = [encoder for encoder in asmr.FLAC_ENCODERS if encoder.available()]
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='需要ffmpeg')
+needs_libflac = pytest.mark.skipif(not asmr.LibFlacEncoder().available(), reason='需要pyflac和numpy')
+
+
+class TruncatingEncoder(asmr.FlacEncoder):
+    """正常编码后把FLAC截掉一半，模拟写入中断或磁盘已满"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = f'truncating-{inner.name}'
+
+    def encode(self, wav_path, flac_path, compression_level=None):
+        digest = self.inner.encode(wav_path, flac_path, compression_level)
+        with open(flac_path, 'r+b') as f:
+            f.truncate(f.seek(0, 2) // 2)
+        return digest
+
+
+class CorruptingEncoder(asmr.FlacEncoder):
+    """编码改动过一个采样的副本，采样数相同但PCM数据MD5不同"""
+
+    def __init__(self, inner, tmp_path):
+        self.inner = inner
+        self.tmp_path = tmp_path
+        self.name = f'corrupting-{inner.name}'
+
+    def encode(self, wav_path, flac_path, compression_level=None):
+        data = bytearray(open(wav_path, 'rb').read())
+        data[-1] ^= 0x40
+        copy_path = self.tmp_path / 'corrupted.wav'
+        copy_path.write_bytes(bytes(data))
+        self.inner.encode(copy_path, flac_path, compression_level)
+        # 不返回摘要，由check_flac重新读取源WAV计算
+        return None
+
+
+@pytest.mark.skipif(not ENCODERS, reason='没有可用的FLAC编码器')
+@pytest.mark.parametrize('encoder', ENCODERS, ids=lambda encoder: encoder.name)
+def test_verified_conversion_deletes_wav(tmp_path, encoder):
+    wav_path = write_wav(tmp_path / 'a.wav')
+    assert asmr.convert_wav_to_flac(wav_path, encoder=encoder) == str(tmp_path / 'a.flac')
+    assert not (tmp_path / 'a.wav').exists()
+
+
+@pytest.mark.skipif(not ENCODERS, reason='没有可用的FLAC编码器')
+@pytest.mark.parametrize('encoder', ENCODERS, ids=lambda encoder: encoder.name)
+def test_truncated_flac_keeps_wav(tmp_path, encoder):
+    wav_path = write_wav(tmp_path / 'a.wav')
+    original = open(wav_path, 'rb').read()
+    assert asmr.convert_wav_to_flac(wav_path, encoder=TruncatingEncoder(encoder)) is None
+    assert open(wav_path, 'rb').read() == original
+    assert not (tmp_path / 'a.flac').exists()
+
+
+@pytest.mark.skipif(not ENCODERS, reason='没有可用的FLAC编码器')
+@pytest.mark.parametrize('encoder', ENCODERS, ids=lambda encoder: encoder.name)
+def test_streaminfo_md5_mismatch_keeps_wav(tmp_path, encoder):
+    wav_path = write_wav(tmp_path / 'a.wav')
+    original = open(wav_path, 'rb').read()
+    assert asmr.convert_wav_to_flac(wav_path, encoder=CorruptingEncoder(encoder, tmp_path)) is None
+    assert open(wav_path, 'rb').read() == original
+    assert not (tmp_path / 'a.flac').exists()
+
+
+def decoded_pcm_md5(flac_path):
+    """用ffmpeg把FLAC解码为16位PCM，返回数据的MD5"""
+    process = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', str(flac_path), '-f', 's16le', '-'],
+        stdout=subprocess.PIPE, check=True
+    )
+    return hashlib.md5(process.stdout).hexdigest()
+
+
+@needs_ffmpeg
+@needs_libflac
+def test_libflac_and_ffmpeg_decode_to_identical_pcm(tmp_path):
+    wav_path = write_wav(tmp_path / 'a.wav', seconds=1.5)
+    info = asmr.probe_wav(wav_path)
+    source_md5 = asmr.pcm_digest(wav_path).md5.hexdigest()
+
+    results = {}
+    for encoder in (asmr.LibFlacEncoder(), asmr.FfmpegEncoder()):
+        flac_path = tmp_path / f'{encoder.name}.flac'
+        encoder.encode(wav_path, flac_path)
+        assert asmr.verify_flac(flac_path, info) is None
+        results[encoder.name] = decoded_pcm_md5(flac_path)
+
+    assert results['libflac'] == results['ffmpeg'] == source_md5
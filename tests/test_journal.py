@@ -0,0 +1,68 @@
+import json
+import os
+
+from conftest import write_wav
+
+
+def rename_actions(asmr, folder, names):
+    actions = []
+    for name in names:
+        src = folder / f'{name}.wav'
+        write_wav(src, seconds=0.01)
+        actions.append(asmr.PlanAction('rename', str(src), str(folder / f'「01」{name}.wav')))
+    return actions
+
+
+def test_resume_runs_each_pending_action_once(asmr, tmp_path, monkeypatch):
+    journal_path = tmp_path / asmr.JOURNAL_NAME
+    actions = rename_actions(asmr, tmp_path, ['a', 'b', 'c'])
+
+    # 模拟中断：整批写入日志，只完成第一个操作，最后一行写到一半
+    journal = asmr.PlanJournal(str(journal_path))
+    ids = journal.record(actions)
+    assert asmr.apply_action(actions[0]) is not None
+    journal.complete(ids[0])
+    journal.close()
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'done': ids[1]})[:5])
+
+    applied = []
+    apply_action = asmr.apply_action
+
+    def counting(action, covers=None):
+        applied.append(action.src)
+        return apply_action(action, covers)
+
+    monkeypatch.setattr(asmr, 'apply_action', counting)
+
+    journal = asmr.PlanJournal(str(journal_path))
+    assert [action.src for _, action in journal.pending()] == [actions[1].src, actions[2].src]
+    assert asmr.resume_journal(journal) == 2
+    journal.close()
+    assert applied == [actions[1].src, actions[2].src]
+    assert sorted(os.listdir(tmp_path)) == [asmr.JOURNAL_NAME, '「01」a.wav', '「01」b.wav', '「01」c.wav']
+
+    # 再次打开日志时没有未完成的操作，不会重复执行
+    journal = asmr.PlanJournal(str(journal_path))
+    assert journal.pending() == []
+    assert asmr.resume_journal(journal) == 0
+    journal.clear()
+    assert applied == [actions[1].src, actions[2].src]
+    assert not journal_path.exists()
+
+
+def test_finished_but_unrecorded_action_is_treated_as_done(asmr, tmp_path):
+    journal_path = tmp_path / asmr.JOURNAL_NAME
+    actions = rename_actions(asmr, tmp_path, ['a'])
+
+    # 操作已执行，但中断发生在写入完成记录之前
+    journal = asmr.PlanJournal(str(journal_path))
+    journal.record(actions)
+    assert asmr.apply_action(actions[0]) is not None
+    journal.close()
+
+    journal = asmr.PlanJournal(str(journal_path))
+    assert asmr.resume_journal(journal) == 1
+    journal.close()
+    assert (tmp_path / '「01」a.wav').exists()
+    assert not (tmp_path / 'a.wav').exists()
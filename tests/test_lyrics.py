@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def translator(asmr, monkeypatch):
+    monkeypatch.setattr(asmr, 'TRANSLATE_OFFLINE', True)
+    monkeypatch.setattr(asmr, 'TRANSLATION_CACHE_PATH', '')
+    monkeypatch.setattr(asmr, 'TRANSLATE_QPS', 0)
+    return asmr.create_translator('', '')
+
+
+def test_folder_stays_pending_until_every_lrc_is_translated(asmr, translator, tmp_path, monkeypatch):
+    monkeypatch.setattr(asmr, 'SUBTITLE_ENCODINGS', ['utf-8'])
+    good, bad = tmp_path / 'good', tmp_path / 'bad'
+    good.mkdir()
+    bad.mkdir()
+    (good / '01.lrc').write_text('[00:01.000]おはよう\n[00:02.500]おやすみ', encoding='utf-8')
+    (bad / '01.lrc').write_text('[00:01.000]おはよう', encoding='utf-8')
+    # 无法按SUBTITLE_ENCODINGS解码的文件
+    (bad / '02.lrc').write_bytes('[00:01.000]おやすみ'.encode('utf-16-le'))
+
+    manifest = asmr.RunManifest.open(str(tmp_path))
+    try:
+        index = asmr.LibraryIndex.from_root(str(tmp_path), manifest)
+        asmr.translate_lyrics_folders([str(good), str(bad)], translator, index)
+        pending, _ = asmr.pending_folders([str(good), str(bad)], index, 'lyrics')
+    finally:
+        manifest.close()
+
+    assert pending == [str(bad)]
+    with open(good / '01.lrc', encoding='utf-8') as f:
+        assert f.read().splitlines() == [
+            asmr.LYRICS_TRANSLATED_TAG,
+            '[00:01.000]おはよう', '[00:01.000]译おはよう',
+            '[00:02.500]おやすみ', '[00:02.500]译おやすみ',
+        ]
+    assert (bad / '02.lrc').read_bytes() == '[00:01.000]おやすみ'.encode('utf-16-le')
+    assert not [name for name in os.listdir(bad) if name.endswith('.tmp')]
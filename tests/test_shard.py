@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import load_asmr_process, write_wav
+
+asmr = load_asmr_process()
+pytestmark = pytest.mark.skipif(not asmr.LibFlacEncoder().available(), reason='需要pyflac和numpy')
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# 在独立进程中运行一个分片工作进程，结果写入JSON；crash_after大于0时，第crash_after个计划操作执行完、
+# 还没有记录完成时直接退出，留下租约和计划日志
+WORKER = '''
+import json, os, sys
+tests_dir, root_dir, worker_id, result_path, crash_after = sys.argv[1:6]
+sys.path.insert(0, tests_dir)
+from conftest import load_asmr_process
+asmr = load_asmr_process()
+asmr.TRANSLATE_OFFLINE = True
+asmr.TRANSLATION_CACHE_PATH = ''
+asmr.TRANSLATE_QPS = 0
+asmr.FLAC_ENCODER = 'libflac'
+asmr.LOUDNESS_WORKERS = 0
+asmr.LEASE_TIMEOUT = 2
+asmr.LEASE_HEARTBEAT = 0.2
+
+apply_action = asmr.apply_action
+calls = [0]
+
+def crashing(action, covers=None):
+    result = apply_action(action, covers)
+    calls[0] += 1
+    if calls[0] == int(crash_after):
+        os._exit(3)
+    return result
+
+asmr.apply_action = crashing
+result = asmr.run_shard_worker(root_dir, os.path.join(root_dir, 'JP'), '', '', worker_id)
+with open(result_path, 'w', encoding='utf-8') as f:
+    json.dump(result, f)
+'''
+
+
+def start_worker(root_dir, worker_id, result_path, crash_after=0):
+    return subprocess.Popen(
+        [sys.executable, '-c', WORKER, TESTS_DIR, str(root_dir), worker_id, str(result_path), str(crash_after)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def make_tree(root_dir):
+    """JP下三个专辑（参与翻译），根目录下两个专辑，每个专辑两首WAV，返回专辑数"""
+    albums = [root_dir / 'JP' / f'作品{i}' for i in range(3)] + [root_dir / f'作品{i}' for i in range(3, 5)]
+    for album in albums:
+        album.mkdir(parents=True)
+        write_wav(album / 'track01_はじめに.wav', seconds=0.05)
+        write_wav(album / 'track02_おやすみ.wav', seconds=0.05)
+    return len(albums)
+
+
+def test_workers_take_over_a_crashed_album(tmp_path):
+    root_dir = tmp_path / 'root'
+    album_count = make_tree(root_dir)
+
+    # worker-0在第一个专辑中翻译了第一个文件名后崩溃
+    crashed = start_worker(root_dir, 'worker-0', tmp_path / 'worker-0.json', crash_after=5)
+    assert crashed.wait(timeout=120) == 3
+
+    workers = [
+        start_worker(root_dir, f'worker-{i}', tmp_path / f'worker-{i}.json') for i in (1, 2)
+    ]
+    assert [worker.wait(timeout=120) for worker in workers] == [0, 0]
+
+    processed = []
+    for i in (1, 2):
+        with open(tmp_path / f'worker-{i}.json', encoding='utf-8') as f:
+            result = json.load(f)
+        assert result['failed'] == []
+        processed.extend(result['processed'])
+    # 每个专辑恰好由一个工作进程处理完成
+    assert len(processed) == len(set(processed)) == album_count
+
+    lease_dir = root_dir / asmr.LEASE_DIR_NAME
+    assert not [name for name in os.listdir(lease_dir) if name.endswith(('.lease', '.journal.jsonl'))]
+    assert not os.path.exists(root_dir / asmr.MANIFEST_NAME)
+
+    files = sorted(
+        os.path.relpath(os.path.join(folder, name), root_dir).replace(os.sep, '/')
+        for folder, _, names in os.walk(root_dir) if not folder.startswith(str(lease_dir))
+        for name in names
+    )
+    # 文件名只翻译一次，目录名也只翻译一次
+    expected = []
+    for i in range(3):
+        expected += [
+            f'JP/译作品{i}[作品{i}]/「01」译はじめに[はじめに].flac',
+            f'JP/译作品{i}[作品{i}]/「02」译おやすみ[おやすみ].flac',
+        ]
+    for i in range(3, 5):
+        expected += [f'作品{i}/「01」はじめに.flac', f'作品{i}/「02」おやすみ.flac']
+    assert files == sorted(expected)
+
+    # 再次运行时所有专辑都已完成，不会重复处理
+    rerun = start_worker(root_dir, 'worker-3', tmp_path / 'worker-3.json')
+    assert rerun.wait(timeout=120) == 0
+    with open(tmp_path / 'worker-3.json', encoding='utf-8') as f:
+        result = json.load(f)
+    assert (result['processed'], result['failed']) == ([], [])
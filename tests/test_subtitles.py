@@ -0,0 +1,84 @@
+import pytest
+
+VTT = '''WEBVTT
+Kind: captions
+
+NOTE 这一块不输出
+00:00:09.000 --> 00:00:10.000
+
+1
+00:01.5 --> 00:03.000
+<v 姉>おはよう</v>
+ございます
+
+intro-2
+01:02.345 --> 01:04.000
+耳かき &amp; 囁き
+
+1:02:03.004 --> 1:02:05.000
+おやすみ'''
+
+
+@pytest.mark.parametrize('timestamp, milliseconds', [
+    ('01:02.345', 62345),  # 没有小时
+    ('00:01:02.345', 62345),
+    ('1:02:03.004', 3723004),  # 三位毫秒，保留前导零
+    ('00:00.5', 500),  # 少于三位的小数部分按毫秒补齐
+    ('00:00:01,250', 1250),  # SRT风格的逗号
+    ('123:00:00.000', 442800000),
+    ('abc', None),
+    ('00:00', None),
+])
+def test_parse_vtt_timestamp(asmr, timestamp, milliseconds):
+    assert asmr.parse_vtt_timestamp(timestamp) == milliseconds
+
+
+def test_lrc_timestamp_keeps_milliseconds_and_long_minutes(asmr):
+    assert asmr.format_lrc_timestamp(62345) == '[01:02.345]'
+    assert asmr.format_lrc_timestamp(3723004) == '[62:03.004]'
+    assert asmr.format_lrc_timestamp(0) == '[00:00.000]'
+
+
+def test_cues_stream_as_lrc_lines(asmr):
+    lines = asmr.iter_vtt_as_lrc(iter(VTT.splitlines(keepends=True)))
+    assert next(lines) == '[00:01.500]おはよう ございます'
+    assert list(lines) == ['[01:02.345]耳かき & 囁き', '[62:03.004]おやすみ']
+
+
+def test_convert_replaces_vtt_with_utf8_lrc(asmr, tmp_path):
+    vtt_path = tmp_path / '01.vtt'
+    vtt_path.write_bytes(VTT.replace('\n', '\r\n').encode('gbk'))
+
+    lrc_path = asmr.convert_vtt_to_lrc(str(vtt_path))
+
+    assert lrc_path == str(tmp_path / '01.lrc')
+    assert not vtt_path.exists()
+    assert not (tmp_path / '01.lrc.tmp').exists()
+    with open(lrc_path, encoding='utf-8') as f:
+        assert f.read().splitlines() == [
+            '[00:01.500]おはよう ございます', '[01:02.345]耳かき & 囁き', '[62:03.004]おやすみ'
+        ]
+
+
+@pytest.mark.parametrize('data, encoding', [
+    ('字幕'.encode('utf-8-sig'), 'utf-8-sig'),
+    ('字幕'.encode('utf-16'), 'utf-16'),
+    ('おやすみ'.encode('utf-8'), 'utf-8'),
+    ('晚安'.encode('gbk'), 'gbk'),
+    (b'\x80' * 3, 'latin-1'),
+])
+def test_detect_encoding(asmr, tmp_path, data, encoding):
+    path = tmp_path / 'sub.vtt'
+    path.write_bytes(data)
+    assert asmr.detect_encoding(str(path)) == encoding
+
+
+def test_detect_encoding_reads_only_the_prefix(asmr, tmp_path):
+    path = tmp_path / 'sub.vtt'
+    # 样本末尾截断在一个多字节字符中间，之后的内容不是UTF-8
+    prefix = 'WEBVTT\n\n' + 'あ' * 10
+    data = prefix.encode('utf-8')
+    path.write_bytes(data + b'\xff' * 100)
+
+    assert asmr.detect_encoding(str(path), sample_size=len(data) - 1) == 'utf-8'
+    assert asmr.detect_encoding(str(path), sample_size=len(data) + 1) != 'utf-8'
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize('names', [
+    ['01.wav', '01.wav.vtt', '01.vtt', '01.lrc', '01 .lrc', '01.flac.lrc'],
+    ['はじめに.FLAC', 'はじめに.flac.VTT', 'はじめに .LRC'],
+    ['Track01.mp3', 'ｔｒａｃｋ０１.mp3.vtt'],  # 全角半角、大小写统一
+])
+def test_track_key_pairs_audio_and_subtitles(asmr, names):
+    keys = {asmr.track_key(os.path.join('album', name)) for name in names}
+    assert len(keys) == 1
+
+
+def test_track_key_keeps_other_dots(asmr):
+    assert asmr.track_key('01.はじめに.wav.vtt') == '01.はじめに'
+    assert asmr.track_key('ver1.5.lrc') == 'ver1.5'
+    assert asmr.track_key('01.wav') != asmr.track_key('02.wav.vtt')
+
+
+def test_group_tracks(asmr):
+    audio = ['a/01.wav', 'a/02.flac', 'a/03.mp3']
+    subtitles = ['a/02.flac.vtt', 'a/01 .lrc', 'a/01.wav.vtt', 'a/おまけ.lrc', 'a/おまけ.vtt']
+
+    tracks = asmr.group_tracks(audio, subtitles)
+
+    assert [(track.audio, track.subtitles) for track in tracks] == [
+        ('a/01.wav', ['a/01 .lrc', 'a/01.wav.vtt']),
+        ('a/02.flac', ['a/02.flac.vtt']),
+        ('a/03.mp3', []),
+        (None, ['a/おまけ.lrc', 'a/おまけ.vtt']),
+    ]
+    assert tracks[3].lead == 'a/おまけ.lrc'
+    assert asmr.associate_audio_subtitles(audio, subtitles) == {
+        'a/01.wav': ['a/01 .lrc', 'a/01.wav.vtt'],
+        'a/02.flac': ['a/02.flac.vtt'],
+    }
+
+
+def test_numbered_moves_rename_the_group_together(asmr, tmp_path):
+    names = ['track01_はじめに.wav', 'track01_はじめに.wav.vtt', 'track01_はじめに .lrc']
+    paths = [str(tmp_path / name) for name in names]
+    track, = asmr.group_tracks(paths[:1], paths[1:])
+    track.number = 1
+
+    moves = track.numbered_moves()
+
+    assert [(os.path.basename(src), os.path.basename(dst)) for src, dst in moves] == [
+        ('track01_はじめに.wav', '「01」はじめに.wav'),
+        ('track01_はじめに.wav.vtt', '「01」はじめに.vtt'),
+        ('track01_はじめに .lrc', '「01」はじめに.lrc'),
+    ]
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def offline(asmr, tmp_path, monkeypatch):
+    """离线翻译（StubTmtClient），缓存写在临时目录，不限速；返回创建过的桩服务列表"""
+    clients = []
+
+    class RecordingStub(asmr.StubTmtClient):
+        def __init__(self, translate_func=None):
+            super().__init__(translate_func)
+            self.batches = []
+            clients.append(self)
+
+        def TextTranslateBatch(self, req):
+            self.batches.append(list(req.SourceTextList))
+            return super().TextTranslateBatch(req)
+
+    monkeypatch.setattr(asmr, 'TRANSLATE_OFFLINE', True)
+    monkeypatch.setattr(asmr, 'TRANSLATION_CACHE_PATH', str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(asmr, 'TRANSLATE_QPS', 0)
+    monkeypatch.setattr(asmr, 'StubTmtClient', RecordingStub)
+    return clients
+
+
+def create_translator(asmr):
+    translator = asmr.create_translator('', '')
+    assert isinstance(translator.client, asmr.StubTmtClient)
+    return translator
+
+
+def test_batches_stay_under_request_limits(asmr, offline, monkeypatch):
+    monkeypatch.setattr(asmr, 'TRANSLATE_BATCH_CHARS', 50)
+    monkeypatch.setattr(asmr, 'TRANSLATE_BATCH_ITEMS', 3)
+    texts = [f'耳かきボイス{i:02d}です' for i in range(10)]  # 每条11个字符
+    long_text = 'ささやき' * 20
+
+    translator = create_translator(asmr)
+    results = translator.translate_batch(texts + [long_text])
+    translator.cache.close()
+
+    assert results == {text: f'译{text}' for text in texts + [long_text]}
+    client = offline[0]
+    assert sorted(text for batch in client.batches for text in batch) == sorted(texts)
+    for batch in client.batches:
+        assert len(batch) <= 3
+        assert sum(len(text) for text in batch) < 50
+    # 超过批量限制的单条文本改用单条接口
+    assert client.calls == len(client.batches) + 1
+
+
+def test_duplicates_are_sent_once(asmr, offline):
+    texts = ['はじめに', 'おやすみ', 'はじめに', '', 'おやすみ', 'はじめに']
+
+    translator = create_translator(asmr)
+    results = translator.translate_batch(texts)
+    translator.cache.close()
+
+    assert results == {'はじめに': '译はじめに', 'おやすみ': '译おやすみ'}
+    assert offline[0].batches == [['はじめに', 'おやすみ']]
+
+
+def test_cached_translations_skip_the_api(asmr, offline):
+    texts = ['はじめに', 'おやすみ', '耳かき']
+
+    translator = create_translator(asmr)
+    first = translator.translate_batch(texts)
+    translator.cache.close()
+
+    # 新的翻译器读取同一个缓存文件，全部命中，不再调用接口
+    translator = create_translator(asmr)
+    second = translator.translate_batch(texts + ['添い寝'])
+    hits, misses = translator.cache.hits, translator.cache.misses
+    translator.cache.close()
+
+    assert second == dict(first, 添い寝='译添い寝')
+    assert (hits, misses) == (3, 1)
+    assert offline[1].batches == [['添い寝']]
+
+
+def test_renames_are_applied_from_batch_results(asmr, offline, tmp_path):
+    jp_dir = tmp_path / 'JP'
+    album = jp_dir / '作品'
+    disc = album / '本編'
+    disc.mkdir(parents=True)
+    for path in [album / '「01」はじめに.flac', album / '「01」はじめに.lrc', disc / '「02」おやすみ.flac']:
+        path.write_bytes(b'')
+
+    asmr.translate_jp_directory(str(jp_dir), '', '')
+
+    assert sorted(os.listdir(jp_dir)) == ['译作品[作品]']
+    album = jp_dir / '译作品[作品]'
+    assert sorted(os.listdir(album)) == ['「01」译はじめに[はじめに].flac', '「01」译はじめに[はじめに].lrc', '译本編[本編]']
+    assert os.listdir(album / '译本編[本編]') == ['「02」译おやすみ[おやすみ].flac']
+    # 所有文件名和目录名在一次批量请求中翻译
+    client, = offline
+    assert client.calls == 1
+    assert sorted(client.batches[0]) == sorted(['はじめに', 'おやすみ', '作品', '本編'])